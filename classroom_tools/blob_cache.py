@@ -0,0 +1,75 @@
+import hashlib
+import os
+import threading
+
+MAX_SIZE = 512 * 1024 * 1024
+
+
+def git_blob_sha(content):
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest()
+
+
+class BlobCache:
+    # Files keyed by git blob sha, the least recently used ones are evicted once the cache exceeds max_size
+    def __init__(self, path, max_size=MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _blob_path(self, sha):
+        return os.path.join(self.path, sha[:2], sha[2:])
+
+    def get(self, sha):
+        blob_path = self._blob_path(sha)
+        try:
+            with open(blob_path, 'rb') as f:
+                content = f.read()
+            os.utime(blob_path)
+        except OSError:
+            return None
+        return content
+
+    def put(self, sha, content):
+        if git_blob_sha(content) != sha:
+            return
+        blob_path = self._blob_path(sha)
+        try:
+            head, tail = os.path.split(blob_path)
+            if not os.path.exists(head): os.makedirs(head, exist_ok=True)
+            tmp_path = f'{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, blob_path)
+        except OSError:
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(content)
+            if self._size > self.max_size:
+                self._evict()
+
+    def _entries(self):
+        for root, dirs, files in os.walk(self.path):
+            for name in files:
+                file_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, file_path
+
+    def _evict(self):
+        # Evicts down to 80% of the cap so that eviction doesn't run on every write
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, file_path in entries:
+            if self._size <= self.max_size * 0.8:
+                break
+            try:
+                os.remove(file_path)
+                self._size -= size
+            except OSError:
+                pass
@@ -0,0 +1,122 @@
+import argparse
+import importlib
+import shlex
+import sys
+import time
+
+# Modules are only imported once their command is chosen, so that startup doesn't pay for every dependency
+COMMANDS = {
+    'access_permissions': 'classroom_tools.student_repositories.access_permissions',
+    'access_to_github_secrets': 'classroom_tools.verifications.access_to_github_secrets',
+    'auto_git': 'classroom_tools.auto_git',
+    'benchmark': 'classroom_tools.testing.benchmark',
+    'build_corpus': 'classroom_tools.plagiarism.build_corpus',
+    'change_branch_protection': 'classroom_tools.student_repositories.change_branch_protection',
+    'change_default_branch': 'classroom_tools.student_repositories.change_default_branch',
+    'check_against_corpus': 'classroom_tools.plagiarism.check_against_corpus',
+    'collect_grades': 'classroom_tools.grading.collect_grades',
+    'create_grades': 'classroom_tools.grading.create_grades',
+    'create_grading_branch_and_pull_request': 'classroom_tools.student_repositories.create_grading_branch_and_pull_request',
+    'create_protected_branch_from_master': 'classroom_tools.student_repositories.create_protected_branch_from_master',
+    'create_repos': 'classroom_tools.test_repositories.create_repos',
+    'create_student_repo': 'classroom_tools.student_repositories.create_student_repo',
+    'delete_file': 'classroom_tools.student_repositories.delete_file',
+    'delete_repos': 'classroom_tools.test_repositories.delete_repos',
+    'delete_workflow_runs': 'classroom_tools.delete_workflow_runs',
+    'delete_workflows': 'classroom_tools.student_repositories.delete_workflows',
+    'fake_github': 'classroom_tools.testing.fake_github',
+    'files_to_update': 'classroom_tools.verifications.files_to_update',
+    'grading_tests': 'classroom_tools.verifications.grading_tests',
+    'moss': 'classroom_tools.plagiarism.moss',
+    'moss_report': 'classroom_tools.plagiarism.moss_report',
+    'patch_db': 'classroom_tools.grading.patch_db',
+    'pipeline': 'classroom_tools.pipeline',
+    'repo_is_template': 'classroom_tools.verifications.repo_is_template',
+    'show_grades_in_readme': 'classroom_tools.grading.show_grades_in_readme',
+    'sync_with_template_repository': 'classroom_tools.student_repositories.sync_with_template_repository',
+    'trigger_workflows': 'classroom_tools.student_repositories.trigger_workflows',
+    'winnowing': 'classroom_tools.plagiarism.winnowing',
+}
+# Commands after which the memoized lists of student repositories are out of date
+CREATE_OR_DELETE_REPOSITORIES = {'create_repos', 'create_student_repo', 'delete_repos'}
+
+run_parser = argparse.ArgumentParser(
+    'classroom-tools run',
+    description='Run several commands in one process, sharing GitHub clients, token verification '
+                'and student repository lists between them'
+)
+run_parser.add_argument(
+    'commands',
+    nargs='*',
+    help='Commands with their arguments, each one quoted as a single argument'
+)
+run_parser.add_argument(
+    '--file',
+    default=None,
+    help='File with one command per line (blank lines and lines starting with # are ignored)'
+)
+run_parser.add_argument(
+    '--keep_going',
+    default=False,
+    action='store_true',
+    help='Run the remaining commands after one fails'
+)
+
+
+def _usage():
+    return (
+        'usage: classroom-tools <command> [args...]\n'
+        '       classroom-tools run "<command> [args...]" ["<command> [args...]" ...]\n\n'
+        'Commands:\n' + ''.join(f'\t{name}\n' for name in sorted(COMMANDS))
+    )
+
+
+def get_command(name):
+    name = name.replace('-', '_')
+    if name not in COMMANDS:
+        raise SystemExit(f'Unknown command: {name}\n\n{_usage()}')
+    return importlib.import_module(COMMANDS[name])
+
+
+def run_command(name, args):
+    get_command(name).main(args)
+    if name.replace('-', '_') in CREATE_OR_DELETE_REPOSITORIES and 'classroom_tools.github_utils' in sys.modules:
+        sys.modules['classroom_tools.github_utils'].forget_students_repositories()
+
+
+def run(args):
+    args = run_parser.parse_args(args)
+    steps = [shlex.split(command) for command in args.commands]
+    if args.file is not None:
+        with open(args.file, encoding='UTF-8') as f:
+            steps += [shlex.split(line) for line in f if line.strip() and not line.strip().startswith('#')]
+    failed = []
+    for i, (name, *command_args) in enumerate(steps):
+        start = time.perf_counter()
+        try:
+            run_command(name, command_args)
+        except (Exception, SystemExit) as e:
+            print(f'\nStep {i + 1}/{len(steps)} failed: {name}\n{e}')
+            failed.append(name)
+            if not args.keep_going:
+                raise
+        else:
+            print(f'\nStep {i + 1}/{len(steps)} done in {time.perf_counter() - start:.1f}s: {name}')
+    if len(failed) > 0:
+        raise Exception(f'Failed steps: {", ".join(failed)}')
+
+
+def main(args=None):
+    args = sys.argv[1:] if args is None else args
+    if len(args) == 0 or args[0] in ('-h', '--help'):
+        print(_usage())
+        return
+    name, *command_args = args
+    if name == 'run':
+        run(command_args)
+    else:
+        run_command(name, command_args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
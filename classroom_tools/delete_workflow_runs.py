@@ -1,7 +1,6 @@
 import argparse
-
-import github
-import requests
+import asyncio
+import concurrent.futures
 
 from classroom_tools import github_utils
 
@@ -26,13 +25,46 @@ parser.add_argument(
     action='store_true',
     help='Delete only workflow runs that failed'
 )
+parser.add_argument(
+    '--backend',
+    choices=github_utils.BACKENDS,
+    default='threads',
+    help='Send requests from a thread pool or from a single asyncio event loop (requires aiohttp)'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of workflow runs deleted concurrently with the threads backend'
+)
+parser.add_argument(
+    '--concurrency',
+    type=int,
+    default=github_utils.DEFAULT_CONCURRENCY,
+    help='Maximum number of requests in flight with the async backend'
+)
 
 
 def delete_workflow_run(workflow_run_url, token):
-    print(f'Deleting: {workflow_run_url}')
-    res = requests.delete(url=workflow_run_url,
-                          headers={'Authorization': f'token {token}'})
-    print('Success' if res.ok else 'Failed')
+    res = github_utils.request('DELETE', url=workflow_run_url, token=token)
+    # One print per run so that the lines of concurrent deletions don't interleave
+    print(f'Deleting: {workflow_run_url}\n' + ('Success' if res.ok else 'Failed'), flush=True)
+
+
+def delete_workflow_runs(workflow_run_urls, token, workers):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        list(executor.map(lambda url: delete_workflow_run(url, token), workflow_run_urls))
+
+
+async def delete_workflow_run_async(client, workflow_run_url):
+    res = await client.request('DELETE', workflow_run_url)
+    print(f'Deleting: {workflow_run_url}\n' + ('Success' if res.ok else 'Failed'), flush=True)
+
+
+async def delete_workflow_runs_async(workflow_run_urls, token, concurrency):
+    from classroom_tools import github_async
+    async with github_async.AsyncClient(token=token, concurrency=concurrency) as client:
+        await asyncio.gather(*(delete_workflow_run_async(client, url) for url in workflow_run_urls))
 
 
 def main(args):
@@ -40,12 +72,13 @@ def main(args):
     args = parser.parse_args(args)
     print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
     github_utils.verify_token(args.token)
-    g = github.Github(login_or_token=args.token)
+    g = github_utils.get_client(args.token)
     repo = g.get_repo(full_name_or_id=args.repo_fullname)
 
     workflow_dict = {}
+    workflow_run_urls = []
     for run in repo.get_workflow_runs():
-        workflow_name = repo.get_workflow(id_or_name=str(run.raw_data['workflow_id'])).name
+        workflow_name = repo.get_workflow(str(run.raw_data['workflow_id'])).name
         workflow_dict.setdefault(workflow_name, [])
         workflow_dict[workflow_name].append(run)
     for workflow_name, runs in workflow_dict.items():
@@ -60,15 +93,19 @@ def main(args):
                 for run in failed_runs:
                     if args.workflow_name_filter is not None:
                         if args.workflow_name_filter in workflow_name:
-                            delete_workflow_run(run.url, args.token)
+                            workflow_run_urls.append(run.url)
             else:
                 runs.sort(key=lambda run: run.created_at, reverse=True)
                 for run in runs[1:]:
                     if args.workflow_name_filter is not None:
                         if args.workflow_name_filter in workflow_name:
-                            delete_workflow_run(run.url, args.token)
+                            workflow_run_urls.append(run.url)
                     else:
-                        delete_workflow_run(run.url, args.token)
+                        workflow_run_urls.append(run.url)
+    if args.backend == 'async':
+        asyncio.run(delete_workflow_runs_async(workflow_run_urls, token=args.token, concurrency=args.concurrency))
+    else:
+        delete_workflow_runs(workflow_run_urls, token=args.token, workers=args.workers)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,198 @@
+import asyncio
+import base64
+import json
+import time
+import urllib.parse
+
+import github
+from colorama import Fore, Style
+
+from classroom_tools import github_utils, rate_limit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+BACKENDS = github_utils.BACKENDS
+DEFAULT_CONCURRENCY = github_utils.DEFAULT_CONCURRENCY
+
+
+class _Response:
+    # Mirrors the parts of requests.Response used by the rate limit scheduler and the helpers below
+    def __init__(self, method, url, status_code, headers, content):
+        self.method = method
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.ok = status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise github.GithubException(self.status_code, self.text, dict(self.headers))
+
+
+def _full_name(repo):
+    return repo if isinstance(repo, str) else repo.full_name
+
+
+class AsyncClient:
+    # Runs requests on a single event loop with at most `concurrency` of them in flight.
+    # Pacing and retries go through the same scheduler as the threaded backend
+    def __init__(self, token='', concurrency=DEFAULT_CONCURRENCY):
+        if aiohttp is None:
+            raise Exception(f'{Fore.RED}The async backend requires aiohttp: pip install classroom_tools[async]')
+        self.token = token
+        self.concurrency = concurrency
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        headers = {'Accept': 'application/vnd.github.v3+json'}
+        if self.token:
+            headers['Authorization'] = f'token {self.token}'
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            headers=headers,
+            connector=aiohttp.TCPConnector(limit=self.concurrency)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def request(self, method, url, **kwargs):
+        if url.startswith('/'):
+            url = github_utils.API_URL + url
+        resource = rate_limit.get_resource(url)
+        scheduler = github_utils.scheduler
+        async with self._semaphore:
+            for attempt in range(scheduler.max_retries + 1):
+                wait = scheduler.delay(method, resource)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                start = time.perf_counter()
+                async with self._session.request(method, url, **kwargs) as res:
+                    res = _Response(method, str(res.url), res.status, res.headers, await res.read())
+                elapsed = time.perf_counter() - start
+                github_utils.api_metrics.record(method, url, res, elapsed, len(res.content), retry=attempt > 0)
+                retry_after = scheduler.update(method, res)
+                if retry_after is None or attempt == scheduler.max_retries:
+                    return res
+                print(f'{Fore.YELLOW}Rate limited by GitHub, retrying in {retry_after:.0f}s: {method} {url}{Style.RESET_ALL}')
+        return res
+
+    async def get_repo(self, fullname):
+        res = await self.request('GET', f'/repos/{fullname}')
+        if not res.ok:
+            print(res.text)
+            raise Exception(f'Couldn\'t get repo: {fullname}')
+        return github_utils.get_client(self.token).create_from_raw_data(github.Repository.Repository, res.json())
+
+    async def get_students_repositories(self, org_name, repo_filter):
+        # The repository index needs a couple of requests at most, so it is read from a worker thread
+        return await asyncio.to_thread(
+            github_utils.get_students_repositories,
+            token=self.token,
+            org_name=org_name,
+            repo_filter=repo_filter
+        )
+
+    async def _get_contents_sha(self, repo, path, branch):
+        res = await self.request(
+            'GET',
+            f'/repos/{_full_name(repo)}/contents/{urllib.parse.quote(path)}',
+            params={'ref': branch}
+        )
+        if res.status_code == 404:
+            return None
+        res.raise_for_status()
+        return res.json()['sha']
+
+    async def _put_contents(self, repo, path, content, message, branch, sha=None):
+        data = {'message': message, 'content': base64.b64encode(content).decode('ascii'), 'branch': branch}
+        if sha is not None:
+            data['sha'] = sha
+        res = await self.request('PUT', f'/repos/{_full_name(repo)}/contents/{urllib.parse.quote(path)}', json=data)
+        res.raise_for_status()
+        return res.json()
+
+    async def delete_file(self, repo, path, branch='master', message='Deleted file'):
+        sha = await self._get_contents_sha(repo, path, branch)
+        if sha is None:
+            print(f'File doesn\'t exist: {path}')
+            return
+        res = await self.request(
+            'DELETE',
+            f'/repos/{_full_name(repo)}/contents/{urllib.parse.quote(path)}',
+            json={'message': message, 'sha': sha, 'branch': branch}
+        )
+        res.raise_for_status()
+        print(f'Deleted: {path}\n from: {_full_name(repo)}')
+
+    async def copy_file_to_repo(self, file, repo, branch='master', message='Auto sync with template repo'):
+        sha = await self._get_contents_sha(repo, file.path, branch)
+        if sha == file.sha:
+            return
+        content = await asyncio.to_thread(lambda: file.decoded_content)
+        await self._put_contents(repo, file.path, content, message, branch, sha=sha)
+
+    async def add_workflow(self, repo, path, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        sha = await self._get_contents_sha(repo, path, 'master')
+        await self._put_contents(repo, path, content, 'Auto added workflow', 'master', sha=sha)
+
+    async def create_repository_dispatch(self, repo, event_type, client_payload=None):
+        data = {'event_type': event_type}
+        if client_payload is not None:
+            data['client_payload'] = client_payload
+        res = await self.request('POST', f'/repos/{_full_name(repo)}/dispatches', json=data)
+        return res.status_code == 204
+
+    async def add_to_collaborators(self, repo, login, permission):
+        res = await self.request(
+            'PUT',
+            f'/repos/{_full_name(repo)}/collaborators/{urllib.parse.quote(login)}',
+            json={'permission': permission}
+        )
+        res.raise_for_status()
+
+    async def set_team_repo_permission(self, team_url, repo, permission):
+        res = await self.request('PUT', f'{team_url}/repos/{_full_name(repo)}', json={'permission': permission})
+        res.raise_for_status()
+
+
+async def _map_repositories(fn, repositories, token, concurrency, journal, operation):
+    async with AsyncClient(token=token, concurrency=concurrency) as client:
+        async def run(repo):
+            try:
+                result = await fn(client, repo)
+                if journal is not None:
+                    journal.record(repo.full_name, operation)
+                return repo, result, None
+            except Exception as e:
+                return repo, None, e
+
+        return await asyncio.gather(*(run(repo) for repo in repositories))
+
+
+def map_repositories(fn, repositories, token='', concurrency=DEFAULT_CONCURRENCY, reads_per_repo=0,
+                     writes_per_repo=0, journal=None, operation=''):
+    # Async counterpart of github_utils.map_repositories, fn is a coroutine function taking (client, repo).
+    # Results are returned in input order once every repository has been processed
+    repositories = github_utils.skip_completed(list(repositories), journal, operation)
+    if reads_per_repo or writes_per_repo:
+        github_utils.print_projected_budget(
+            num_requests=len(repositories) * (reads_per_repo + writes_per_repo),
+            num_mutations=len(repositories) * writes_per_repo
+        )
+    return asyncio.run(_map_repositories(fn, repositories, token, concurrency, journal, operation))
@@ -1,10 +1,213 @@
+import atexit
+import base64
+import hashlib
+import concurrent.futures
+import inspect
+import os
+import posixpath
+import sys
+import threading
+import time
+import urllib.parse
+
 import github
+import requests
 from colorama import Fore, Style
+from github.Requester import Requester, RequestsResponse
+
+from classroom_tools import blob_cache, http_cache, journal, metrics, rate_limit, repo_index
+
+API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+GRAPHQL_URL = os.environ.get('GITHUB_GRAPHQL_URL', f'{API_URL}/graphql')
+POOL_SIZE = 32
+KEEP_ALIVE = True
+DEFAULT_WORKERS = 8
+# The async backend (github_async) is only imported when selected, it loads aiohttp
+BACKENDS = ['threads', 'async']
+DEFAULT_CONCURRENCY = 100
+SNAPSHOT_BATCH_SIZE = 50
+CACHE_DIR = os.environ.get('CLASSROOM_TOOLS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'classroom_tools'))
+METRICS_PATH = os.environ.get('CLASSROOM_TOOLS_METRICS')
+# Seconds between writes, GitHub recommends at least one second to avoid secondary rate limits
+WRITE_INTERVAL = float(os.environ.get('CLASSROOM_TOOLS_WRITE_INTERVAL', 1.0))
+
+_lock = threading.RLock()
+_clients = {}
+_verified_tokens = set()
+_students_repositories = {}
+_session = None
+scheduler = rate_limit.RateLimitScheduler(mutation_interval=WRITE_INTERVAL)
+blobs = blob_cache.BlobCache(os.path.join(CACHE_DIR, 'blobs'))
+git_blob_sha = blob_cache.git_blob_sha
+response_cache = http_cache.HttpCache(os.path.join(CACHE_DIR, 'http_cache.sqlite'))
+api_metrics = metrics.Metrics()
+
+
+def _netrc_free_auth(request):
+    # A non-None session auth keeps requests from replacing the Authorization header with ~/.netrc credentials
+    return request
+
+
+def configure_connection_pool(pool_size=POOL_SIZE, keep_alive=KEEP_ALIVE):
+    global _session
+    with _lock:
+        globals().update(POOL_SIZE=pool_size, KEEP_ALIVE=keep_alive)
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            session.auth = _netrc_free_auth
+            adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            if not KEEP_ALIVE:
+                session.headers['Connection'] = 'close'
+            _session = session
+        return _session
+
+
+def _timed_request(method, url, retry=False, **kwargs):
+    start = time.perf_counter()
+    res = get_session().request(method=method, url=url, **kwargs)
+    elapsed = time.perf_counter() - start
+    num_bytes = int(res.headers.get('Content-Length') or 0) if kwargs.get('stream') else len(res.content)
+    api_metrics.record(method, url, res, elapsed, num_bytes, retry=retry)
+    return res
+
+
+def report_metrics():
+    if api_metrics.num_requests() == 0:
+        return
+    api_metrics.print_summary()
+    if METRICS_PATH:
+        try:
+            api_metrics.export(METRICS_PATH)
+        except OSError as e:
+            print(f'{Fore.YELLOW}Couldn\'t export metrics: {e}{Style.RESET_ALL}')
+
+
+# Printed once the command is done, after its own summary and even when it failed
+atexit.register(report_metrics)
+
+
+def _send(method, url, **kwargs):
+    if not url.startswith(API_URL):
+        return _timed_request(method, url, **kwargs)
+    headers = dict(kwargs.get('headers') or {})
+    conditional = any(name.lower() in ('if-none-match', 'if-modified-since') for name in headers)
+    if method.upper() != 'GET' or kwargs.get('stream') or conditional or not response_cache.enabled:
+        return _send_with_retries(method, url, **kwargs)
+    key = http_cache.cache_key(requests.Request(method, url, params=kwargs.get('params')).prepare().url, headers)
+    entry = response_cache.lookup(key)
+    if entry is not None:
+        headers.update(response_cache.conditional_headers(entry))
+        kwargs['headers'] = headers
+    res = _send_with_retries(method, url, **kwargs)
+    if res.status_code == 304 and entry is not None:
+        return response_cache.replay(key, entry, res)
+    response_cache.store(key, res)
+    return res
+
+
+def _send_with_retries(method, url, **kwargs):
+    resource = rate_limit.get_resource(url)
+    for attempt in range(scheduler.max_retries + 1):
+        wait = scheduler.delay(method, resource)
+        if wait > 0:
+            time.sleep(wait)
+        res = _timed_request(method, url, retry=attempt > 0, **kwargs)
+        retry_after = scheduler.update(method, res)
+        if retry_after is None or attempt == scheduler.max_retries:
+            return res
+        print(f'{Fore.YELLOW}Rate limited by GitHub, retrying in {retry_after:.0f}s: {method} {url}{Style.RESET_ALL}')
+    return res
+
+
+def request(method, url, token='', headers=None, **kwargs):
+    if url.startswith('/'):
+        url = API_URL + url
+    headers = dict(headers or {})
+    if token:
+        headers.setdefault('Authorization', f'token {token}')
+    return _send(method, url, headers=headers, **kwargs)
+
+
+def print_projected_budget(num_requests, num_mutations=0, resource='core'):
+    print('Projected API budget:')
+    print(f'\tRequests: ~{num_requests} ({num_mutations} writes)')
+    budget = scheduler.budgets.get(resource)
+    if budget is None:
+        print('\tRemaining: unknown\n')
+        return
+    reset = time.strftime('%H:%M:%S', time.localtime(budget.reset))
+    print(f'\tRemaining: {budget.remaining} / {budget.limit} requests per hour (resets at {reset})')
+    print(f'\tMinimum duration imposed by write pacing: {scheduler.projected_duration(num_mutations):.0f}s\n')
+    if num_requests > budget.remaining - scheduler.reserve:
+        print(f'{Fore.YELLOW}Run exceeds the remaining budget and will pause until {reset}{Style.RESET_ALL}\n')
+
+
+class _SharedSessionConnection:
+    # Stands in for PyGithub's connection classes so that every client shares the pooled session
+    protocol = 'https'
+
+    def __init__(self, host, port=None, strict=False, timeout=None, retry=None, pool_size=None, **kwargs):
+        self.host = host
+        self.port = port if port else (443 if self.protocol == 'https' else 80)
+        self.timeout = timeout
+        self.verify = kwargs.get('verify', True)
+
+    def request(self, verb, url, input, headers, stream=False):
+        self.verb = verb
+        self.url = url
+        self.input = input
+        self.headers = headers
+        self.stream = stream
+
+    def getresponse(self):
+        res = _send(
+            method=self.verb,
+            url=f'{self.protocol}://{self.host}:{self.port}{self.url}',
+            headers=self.headers,
+            data=self.input,
+            timeout=self.timeout,
+            verify=self.verify,
+            stream=self.stream,
+            allow_redirects=False
+        )
+        return RequestsResponse(res)
+
+    def close(self):
+        pass
+
+
+class _SharedSessionHTTPConnection(_SharedSessionConnection):
+    protocol = 'http'
+
+
+def get_client(token=''):
+    with _lock:
+        if token not in _clients:
+            Requester.injectConnectionClasses(_SharedSessionHTTPConnection, _SharedSessionConnection)
+            kwargs = {}
+            if 'seconds_between_requests' in inspect.signature(github.Github).parameters:
+                # Pacing is handled by the shared scheduler
+                kwargs.update(seconds_between_requests=None, seconds_between_writes=None)
+            _clients[token] = github.Github(login_or_token=token or None, base_url=API_URL, per_page=100, **kwargs)
+        return _clients[token]
 
 
 def verify_token(token):
+    # Commands run in the same process (classroom-tools run) verify each token once
+    if token in _verified_tokens:
+        return
     try:
-        g = github.Github(login_or_token=token)
+        g = get_client(token)
         print(
             f'Personal access token rate limiting:\n'
             f'\t{g.rate_limiting[0]} remaining / {g.rate_limiting[1]} requests per hour'
@@ -12,6 +215,7 @@ def verify_token(token):
         print('Personal access token permissions (oauth scopes):\n\t' + '\n\t'.join(g.oauth_scopes) + '\n')
     except github.BadCredentialsException as e:
         raise Exception(f'{Fore.RED}Token expired or not provided{Style.RESET_ALL}')
+    _verified_tokens.add(token)
 
 
 def delete_file(repo, path, branch='master', message='Deleted file'):
@@ -28,6 +232,76 @@ def delete_file(repo, path, branch='master', message='Deleted file'):
         print(f'File doesn\'t exist: {path}')
 
 
+def delete_files(repo, paths, branch='master', message='Deleted files'):
+    if len(paths) == 1:
+        # A single file is cheaper to delete through the contents API
+        delete_file(repo, paths[0], branch=branch, message=message)
+        return
+    tree = get_tree(repo, ref=branch)
+    existing_paths = set(map(lambda file: file.path, tree)) if tree is not None else None
+    changes = {}
+    for path in paths:
+        if existing_paths is not None and path not in existing_paths:
+            print(f'File doesn\'t exist: {path}')
+        else:
+            changes[path] = None
+    if apply_changeset(repo, changes, branch=branch, message=message, current_tree=tree) is not None:
+        for path in sorted(changes):
+            print(f'Deleted: {path}\n from: {repo.full_name}')
+
+
+def _drop_unchanged(changes, modes, current_tree):
+    current = {file.path: (file.sha, file.mode) for file in current_tree}
+    changed = {}
+    for path, content in changes.items():
+        if content is None:
+            if path in current:
+                changed[path] = content
+        elif path not in current:
+            changed[path] = content
+        else:
+            sha, mode = current[path]
+            if sha != git_blob_sha(content) or mode != modes.get(path, mode):
+                changed[path] = content
+    return changed
+
+
+def apply_changeset(repo, changes, branch='master', message='Auto sync with template repo', modes=None,
+                    current_tree=None):
+    # Writes all changes (path -> new content, or None to delete the path) as a single commit.
+    # Paths whose blob sha already matches the branch are left untouched, so a no-op costs a single tree request.
+    modes = modes or {}
+    if len(changes) == 0:
+        return None
+    if current_tree is None:
+        current_tree = get_tree(repo, ref=branch)
+    if current_tree is not None:
+        changes = _drop_unchanged(changes, modes, current_tree)
+        if len(changes) == 0:
+            return None
+    ref = repo.get_git_ref(f'heads/{branch}')
+    head = repo.get_git_commit(ref.object.sha)
+    elements = []
+    for path, content in sorted(changes.items()):
+        mode = modes.get(path, '100644')
+        if content is None:
+            elements.append(github.InputGitTreeElement(path=path, mode=mode, type='blob', sha=None))
+            continue
+        try:
+            elements.append(
+                github.InputGitTreeElement(path=path, mode=mode, type='blob', content=content.decode('utf-8'))
+            )
+        except UnicodeDecodeError:
+            blob = repo.create_git_blob(content=base64.b64encode(content).decode('ascii'), encoding='base64')
+            elements.append(github.InputGitTreeElement(path=path, mode=mode, type='blob', sha=blob.sha))
+    tree = repo.create_git_tree(tree=elements, base_tree=head.tree)
+    if tree.sha == head.tree.sha:
+        return None
+    commit = repo.create_git_commit(message=message, tree=tree, parents=[head])
+    ref.edit(sha=commit.sha)
+    return commit
+
+
 def copy_file_to_repo(file, repo, branch='master', message='Auto sync with template repo'):
     try:
         print(file.path)
@@ -50,66 +324,440 @@ def copy_file_to_repo(file, repo, branch='master', message='Auto sync with templ
         )
 
 
-def get_files_from_repo(repo, path):
-    contents = repo.get_contents(path=path)
-    for content in contents:
+class TreeFile:
+    # Lightweight stand-in for ContentFile built from a git tree entry, the content is downloaded on first access
+    def __init__(self, repo, path, sha, size=None, mode='100644'):
+        self.repo = repo
+        self.path = path
+        self.sha = sha
+        self.size = size
+        self.mode = mode
+        self.type = 'file'
+        self._content = None
+        # Template files are read by every worker, the first one downloads the content for the others
+        self._content_lock = threading.Lock()
+
+    @property
+    def name(self):
+        return posixpath.basename(self.path)
+
+    @property
+    def decoded_content(self):
+        if self._content is None:
+            with self._content_lock:
+                if self._content is None:
+                    self._content = get_blob_content(self.repo, self.sha)
+        return self._content
+
+    def __repr__(self):
+        return f'TreeFile(path="{self.path}", sha="{self.sha}")'
+
+
+def get_blob_content(repo, sha):
+    content = blobs.get(sha)
+    if content is None:
+        blob = repo.get_git_blob(sha)
+        if blob.encoding == 'base64':
+            content = base64.b64decode(blob.content)
+        else:
+            content = blob.content.encode('utf-8')
+        blobs.put(sha, content)
+    return content
+
+
+def _get_files_from_contents(repo, path, ref):
+    contents = repo.get_contents(path=path, ref=ref)
+    for content in contents if isinstance(contents, list) else [contents]:
         if content.type == 'dir':
-            for _content in get_files_from_repo(repo, content.path):
+            for _content in _get_files_from_contents(repo, content.path, ref):
                 yield _content
         else:
+            yield TreeFile(repo=repo, path=content.path, sha=content.sha, size=content.size)
+
+
+def get_tree(repo, ref=None):
+    ref = ref or repo.default_branch
+    tree = repo.get_git_tree(sha=ref, recursive=True)
+    if tree.raw_data.get('truncated'):
+        return None
+    return [
+        TreeFile(repo=repo, path=element.path, sha=element.sha, size=element.size, mode=element.mode)
+        for element in tree.tree
+        if element.type == 'blob'
+    ]
+
+
+def get_files_from_repo(repo, path, ref=None):
+    ref = ref or repo.default_branch
+    tree = get_tree(repo, ref=ref)
+    if tree is None:
+        # Trees with too many entries are truncated by the API, list them one directory at a time
+        for content in _get_files_from_contents(repo, path, ref):
             yield content
+        return
+    path = path.strip('/')
+    for file in tree:
+        if path == '' or file.path == path or file.path.startswith(path + '/'):
+            yield file
+
+
+def get_file(repo, path, ref=None):
+    for file in get_files_from_repo(repo, path, ref=ref):
+        if file.path == path:
+            return file
+    raise github.UnknownObjectException(404, {'message': f'File not found: {path}'}, None)
 
 
 def get_repo(fullname, token=''):
     try:
-        g = github.Github(login_or_token=token)
+        g = get_client(token)
         return g.get_repo(full_name_or_id=fullname)
     except Exception as e:
         print(e)
         raise Exception(f'Couldn\'t get repo: {fullname}')
 
 
-def get_students_repositories(token, org_name, repo_filter):
+def _get_repo_index(org_name):
+    host = urllib.parse.urlparse(API_URL).netloc.replace(':', '_')
+    return repo_index.RepoIndex(os.path.join(CACHE_DIR, 'repo_index', f'{host}_{org_name.lower()}.json'))
+
+
+def get_journal(name, org_name, repo_filter, resume=False):
+    host = urllib.parse.urlparse(API_URL).netloc.replace(':', '_')
+    run = hashlib.sha1(f'{org_name.lower()}\n{repo_filter}'.encode('utf-8')).hexdigest()[:16]
+    return journal.Journal(os.path.join(CACHE_DIR, 'journals', f'{name}_{host}_{run}.jsonl'), resume=resume)
+
+
+def skip_completed(repositories, journal, operation):
+    if journal is None:
+        return list(repositories)
+    remaining = [repo for repo in repositories if not journal.is_done(repo.full_name, operation)]
+    num_skipped = len(repositories) - len(remaining)
+    if num_skipped > 0:
+        print(f'{Fore.YELLOW}Resuming: skipping {num_skipped} repositories completed by a previous run{Style.RESET_ALL}')
+    return remaining
+
+
+def forget_students_repositories():
+    with _lock:
+        _students_repositories.clear()
+
+
+def forget_repositories(org_name, full_names):
+    # Deleted repositories stay in the index until the next full listing unless they are removed from it
+    with _lock:
+        index = _get_repo_index(org_name)
+        index.remove(full_names)
+        try:
+            index.save()
+        except OSError as e:
+            print(f'{Fore.YELLOW}Couldn\'t save repository index: {e}{Style.RESET_ALL}')
+        _students_repositories.clear()
+
+
+# Error of the repositories map_repositories found deleted
+_DELETED = object()
+
+
+def _is_deleted(repo):
+    # Errors don't tell a deleted repository from e.g. a missing file or branch, the repository itself is looked
+    # up with the same client
+    try:
+        status, headers, data = repo._requester.requestJson('GET', repo.url)
+    except Exception:
+        return False
+    return status == 404
+
+
+def get_students_repositories(token, org_name, repo_filter, use_index=True):
     repo_filter = repo_filter.replace(' ', '')
     if repo_filter == '':
         raise Exception(f'{Fore.RED}repo_filter in settings/variables.txt can\'t be empty')
+    key = (token, org_name, repo_filter, use_index)
+    with _lock:
+        if key not in _students_repositories:
+            _students_repositories[key] = _get_students_repositories(token, org_name, repo_filter, use_index)
+        return list(_students_repositories[key])
+
+
+def _get_students_repositories(token, org_name, repo_filter, use_index):
     try:
-        g = github.Github(login_or_token=token)
-        org = g.get_organization(login=org_name)
+        g = get_client(token)
+        org = g.get_organization(org_name)
     except github.GithubException as e:
         print(f'{Fore.RED}Couldn\'t get organization: {org_name}')
         raise e
-    org_repos = list(org.get_repos())
-    student_repos = list(
-        filter(
-            lambda repo: repo_filter in repo.name,
-            org_repos
+    if use_index:
+        index = _get_repo_index(org_name)
+        index.update(
+            get=lambda url, params: request('GET', url=url, token=token, params=params),
+            org_name=org_name,
+            repo_filter=repo_filter
         )
-    )
-    if len(org_repos) == 0:
+        try:
+            index.save()
+        except OSError as e:
+            print(f'{Fore.YELLOW}Couldn\'t save repository index: {e}{Style.RESET_ALL}')
+        org_repo_names = index.names()
+        student_repos = [
+            g.create_from_raw_data(github.Repository.Repository, raw_data)
+            for raw_data in index.matching(repo_filter)
+        ]
+    else:
+        org_repos = list(org.get_repos())
+        org_repo_names = [repo.name for repo in org_repos]
+        student_repos = list(
+            filter(
+                lambda repo: repo_filter in repo.name,
+                org_repos
+            )
+        )
+    if len(org_repo_names) == 0:
         raise Exception(f'{Fore.RED}Org has no repositories: {org_name}')
     elif len(student_repos) == 0:
         print(f'{Fore.YELLOW}Here are the repositories in org: {org_name}')
-        for repo in org_repos:
-            print(f'{Fore.YELLOW}\t{repo.name}')
+        for name in org_repo_names:
+            print(f'{Fore.YELLOW}\t{name}')
         raise Exception(f'{Fore.RED}No repositories matched: {repo_filter}')
     return student_repos
 
 
-def delete_all_workflows(repo, branch='master'):
-    deleted = set()
-    try:
-        contents = repo.get_contents(path='.github/workflows', ref=branch)
-        for content_file in contents:
-            repo.delete_file(
-                path=content_file.path,
-                message='Auto deleted workflow',
-                sha=content_file.sha,
-                branch=branch
+_REPOSITORY_FIELDS = '''
+    name
+    defaultBranchRef { name }
+    refs(refPrefix: "refs/heads/", first: 100) {
+      pageInfo { hasNextPage }
+      nodes { name target { oid } branchProtectionRule { pattern } }
+    }
+    collaborators(affiliation: ALL, first: 100) {
+      pageInfo { hasNextPage }
+      edges { permission node { login } }
+    }
+    pullRequests(states: OPEN, first: 50) {
+      pageInfo { hasNextPage }
+      nodes { number title baseRefName headRefName }
+    }
+'''
+
+_TEAMS_QUERY = '''
+query($org: String!, $filter: String, $cursor: String) {
+  organization(login: $org) {
+    teams(first: 50, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        slug
+        repositories(query: $filter, first: 100) {
+          pageInfo { hasNextPage endCursor }
+          edges { permission node { name } }
+        }
+      }
+    }
+  }
+}
+'''
+
+_TEAM_REPOSITORIES_QUERY = '''
+query($org: String!, $slug: String!, $filter: String, $cursor: String) {
+  organization(login: $org) {
+    team(slug: $slug) {
+      repositories(query: $filter, first: 100, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        edges { permission node { name } }
+      }
+    }
+  }
+}
+'''
+
+# GraphQL permissions as named by the REST API
+_PERMISSIONS = {'ADMIN': 'admin', 'MAINTAIN': 'maintain', 'WRITE': 'push', 'TRIAGE': 'triage', 'READ': 'pull'}
+
+
+def graphql(query, variables=None, token=''):
+    res = request('POST', url=GRAPHQL_URL, token=token, json={'query': query, 'variables': variables or {}})
+    if not res.ok:
+        raise Exception(f'{Fore.RED}GraphQL request failed ({res.status_code}): {res.text}')
+    data = res.json()
+    if data.get('data') is None:
+        raise Exception(f'{Fore.RED}GraphQL request failed: {data.get("errors")}')
+    return data['data'], data.get('errors', [])
+
+
+class RepositorySnapshot:
+    # Branches, collaborators, teams and open pull requests of a repository fetched in one batched GraphQL query.
+    # Values are PyGithub objects built from raw data so that they can be used like the REST results
+    def __init__(self, repo, default_branch, branches, collaborators, teams, pulls):
+        self.repo = repo
+        self.default_branch = default_branch
+        self.branches = branches
+        self.collaborators = collaborators
+        self.teams = teams
+        self.pulls = pulls
+
+    def get_branch(self, name):
+        if name not in self.branches:
+            raise github.UnknownObjectException(404, {'message': f'Branch not found: {name}'}, None)
+        return self.branches[name]
+
+    def get_pulls(self, base=None, head=None):
+        return [
+            pull for pull in self.pulls
+            if (base is None or pull.base.ref == base) and (head is None or pull.head.ref == head)
+        ]
+
+
+def _get_team_permissions(g, token, org_name, repo_filter):
+    # Repository name -> teams with their permission on that repository
+    teams = {}
+
+    def add(team, edges):
+        for edge in edges:
+            teams.setdefault(edge['node']['name'], []).append(
+                g.create_from_raw_data(
+                    github.Team.Team,
+                    {
+                        'name': team['name'],
+                        'slug': team['slug'],
+                        'permission': _PERMISSIONS[edge['permission']],
+                        'url': f'{API_URL}/orgs/{org_name}/teams/{team["slug"]}'
+                    }
+                )
             )
-            deleted.add(content_file.path)
-    except github.UnknownObjectException:
-        pass
+
+    cursor = None
+    while True:
+        data, _ = graphql(_TEAMS_QUERY, {'org': org_name, 'filter': repo_filter, 'cursor': cursor}, token=token)
+        page = data['organization']['teams']
+        for team in page['nodes']:
+            repositories = team['repositories']
+            add(team, repositories['edges'])
+            while repositories['pageInfo']['hasNextPage']:
+                data, _ = graphql(
+                    _TEAM_REPOSITORIES_QUERY,
+                    {
+                        'org': org_name,
+                        'slug': team['slug'],
+                        'filter': repo_filter,
+                        'cursor': repositories['pageInfo']['endCursor']
+                    },
+                    token=token
+                )
+                repositories = data['organization']['team']['repositories']
+                add(team, repositories['edges'])
+        if not page['pageInfo']['hasNextPage']:
+            return teams
+        cursor = page['pageInfo']['endCursor']
+
+
+def _create_snapshot(g, repo, raw_data, teams):
+    # Connections with more results than a single page are read again through the REST API
+    refs = raw_data['refs']
+    if refs['pageInfo']['hasNextPage']:
+        branches = {branch.name: branch for branch in repo.get_branches()}
+    else:
+        branches = {
+            ref['name']: g.create_from_raw_data(
+                github.Branch.Branch,
+                {
+                    'name': ref['name'],
+                    'protected': ref['branchProtectionRule'] is not None,
+                    'protection_url': f'{repo.url}/branches/{ref["name"]}/protection',
+                    'commit': {'sha': ref['target']['oid'], 'url': f'{repo.url}/commits/{ref["target"]["oid"]}'}
+                }
+            )
+            for ref in refs['nodes']
+        }
+    collaborators = raw_data['collaborators']
+    if collaborators is None or collaborators['pageInfo']['hasNextPage']:
+        collaborators = list(repo.get_collaborators(affiliation='all'))
+    else:
+        collaborators = [
+            g.create_from_raw_data(
+                github.NamedUser.NamedUser,
+                {
+                    'login': edge['node']['login'],
+                    'url': f'{API_URL}/users/{edge["node"]["login"]}',
+                    'permissions': {
+                        'admin': edge['permission'] == 'ADMIN',
+                        'maintain': edge['permission'] in ('ADMIN', 'MAINTAIN'),
+                        'push': edge['permission'] in ('ADMIN', 'MAINTAIN', 'WRITE'),
+                        'triage': edge['permission'] in ('ADMIN', 'MAINTAIN', 'WRITE', 'TRIAGE'),
+                        'pull': True
+                    }
+                }
+            )
+            for edge in collaborators['edges']
+        ]
+    pulls = raw_data['pullRequests']
+    if pulls['pageInfo']['hasNextPage']:
+        pulls = list(repo.get_pulls(state='open'))
+    else:
+        pulls = [
+            g.create_from_raw_data(
+                github.PullRequest.PullRequest,
+                {
+                    'number': pull['number'],
+                    'title': pull['title'],
+                    'url': f'{repo.url}/pulls/{pull["number"]}',
+                    'base': {'ref': pull['baseRefName']},
+                    'head': {'ref': pull['headRefName']}
+                }
+            )
+            for pull in pulls['nodes']
+        ]
+    return RepositorySnapshot(
+        repo=repo,
+        default_branch=raw_data['defaultBranchRef']['name'] if raw_data['defaultBranchRef'] else None,
+        branches=branches,
+        collaborators=collaborators,
+        teams=teams,
+        pulls=pulls
+    )
+
+
+def get_repositories_snapshot(token, repositories, repo_filter=''):
+    # Reads cost one GraphQL request per SNAPSHOT_BATCH_SIZE repositories instead of several REST requests each.
+    # Repositories that couldn't be read are left out, callers fall back to the REST API for them
+    g = get_client(token)
+    repositories = list(repositories)
+    snapshots = {}
+    teams = {}
+    for org_name in sorted(set(repo.full_name.split('/')[0] for repo in repositories)):
+        for name, org_teams in _get_team_permissions(g, token, org_name, repo_filter).items():
+            teams[f'{org_name}/{name}'] = org_teams
+    for i in range(0, len(repositories), SNAPSHOT_BATCH_SIZE):
+        batch = repositories[i:i + SNAPSHOT_BATCH_SIZE]
+        variables = {}
+        fields = []
+        for j, repo in enumerate(batch):
+            owner, name = repo.full_name.split('/')
+            variables.update({f'owner{j}': owner, f'name{j}': name})
+            fields.append(f'repo{j}: repository(owner: $owner{j}, name: $name{j}) {{{_REPOSITORY_FIELDS}}}')
+        parameters = ', '.join(f'$owner{j}: String!, $name{j}: String!' for j in range(len(batch)))
+        data, errors = graphql(f'query({parameters}) {{\n' + '\n'.join(fields) + '\n}', variables, token=token)
+        for error in errors:
+            print(f'{Fore.YELLOW}{error.get("message")}{Style.RESET_ALL}')
+        for j, repo in enumerate(batch):
+            raw_data = data.get(f'repo{j}')
+            if raw_data is not None:
+                snapshots[repo.full_name] = _create_snapshot(g, repo, raw_data, teams.get(repo.full_name, []))
+    return snapshots
+
+
+def delete_all_workflows(repo, branch='master'):
+    tree = get_tree(repo, ref=branch)
+    files = tree
+    if tree is None:
+        try:
+            files = repo.get_contents(path='.github/workflows', ref=branch)
+        except github.UnknownObjectException:
+            files = []
+    deleted = set(
+        file.path for file in files
+        if posixpath.dirname(file.path) == '.github/workflows' and file.type == 'file'
+    )
+    apply_changeset(repo, dict.fromkeys(deleted), branch=branch, message='Auto deleted workflow', current_tree=tree)
     return deleted
 
 
@@ -130,3 +778,70 @@ def add_workflow(repo, path, content):
             content=content,
             branch='master'
         )
+
+
+class BufferedStdout:
+    # Collects what worker threads print so each repository's output is written in input order
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            return self.stdout.write(text)
+        buffer.append(text)
+        return len(text)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stdout.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stdout, name)
+
+
+def map_repositories(fn, repositories, workers=DEFAULT_WORKERS, reads_per_repo=0, writes_per_repo=0, journal=None,
+                     operation=''):
+    # Repositories the journal marks as done are skipped, the ones fn completes without raising are recorded
+    repositories = skip_completed(list(repositories), journal, operation)
+    if reads_per_repo or writes_per_repo:
+        print_projected_budget(
+            num_requests=len(repositories) * (reads_per_repo + writes_per_repo),
+            num_mutations=len(repositories) * writes_per_repo
+        )
+    installed = not isinstance(sys.stdout, BufferedStdout)
+    stdout = BufferedStdout(sys.stdout) if installed else sys.stdout
+
+    def run(repo):
+        stdout.local.buffer = []
+        try:
+            result, error = fn(repo), None
+            if journal is not None:
+                journal.record(repo.full_name, operation)
+        except Exception as e:
+            result, error = None, e
+            if _is_deleted(repo):
+                error = _DELETED
+        finally:
+            output = ''.join(stdout.local.buffer)
+            stdout.local.buffer = None
+        return output, result, error
+
+    sys.stdout = stdout
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            deleted = []
+            for repo, (output, result, error) in zip(repositories, executor.map(run, repositories)):
+                stdout.write(output)
+                if error is _DELETED:
+                    # Repositories deleted since the index was refreshed are skipped like a listing would
+                    print(f'{Fore.YELLOW}Skipping deleted repository: {repo.full_name}{Style.RESET_ALL}')
+                    deleted.append(repo)
+                    continue
+                yield repo, result, error
+            if len(deleted) > 0:
+                forget_repositories(deleted[0].owner.login, [repo.full_name for repo in deleted])
+    finally:
+        if installed:
+            sys.stdout = stdout.stdout
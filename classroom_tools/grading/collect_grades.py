@@ -0,0 +1,255 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import github
+from colorama import Fore
+
+from classroom_tools import github_utils
+from classroom_tools.grading import create_grades, test_results
+
+parser = argparse.ArgumentParser('Collect the grades of every student repository into one table')
+parser.add_argument(
+    '--token',
+    required=True,
+    help='GitHub personal access token with repo permissions'
+)
+parser.add_argument(
+    '--org_name',
+    required=True,
+    help='GitHub organization name'
+)
+parser.add_argument(
+    '--repo_filter',
+    required=True,
+    help='Prefix to filter repositories for as given assignment or exercise'
+)
+parser.add_argument(
+    '--path',
+    default='logs/grades.json',
+    help='Path of the grades (written by create_grades) or of the test results in the student repositories'
+)
+parser.add_argument(
+    '--ref',
+    default=None,
+    help='Branch, tag or commit of the student repositories to collect (default: their default branch)'
+)
+parser.add_argument(
+    '--test_associations_path',
+    default=None,
+    help='Path to test_associations.json, required when --path is a test results file'
+)
+parser.add_argument(
+    '--format',
+    default='auto',
+    choices=test_results.FORMATS,
+    help='Format of the test results when --path isn\'t a grades.json'
+)
+parser.add_argument(
+    '--output',
+    default=None,
+    help='Path without extension of the .sqlite and .csv files (default: grades/<org_name>_<repo_filter>)'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories collected concurrently'
+)
+
+
+class GradeStore:
+    # Grades of every repository with the blob SHA of the file they were read from, so that a refresh only
+    # downloads the files that changed
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            head, tail = os.path.split(self.path)
+            if head and not os.path.exists(head): os.makedirs(head, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS repos ('
+                'repo TEXT PRIMARY KEY, ref TEXT, pushed_at TEXT, sha TEXT, score REAL, total REAL, '
+                'collected_at REAL)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS grades ('
+                'repo TEXT, position INTEGER, func_name TEXT, test_name TEXT, points REAL, passing INTEGER, '
+                'status TEXT, PRIMARY KEY (repo, position))'
+            )
+            self._connection = connection
+        return self._connection
+
+    def get(self, repo_name):
+        # Returns (ref, pushed_at, sha) of the last collection
+        with self._lock:
+            return self._connect().execute(
+                'SELECT ref, pushed_at, sha FROM repos WHERE repo = ?', (repo_name,)
+            ).fetchone()
+
+    def repo_names(self):
+        with self._lock:
+            return [row[0] for row in self._connect().execute('SELECT repo FROM repos')]
+
+    def set_pushed_at(self, repo_name, pushed_at):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('UPDATE repos SET pushed_at = ? WHERE repo = ?', (pushed_at, repo_name))
+
+    def put(self, repo_name, ref, pushed_at, sha, grades):
+        # Grades without a file (sha None) are stored empty, the repository shows up without a score
+        total = sum(float(grade['points']) for grade in grades)
+        score = sum(float(grade['points']) for grade in grades if grade['passing'])
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('DELETE FROM grades WHERE repo = ?', (repo_name,))
+                connection.execute(
+                    'INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (repo_name, ref, pushed_at, sha, score if sha else None, total if sha else None, time.time())
+                )
+                connection.executemany(
+                    'INSERT INTO grades VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [
+                        (repo_name, position, grade.get('func_name'), grade['test_name'], float(grade['points']),
+                         int(bool(grade['passing'])), grade.get('status'))
+                        for position, grade in enumerate(grades)
+                    ]
+                )
+
+    def remove(self, repo_names):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                for repo_name in repo_names:
+                    connection.execute('DELETE FROM grades WHERE repo = ?', (repo_name,))
+                    connection.execute('DELETE FROM repos WHERE repo = ?', (repo_name,))
+
+    def export_csv(self, path):
+        # One row per repository and one column per test with the points obtained
+        with self._lock:
+            connection = self._connect()
+            tests = [
+                row[0] for row in
+                connection.execute('SELECT test_name FROM grades GROUP BY test_name ORDER BY MIN(position), test_name')
+            ]
+            points = {}
+            for repo_name, test_name, test_points, passing in connection.execute(
+                    'SELECT repo, test_name, points, passing FROM grades'):
+                points[repo_name, test_name] = test_points if passing else 0
+            repos = connection.execute('SELECT repo, ref, sha, score, total FROM repos ORDER BY repo').fetchall()
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='UTF-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['repo', 'ref', 'sha'] + tests + ['score', 'total'])
+            for repo_name, ref, sha, score, total in repos:
+                writer.writerow(
+                    [repo_name, ref, sha] + [points.get((repo_name, test), '') for test in tests] + [score, total]
+                )
+        os.replace(tmp_path, path)
+
+    def summary(self):
+        with self._lock:
+            return self._connect().execute(
+                'SELECT COUNT(*), COUNT(sha), AVG(score), AVG(total) FROM repos'
+            ).fetchone()
+
+
+def get_store(output, org_name, repo_filter):
+    output = output or os.path.join('grades', f'{org_name}_{repo_filter}')
+    return GradeStore(f'{output}.sqlite'), f'{output}.csv'
+
+
+def parse_grades(content, path, tests_associations=None, log_format='auto'):
+    if log_format == 'auto' and path.endswith('.json'):
+        return json.loads(content.decode('utf-8'))
+    if tests_associations is None:
+        raise Exception(f'{Fore.RED}--test_associations_path is required to grade {path}')
+    # The parsers read files, the extension is kept for the format detection
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = os.path.join(directory, os.path.basename(path))
+        with open(log_file, 'wb') as f:
+            f.write(content)
+        results = create_grades.get_tests_results(log_file, log_format)
+    create_grades.add_tests_info(results, tests_associations)
+    return results
+
+
+def collect(repo, store, path, ref=None, tests_associations=None, log_format='auto'):
+    # Returns "unchanged", "updated" or "missing" (the repository has no such file at ref). Changes are found
+    # from the blob SHA of the file: the pushed_at of the listed repositories can be older than the last push
+    ref = ref or repo.default_branch
+    pushed_at = str(repo.pushed_at)
+    previous = store.get(repo.name)
+    try:
+        file = github_utils.get_file(repo=repo, path=path, ref=ref)
+    except github.UnknownObjectException:
+        store.put(repo.name, ref, pushed_at, None, [])
+        return 'missing'
+    if previous is not None and previous[0] == ref and previous[2] == file.sha:
+        store.set_pushed_at(repo.name, pushed_at)
+        return 'unchanged'
+    grades = parse_grades(file.decoded_content, path, tests_associations, log_format)
+    store.put(repo.name, ref, pushed_at, file.sha, grades)
+    return 'updated'
+
+
+def main(args):
+    print('\n\n' + 'Collecting grades'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items() if k != 'token'))
+    github_utils.verify_token(args.token)
+    tests_associations = None
+    if args.test_associations_path is not None:
+        tests_associations = create_grades.load_tests_associations(args.test_associations_path)
+    store, csv_path = get_store(args.output, args.org_name, args.repo_filter)
+    repositories = github_utils.get_students_repositories(
+        token=args.token,
+        org_name=args.org_name,
+        repo_filter=args.repo_filter
+    )
+    names = {repo.name for repo in repositories}
+    store.remove([name for name in store.repo_names() if name not in names])
+    counts = {'updated': 0, 'unchanged': 0, 'missing': 0}
+    num_fail = 0
+    for repo, result, error in github_utils.map_repositories(
+            lambda repo: collect(repo, store, args.path, args.ref, tests_associations, args.format),
+            repositories,
+            workers=args.workers
+    ):
+        if error is not None:
+            print(f'{Fore.RED}{repo.name}: {error}')
+            num_fail += 1
+            continue
+        counts[result] += 1
+        if result == 'missing':
+            print(f'{Fore.YELLOW}{repo.name}: no {args.path}')
+    store.export_csv(csv_path)
+    num_repos, num_graded, average, total = store.summary()
+    print('\nSummary:')
+    print(f'\tNumber of repositories: {num_repos}')
+    print(f'\tNumber of updated: {counts["updated"]}')
+    print(f'\tNumber of unchanged: {counts["unchanged"]}')
+    print(f'\tNumber without {args.path}: {counts["missing"]}')
+    print(f'\tNumber of failed: {num_fail}')
+    if num_graded > 0:
+        print(f'\tAverage score: {average:.1f}/{total:.1f}')
+    print(f'\tGrades located at:\n\t\t{store.path}\n\t\t{csv_path}')
+    if num_fail > 0:
+        raise Exception(f'{Fore.RED}Couldn\'t collect the grades of {num_fail} repositories, run again to retry them')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
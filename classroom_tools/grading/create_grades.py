@@ -6,29 +6,32 @@ import os
 
 from colorama import Fore
 
+from classroom_tools.grading import test_results
+
 parser = argparse.ArgumentParser()
 parser.add_argument(
         '--test_associations_path',
         required=True,
         help='Path to test_associations.json'
 )
+parser.add_argument(
+        '--log_path',
+        default='logs/tests_results.txt',
+        help='Path to the test results: unittest verbose output, JUnit XML (e.g. pytest --junitxml) or TAP'
+)
+parser.add_argument(
+        '--format',
+        default='auto',
+        choices=test_results.FORMATS,
+        help='Format of the test results (default: detected from the file)'
+)
 
 
-def get_tests_results(log_file):
-    with open(log_file) as f:
-        results = []
-        for line in f.readlines():
-            test_fn_name, *_ = line.split(' ')
-            if ' ok' in line:
-                results.append({'func_name': test_fn_name, 'passing': True})
-            elif ' ERROR' in line or ' FAIL' in line:
-                results.append({'func_name': test_fn_name, 'passing': False})
-            else:
-                break
-    return results
+def get_tests_results(log_file, log_format='auto'):
+    return list(test_results.parse(log_file, log_format))
 
 
-def add_tests_info(results, tests_associations_file):
+def load_tests_associations(tests_associations_file):
     with open(tests_associations_file, encoding='UTF-8') as f:
         try:
             tests_associations = json.load(f)
@@ -37,10 +40,37 @@ def add_tests_info(results, tests_associations_file):
                   f'Problem occurred while decoding tests_associations_file: {tests_associations_file}.'
                   f'Verify JSON format of file.')
             raise
-        for result in results:
-            test = tests_associations[result['func_name']]
-            result['test_name'] = test['name']
-            result['points'] = test['points']
+    test_results.validate(tests_associations)
+    return tests_associations
+
+
+def add_tests_info(results, tests_associations):
+    # Every result needs an association, they are all checked before any is changed. Associated tests
+    # missing from the results (e.g. the test run crashed) are added as failing
+    index = test_results.build_index(tests_associations)
+    keys = [test_results.find_test(index, result) for result in results]
+    missing = sorted({result['func_name'] for result, key in zip(results, keys) if key is None})
+    if len(missing) > 0:
+        raise Exception(f'{Fore.RED}Tests missing from test associations: {", ".join(missing)}')
+    for result, key in zip(results, keys):
+        result['test_name'] = tests_associations[key]['name']
+        result['points'] = tests_associations[key]['points']
+    found = set(keys)
+    not_run = [key for key in tests_associations if key not in found]
+    if len(not_run) > 0:
+        print(f'{Fore.YELLOW}Tests without results, counted as failing: {", ".join(not_run)}')
+    for key in not_run:
+        func_name = key.rsplit('.', 1)[-1]
+        results.append(
+            {
+                'func_name': func_name,
+                'class_name': key[:-len(func_name) - 1],
+                'passing': False,
+                'status': 'missing',
+                'test_name': tests_associations[key]['name'],
+                'points': tests_associations[key]['points']
+            }
+        )
 
 
 def main(args):
@@ -48,12 +78,13 @@ def main(args):
     args = parser.parse_args(args)
     print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
     dir_path = os.path.realpath(os.curdir)
-    log_file = os.path.join(dir_path, 'logs/tests_results.txt')
+    log_file = os.path.join(dir_path, args.log_path)
     grades_file = os.path.join(dir_path, 'logs/grades.json')
     tests_associations_file = os.path.join(dir_path, args.test_associations_path)
 
-    results = get_tests_results(log_file)
-    add_tests_info(results, tests_associations_file)
+    tests_associations = load_tests_associations(tests_associations_file)
+    results = get_tests_results(log_file, args.format)
+    add_tests_info(results, tests_associations)
     with open(grades_file, 'w', encoding='UTF-8') as f:
         json.dump(results, f)
 
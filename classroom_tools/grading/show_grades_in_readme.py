@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import argparse
 import json
 import os
 
+parser = argparse.ArgumentParser('Show the grades of logs/grades.json in the README of the current directory')
+
 
 def readme_head(prev_lines):
     split_index = -1
@@ -66,8 +69,9 @@ def update_readme(grades, readme_file):
     f.close()
 
 
-def main():
+def main(args=None):
     print('\n\n' + 'Showing grades in README'.center(80, '='))
+    parser.parse_args(args)
     dir_path = os.path.realpath(os.curdir)
     grades_file = os.path.join(dir_path, 'logs/grades.json')
     readme_file = os.path.join(dir_path, 'README.md')
@@ -77,4 +81,6 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    import sys
+
+    main(sys.argv[1:])
@@ -0,0 +1,148 @@
+import re
+import xml.etree.ElementTree as ElementTree
+
+from colorama import Fore
+
+FORMATS = ['auto', 'unittest', 'junit', 'tap']
+
+# "test_name (module.Class)" or, since Python 3.11, "test_name (module.Class.test_name)", followed by
+# " ... " and the status unless the test has a docstring, which is then printed on the next line
+_UNITTEST_TEST = re.compile(r'^(\w+) \(([\w.]+)\)(?: \.\.\. (.*))?$')
+# The status ends the last line written for a test, after whatever the test printed, possibly without a new line
+_UNITTEST_STATUS = re.compile(r'(ok|FAIL|ERROR|expected failure|unexpected success|skipped .*)$')
+_TAP_RESULT = re.compile(r'^(not )?ok\b\s*(\d+)?\s*(?:-\s*)?([^#]*?)\s*(?:#\s*(\w+).*)?$')
+
+
+def _result(func_name, class_name, status):
+    return {
+        'func_name': func_name,
+        'class_name': class_name,
+        'passing': status in ('ok', 'expected failure'),
+        'status': status
+    }
+
+
+def parse_unittest(lines):
+    # Output of "python -m unittest -v", one line at a time. Only the last line before the next test or the
+    # summary of the run holds the status of a test, the lines it printed before can't be taken for it
+    pending = None
+    last_line = ''
+    for line in lines:
+        line = line.rstrip('\r\n')
+        match = _UNITTEST_TEST.match(line)
+        if match is None and not line.startswith(('=' * 70, '-' * 70)):
+            if pending is not None and line.strip() != '':
+                last_line = line
+            continue
+        if pending is not None:
+            yield _result(*pending, _unittest_status(last_line))
+            pending = None
+        if match is not None:
+            func_name, class_path, rest = match.groups()
+            class_name = class_path[:-len(func_name) - 1] if class_path.endswith(f'.{func_name}') else class_path
+            pending = (func_name, class_name.rsplit('.', 1)[-1])
+            last_line = rest or ''
+    if pending is not None:
+        yield _result(*pending, _unittest_status(last_line))
+
+
+def _unittest_status(last_line):
+    # Without a status, the process probably died in the test
+    match = _UNITTEST_STATUS.search(last_line)
+    if match is None:
+        return 'ERROR'
+    return 'skipped' if match.group(1).startswith('skipped') else match.group(1)
+
+
+def parse_junit(source):
+    # JUnit XML, as written by pytest --junitxml, Maven or Gradle. Test cases are removed from their suite
+    # once read so that only the one being parsed is kept in memory
+    parents = []
+    for event, element in ElementTree.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag != 'testcase':
+            continue
+        status = 'ok'
+        for child in element:
+            if child.tag in ('failure', 'error'):
+                status = 'FAIL' if child.tag == 'failure' else 'ERROR'
+                break
+            if child.tag == 'skipped':
+                status = 'skipped'
+        yield _result(element.get('name', ''), element.get('classname', '').rsplit('.', 1)[-1], status)
+        if len(parents) > 0:
+            parents[-1].remove(element)
+
+
+def parse_tap(lines):
+    # Test Anything Protocol, indented lines are subtests and are counted in their parent test
+    for line in lines:
+        match = _TAP_RESULT.match(line.rstrip('\r\n'))
+        if match is None:
+            continue
+        not_ok, number, description, directive = match.groups()
+        directive = (directive or '').upper()
+        if directive == 'SKIP':
+            status = 'skipped'
+        elif not_ok:
+            status = 'FAIL'
+        else:
+            status = 'ok'
+        yield _result(description or number or '', '', status)
+
+
+def detect_format(log_file):
+    if log_file.endswith('.xml'):
+        return 'junit'
+    with open(log_file, encoding='UTF-8', errors='replace') as f:
+        for line in f:
+            line = line.strip()
+            if line == '':
+                continue
+            if line.startswith('<'):
+                return 'junit'
+            if line.startswith('TAP version') or re.match(r'^(1\.\.\d+|(not )?ok\b)', line):
+                return 'tap'
+            return 'unittest'
+    return 'unittest'
+
+
+def parse(log_file, log_format='auto'):
+    # Yields the result of each test of the log file as it is read
+    if log_format == 'auto':
+        log_format = detect_format(log_file)
+    if log_format == 'junit':
+        yield from parse_junit(log_file)
+        return
+    with open(log_file, encoding='UTF-8', errors='replace') as f:
+        yield from (parse_tap(f) if log_format == 'tap' else parse_unittest(f))
+
+
+def validate(tests_associations):
+    invalid = [
+        func_name for func_name, test in tests_associations.items()
+        if not isinstance(test, dict) or 'name' not in test or 'points' not in test
+    ]
+    if len(invalid) > 0:
+        raise Exception(f'{Fore.RED}Tests without "name" or "points" in test associations: {", ".join(invalid)}')
+
+
+def build_index(tests_associations):
+    # Key of the association of each test: "Class.function" keys also match the function alone when no other
+    # class has a function with the same name, e.g. for TAP results which have no class
+    index = {key: key for key in tests_associations}
+    func_names = [key.rsplit('.', 1)[-1] for key in tests_associations if '.' in key]
+    for key in tests_associations:
+        func_name = key.rsplit('.', 1)[-1]
+        if '.' in key and func_name not in index and func_names.count(func_name) == 1:
+            index[func_name] = key
+    return index
+
+
+def find_test(index, result):
+    if result['class_name'] and f'{result["class_name"]}.{result["func_name"]}' in index:
+        return index[f'{result["class_name"]}.{result["func_name"]}']
+    return index.get(result['func_name'])
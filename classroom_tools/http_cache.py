@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+TTL = 7 * 24 * 3600
+MAX_SIZE = 128 * 1024 * 1024
+EVICTION_CHECK_INTERVAL = 100
+
+
+def cache_key(url, headers):
+    # Responses depend on who is asking and on the requested media type, the token itself is never stored
+    identity = hashlib.sha256(headers.get('Authorization', '').encode('utf-8')).hexdigest()
+    return hashlib.sha256(f'{url}\n{identity}\n{headers.get("Accept", "")}'.encode('utf-8')).hexdigest()
+
+
+class HttpCache:
+    # Stores GET responses with their ETag/Last-Modified so that requests can be revalidated with a 304
+    def __init__(self, path, ttl=TTL, max_size=MAX_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.enabled = True
+        self.num_hits = 0
+        self._connection = None
+        self._num_stored = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            head, tail = os.path.split(self.path)
+            if not os.path.exists(head): os.makedirs(head, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headers TEXT, body BLOB, '
+                'size INTEGER, stored_at REAL, accessed_at REAL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+            self._connection = connection
+        return self._connection
+
+    def lookup(self, key):
+        with self._lock:
+            try:
+                connection = self._connect()
+                row = connection.execute(
+                    'SELECT etag, last_modified, headers, body, stored_at FROM responses WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if time.time() - row[4] > self.ttl:
+                    connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                    connection.commit()
+                    return None
+                return row[:4]
+            except sqlite3.Error:
+                return None
+
+    def conditional_headers(self, entry):
+        etag, last_modified, _, _ = entry
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def replay(self, key, entry, res):
+        # Rebuilds a 200 response from the cached body, keeping the fresh headers (rate limits) of the 304
+        _, _, headers, body = entry
+        cached = requests.Response()
+        cached.status_code = 200
+        cached.reason = 'OK'
+        cached._content = body
+        cached.headers = requests.structures.CaseInsensitiveDict(json.loads(headers))
+        cached.headers.update(res.headers)
+        cached.url = res.url
+        cached.request = res.request
+        cached.encoding = requests.utils.get_encoding_from_headers(cached.headers)
+        cached.elapsed = res.elapsed
+        cached.from_cache = True
+        with self._lock:
+            self.num_hits += 1
+            try:
+                connection = self._connect()
+                connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+                connection.commit()
+            except sqlite3.Error:
+                pass
+        return cached
+
+    def store(self, key, res):
+        etag = res.headers.get('ETag')
+        last_modified = res.headers.get('Last-Modified')
+        if res.status_code != 200 or (etag is None and last_modified is None):
+            return
+        body = res.content
+        if len(body) > self.max_size // 100:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, etag, last_modified, json.dumps(dict(res.headers)), body, len(body), now, now)
+                )
+                connection.commit()
+                self._num_stored += 1
+                if self._num_stored % EVICTION_CHECK_INTERVAL == 0:
+                    self._evict(connection)
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, connection):
+        connection.execute('DELETE FROM responses WHERE stored_at < ?', (time.time() - self.ttl,))
+        size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if size > self.max_size:
+            rows = connection.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall()
+            keys = []
+            for key, entry_size in rows:
+                if size <= self.max_size * 0.8:
+                    break
+                keys.append((key,))
+                size -= entry_size
+            connection.executemany('DELETE FROM responses WHERE key = ?', keys)
+        connection.commit()
@@ -0,0 +1,44 @@
+import json
+import os
+import threading
+import time
+
+
+class Journal:
+    # Append-only JSON lines of the (repository, operation) pairs a run completed.
+    # A resumed run skips those pairs, a fresh run starts a new journal
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if not resume:
+            self.remove()
+        elif os.path.exists(path):
+            with open(path, encoding='UTF-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.done.add((entry['repo'], entry['operation']))
+                    except (ValueError, KeyError):
+                        # The last line may be incomplete if the previous run was killed while writing it
+                        continue
+
+    def is_done(self, repo_name, operation):
+        return (repo_name, operation) in self.done
+
+    def record(self, repo_name, operation):
+        line = json.dumps({'repo': repo_name, 'operation': operation, 'time': time.time()}) + '\n'
+        with self._lock:
+            head, tail = os.path.split(self.path)
+            if not os.path.exists(head): os.makedirs(head, exist_ok=True)
+            with open(self.path, 'a', encoding='UTF-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.done.add((repo_name, operation))
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,145 @@
+import json
+import re
+import threading
+import time
+import urllib.parse
+
+# Path segments that identify a resource rather than an endpoint, replaced by placeholders to group requests
+_PATH_PATTERNS = [
+    (re.compile(r'^/repos/[^/]+/[^/]+'), '/repos/{owner}/{repo}'),
+    (re.compile(r'^/orgs/[^/]+'), '/orgs/{org}'),
+    (re.compile(r'^/users/[^/]+'), '/users/{user}'),
+    (re.compile(r'/teams/[^/]+'), '/teams/{team}'),
+    # Team repository permissions (access_permissions), whose repository isn't at the start of the path
+    (re.compile(r'/teams/\{team\}/repos/[^/]+/[^/]+'), '/teams/{team}/repos/{owner}/{repo}'),
+    (re.compile(r'/contents/.*'), '/contents/{path}'),
+    (re.compile(r'/git/(ref|refs)/.*'), r'/git/\1/{ref}'),
+    (re.compile(r'/git/(trees|blobs|commits)/[^/]+'), r'/git/\1/{sha}'),
+    (re.compile(r'/branches/[^/]+'), '/branches/{branch}'),
+    (re.compile(r'/collaborators/[^/]+'), '/collaborators/{user}'),
+    (re.compile(r'/[0-9a-f]{40}(?=/|$)'), '/{sha}'),
+    (re.compile(r'/\d+(?=/|$)'), '/{id}'),
+]
+
+
+def endpoint_name(method, url):
+    path = urllib.parse.urlparse(url).path
+    if path.startswith('/api/v3/'):
+        path = path[len('/api/v3'):]
+    for pattern, placeholder in _PATH_PATTERNS:
+        path = pattern.sub(placeholder, path, count=1)
+    return f'{method.upper()} {path}'
+
+
+def percentile(values, fraction):
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class Endpoint:
+    def __init__(self):
+        self.count = 0
+        self.retries = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.num_bytes = 0
+        self.latencies = []
+
+
+class Budget:
+    # Rate limit used during the run as seen in response headers, the first response already cost one request
+    def __init__(self, remaining, reset):
+        self.used_before_reset = 0
+        self.first = remaining + 1
+        self.remaining = remaining
+        self.reset = reset
+
+    def update(self, remaining, reset):
+        if reset != self.reset:
+            self.used_before_reset += self.used()
+            self.first = remaining + 1
+            self.reset = reset
+        self.remaining = remaining
+
+    def used(self):
+        return self.used_before_reset + max(self.first - self.remaining, 0)
+
+
+class Metrics:
+    # Counts, latencies and transferred bytes of every HTTP request, grouped by endpoint
+    def __init__(self):
+        self.started_at = time.time()
+        self.endpoints = {}
+        self.budgets = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, url, res, elapsed, num_bytes, retry=False):
+        headers = res.headers
+        with self._lock:
+            endpoint = self.endpoints.setdefault(endpoint_name(method, url), Endpoint())
+            endpoint.count += 1
+            endpoint.retries += int(retry)
+            endpoint.not_modified += int(res.status_code == 304)
+            endpoint.errors += int(res.status_code >= 400)
+            endpoint.num_bytes += num_bytes
+            endpoint.latencies.append(elapsed)
+            if 'X-RateLimit-Remaining' in headers:
+                resource = headers.get('X-RateLimit-Resource', 'core')
+                remaining = int(headers['X-RateLimit-Remaining'])
+                reset = int(headers.get('X-RateLimit-Reset', 0))
+                budget = self.budgets.setdefault(resource, Budget(remaining, reset))
+                budget.update(remaining, reset)
+
+    def num_requests(self):
+        return sum(endpoint.count for endpoint in self.endpoints.values())
+
+    def summary(self):
+        with self._lock:
+            return {
+                'wall_time': time.time() - self.started_at,
+                'num_requests': self.num_requests(),
+                'endpoints': {
+                    name: {
+                        'count': endpoint.count,
+                        'retries': endpoint.retries,
+                        'not_modified': endpoint.not_modified,
+                        'errors': endpoint.errors,
+                        'bytes': endpoint.num_bytes,
+                        'total_time': sum(endpoint.latencies),
+                        'p50': percentile(endpoint.latencies, 0.50),
+                        'p95': percentile(endpoint.latencies, 0.95),
+                        'p99': percentile(endpoint.latencies, 0.99)
+                    }
+                    for name, endpoint in self.endpoints.items()
+                },
+                'rate_limit': {
+                    resource: {'used': budget.used(), 'remaining': budget.remaining}
+                    for resource, budget in self.budgets.items()
+                }
+            }
+
+    def print_summary(self):
+        summary = self.summary()
+        endpoints = sorted(summary['endpoints'].items(), key=lambda item: item[1]['total_time'], reverse=True)
+        width = max([len('Endpoint')] + [len(name) for name, _ in endpoints])
+        print('\nAPI requests:')
+        print(
+            f'\t{"Endpoint":<{width}}  {"Count":>6}  {"Retries":>7}  {"304":>5}  {"Errors":>6}  '
+            f'{"p50 ms":>7}  {"p95 ms":>7}  {"p99 ms":>7}  {"Total s":>7}  {"KB":>8}'
+        )
+        for name, endpoint in endpoints:
+            print(
+                f'\t{name:<{width}}  {endpoint["count"]:>6}  {endpoint["retries"]:>7}  {endpoint["not_modified"]:>5}  '
+                f'{endpoint["errors"]:>6}  {endpoint["p50"] * 1000:>7.0f}  {endpoint["p95"] * 1000:>7.0f}  '
+                f'{endpoint["p99"] * 1000:>7.0f}  {endpoint["total_time"]:>7.1f}  {endpoint["bytes"] / 1024:>8.1f}'
+            )
+        print(f'\tTotal number of requests: {summary["num_requests"]}')
+        for resource, budget in sorted(summary['rate_limit'].items()):
+            print(f'\tRate limit used ({resource}): {budget["used"]} ({budget["remaining"]} remaining)')
+        print(f'\tWall time: {summary["wall_time"]:.1f}s')
+
+    def export(self, path):
+        with open(path, 'w', encoding='UTF-8') as f:
+            json.dump(self.summary(), f, indent=2)
@@ -0,0 +1,338 @@
+import argparse
+import datetime
+import importlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from colorama import Fore
+
+from classroom_tools import github_utils
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+parser = argparse.ArgumentParser(
+    'Stream student repositories through a sequence of stages, each repository moves to the next stage '
+    'as soon as it is done with the previous one'
+)
+parser.add_argument(
+    '--token',
+    required=True,
+    help='GitHub personal access token with repo and workflow permissions'
+)
+parser.add_argument(
+    '--spec',
+    required=True,
+    help='JSON or YAML file describing the stages'
+)
+parser.add_argument(
+    '--org_name',
+    default=None,
+    help='GitHub organization name (overrides the spec)'
+)
+parser.add_argument(
+    '--repo_filter',
+    default=None,
+    help='Prefix to filter repositories for a given assignment or exercise (overrides the spec)'
+)
+parser.add_argument(
+    '--resume',
+    default=False,
+    action='store_true',
+    help='Skip stages completed by a previous run that was interrupted'
+)
+
+DEFAULT_STAGE_WORKERS = github_utils.DEFAULT_WORKERS
+# Repositories waiting in front of a stage, a full queue blocks the stage before it
+DEFAULT_QUEUE_SIZE = 2 * DEFAULT_STAGE_WORKERS
+_DONE = object()
+
+
+def _create_protected_branch(repo, token, branch):
+    from classroom_tools.student_repositories import create_protected_branch_from_master
+    create_protected_branch_from_master.protect_branch_from_master(repo=repo, branch_name=branch)
+
+
+def _access_permissions(repo, token, new_permission_level='pull'):
+    from classroom_tools.student_repositories import access_permissions
+    access_permissions.apply_repo_changes(repo=repo, new_permission=new_permission_level)
+
+
+# Time of the repository_dispatch sent to each repository by the trigger_workflows stage
+_dispatched_at = {}
+
+
+def _trigger_workflows(repo, token, event_type='Manual trigger'):
+    _dispatched_at[repo.full_name] = time.time()
+    return repo.create_repository_dispatch(event_type=event_type)
+
+
+def _wait_for_workflows(repo, token, timeout=1800, interval=15):
+    # Waits for the runs started by the trigger_workflows stage of this pipeline, they take a few seconds to show
+    # up. Without it (e.g. when resuming), waits for the runs in progress. Failed runs don't fail the stage
+    dispatched_at = _dispatched_at.get(repo.full_name)
+    params = {}
+    if dispatched_at is not None:
+        # The margin covers clock skew with GitHub
+        since = datetime.datetime.fromtimestamp(dispatched_at - 60, datetime.timezone.utc)
+        params = {'event': 'repository_dispatch', 'created': f'>={since.strftime("%Y-%m-%dT%H:%M:%SZ")}'}
+    deadline = time.time() + timeout
+    while True:
+        runs = list(repo.get_workflow_runs(**params)[:30])
+        if dispatched_at is None or len(runs) > 0:
+            running = [run for run in runs if run.status != 'completed']
+            if len(running) == 0:
+                print(f'\t{repo.name}: ' + ', '.join(f'{run.name} {run.conclusion}' for run in runs))
+                return True
+        if time.time() + interval > deadline:
+            raise Exception(f'{Fore.RED}Workflow runs of {repo.full_name} still running after {timeout}s')
+        time.sleep(interval)
+
+
+def _change_branch_protection(repo, token, branch, protect=True):
+    from classroom_tools.student_repositories import change_branch_protection
+    change_branch_protection.change_protection(repo=repo, branch_name=branch, protect=protect)
+
+
+def _change_default_branch(repo, token, branch):
+    from classroom_tools.student_repositories import change_default_branch
+    change_default_branch.set_default_branch(token=token, repo_full_name=repo.full_name, branch_name=branch)
+
+
+def _delete_workflows(repo, token, branch='master'):
+    from classroom_tools.student_repositories import delete_workflows
+    delete_workflows.delete_workflows(repo=repo, branch=branch)
+
+
+def _delete_file(repo, token, path, branch='master'):
+    github_utils.delete_files(repo, [path] if isinstance(path, str) else path, branch=branch)
+
+
+_template_files = {}
+
+
+def _sync_with_template_repository(repo, token, template_repo_fullname, files_to_update=None, branch='master'):
+    from classroom_tools.student_repositories import sync_with_template_repository
+    key = (template_repo_fullname, json.dumps(files_to_update))
+    with github_utils._lock:
+        if key not in _template_files:
+            template_repo = github_utils.get_repo(fullname=template_repo_fullname, token=token)
+            _template_files[key] = sync_with_template_repository.get_relevant_template_files(
+                files_to_update=files_to_update,
+                template_repo=template_repo
+            )
+    sync_with_template_repository.update_repo(repo=repo, template_files=_template_files[key], branch=branch)
+
+
+_grade_stores = {}
+
+
+def _get_grade_store(output, test_associations_path):
+    from classroom_tools.grading import collect_grades, create_grades
+    with github_utils._lock:
+        if output not in _grade_stores:
+            tests_associations = None
+            if test_associations_path is not None:
+                tests_associations = create_grades.load_tests_associations(test_associations_path)
+            _grade_stores[output] = (*collect_grades.get_store(output, None, None), tests_associations)
+        return _grade_stores[output]
+
+
+def _collect_grades(repo, token, output, path='logs/grades.json', ref=None, test_associations_path=None,
+                    results_format='auto'):
+    from classroom_tools.grading import collect_grades
+    store, csv_path, tests_associations = _get_grade_store(output, test_associations_path)
+    return collect_grades.collect(repo, store, path, ref, tests_associations, results_format)
+
+
+def _export_grades(token, output, test_associations_path=None, **args):
+    store, csv_path, tests_associations = _get_grade_store(output, test_associations_path)
+    store.export_csv(csv_path)
+    print(f'Grades located at:\n\t{store.path}\n\t{csv_path}')
+
+
+# Called once with the stage arguments after every repository went through the stage
+_collect_grades.finish = _export_grades
+
+
+# Stage arguments are named after the options of the corresponding command
+STAGES = {
+    'create_protected_branch_from_master': _create_protected_branch,
+    'access_permissions': _access_permissions,
+    'trigger_workflows': _trigger_workflows,
+    'wait_for_workflows': _wait_for_workflows,
+    'change_branch_protection': _change_branch_protection,
+    'change_default_branch': _change_default_branch,
+    'delete_workflows': _delete_workflows,
+    'delete_file': _delete_file,
+    'sync_with_template_repository': _sync_with_template_repository,
+    'collect_grades': _collect_grades,
+}
+
+
+def get_stage_function(run):
+    if run in STAGES:
+        return STAGES[run]
+    if ':' in run:
+        # Custom stages are referenced as package.module:function and called with (repo, token, **args)
+        module, function = run.split(':', 1)
+        return getattr(importlib.import_module(module), function)
+    raise Exception(f'{Fore.RED}Unknown stage: {run}\nChoose from: {", ".join(STAGES)} or use package.module:function')
+
+
+class Stage:
+    def __init__(self, name, fn, args, workers=DEFAULT_STAGE_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.operation = f'{name} {json.dumps(args, sort_keys=True)}'
+        self.num_ok = 0
+        self.num_skipped = 0
+        self.num_fail = 0
+
+
+def load_spec(path):
+    with open(path, encoding='UTF-8') as f:
+        if path.endswith(('.yml', '.yaml')):
+            if yaml is None:
+                raise Exception(f'{Fore.RED}YAML pipeline specs require PyYAML: pip install pyyaml')
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def create_stages(spec):
+    stages = []
+    for i, stage_spec in enumerate(spec['stages']):
+        run = stage_spec['run']
+        stages.append(
+            Stage(
+                name=stage_spec.get('name', f'{i + 1}-{run}'),
+                fn=get_stage_function(run),
+                args=stage_spec.get('args', {}),
+                workers=stage_spec.get('workers', DEFAULT_STAGE_WORKERS),
+                queue_size=stage_spec.get('queue_size', DEFAULT_QUEUE_SIZE)
+            )
+        )
+    if len(stages) == 0:
+        raise Exception(f'{Fore.RED}Pipeline has no stages')
+    return stages
+
+
+def run_pipeline(stages, repositories, token, journal=None):
+    # Each stage has its own worker threads reading from a bounded queue, a repository that fails a stage
+    # leaves the pipeline. Returns the errors by repository and the time at which each repository finished
+    errors = {}
+    finished_at = {}
+    lock = threading.Lock()
+    start = time.time()
+    installed = not isinstance(sys.stdout, github_utils.BufferedStdout)
+    stdout = github_utils.BufferedStdout(sys.stdout) if installed else sys.stdout
+
+    def process(stage, repo):
+        if journal is not None and journal.is_done(repo.full_name, stage.operation):
+            return 'skipped', None
+        stdout.local.buffer = []
+        try:
+            if stage.fn(repo=repo, token=token, **stage.args) is False:
+                raise Exception('Stage reported a failure')
+            if journal is not None:
+                journal.record(repo.full_name, stage.operation)
+            return 'ok', None
+        except Exception as e:
+            return 'failed', e
+        finally:
+            output = ''.join(stdout.local.buffer)
+            stdout.local.buffer = None
+            with lock:
+                stdout.write(output)
+
+    def work(i, stage):
+        next_stage = stages[i + 1] if i + 1 < len(stages) else None
+        while True:
+            repo = stage.queue.get()
+            if repo is _DONE:
+                return
+            status, error = process(stage, repo)
+            with lock:
+                if status == 'failed':
+                    stage.num_fail += 1
+                    errors[repo.full_name] = (stage.name, error)
+                    stdout.write(f'{Fore.RED}{stage.name}: {repo.full_name}\n{Fore.RED}{error}\n')
+                    continue
+                if status == 'skipped':
+                    stage.num_skipped += 1
+                else:
+                    stage.num_ok += 1
+                stdout.write(f'{Fore.GREEN}{stage.name}: {repo.full_name}\n')
+                if next_stage is None:
+                    finished_at[repo.full_name] = time.time() - start
+            if next_stage is not None:
+                # Blocks while the next stage is saturated, which holds back this one
+                next_stage.queue.put(repo)
+
+    threads = []
+    for i, stage in enumerate(stages):
+        stage_threads = [threading.Thread(target=work, args=(i, stage), daemon=True) for _ in range(max(stage.workers, 1))]
+        for thread in stage_threads:
+            thread.start()
+        threads.append(stage_threads)
+    sys.stdout = stdout
+    try:
+        for repo in repositories:
+            stages[0].queue.put(repo)
+        for stage, stage_threads in zip(stages, threads):
+            for _ in stage_threads:
+                stage.queue.put(_DONE)
+            for thread in stage_threads:
+                thread.join()
+            if hasattr(stage.fn, 'finish'):
+                stage.fn.finish(token=token, **stage.args)
+    finally:
+        if installed:
+            sys.stdout = stdout.stdout
+    return errors, finished_at
+
+
+def main(args):
+    print('\n\n' + 'Running pipeline'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items() if k != 'token'))
+    spec = load_spec(args.spec)
+    org_name = args.org_name or spec['org_name']
+    repo_filter = args.repo_filter or spec['repo_filter']
+    stages = create_stages(spec)
+    print('Stages:')
+    for stage in stages:
+        print(f'\t{stage.name}: {stage.args} ({stage.workers} workers, queue of {stage.queue.maxsize})')
+    github_utils.verify_token(args.token)
+    repositories = github_utils.get_students_repositories(token=args.token, org_name=org_name, repo_filter=repo_filter)
+    journal = github_utils.get_journal(
+        name=f'pipeline_{os.path.splitext(os.path.basename(args.spec))[0]}',
+        org_name=org_name,
+        repo_filter=repo_filter,
+        resume=args.resume
+    )
+    errors, finished_at = run_pipeline(stages=stages, repositories=repositories, token=args.token, journal=journal)
+    print('\nSummary:')
+    print(f'\tTotal number of repositories: {len(repositories)}')
+    for stage in stages:
+        print(f'\t{stage.name}: {stage.num_ok} done, {stage.num_skipped} skipped, {stage.num_fail} failed')
+    if len(finished_at) > 0:
+        print(f'\tFirst repository through every stage after: {min(finished_at.values()):.1f}s')
+        print(f'\tLast repository through every stage after: {max(finished_at.values()):.1f}s')
+    print(f'\tTotal number failed: {len(errors)}')
+    if len(errors) > 0:
+        raise Exception(f'{Fore.RED}Pipeline failed for {len(errors)} repositories, rerun with --resume to retry them')
+    journal.remove()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,160 @@
+import argparse
+import os
+import sys
+import tempfile
+import urllib.parse
+
+from colorama import Fore
+
+from classroom_tools import github_utils
+from classroom_tools.plagiarism import minhash, submissions, winnowing
+
+parser = argparse.ArgumentParser(
+    'Add the student repositories of past assignments to a corpus of MinHash signatures, '
+    'against which new submissions are checked with check_against_corpus'
+)
+parser.add_argument(
+    '--token',
+    required=True,
+    help='GitHub personal access token with repo permissions'
+)
+parser.add_argument(
+    '--org_name',
+    required=True,
+    help='GitHub organization with the past student repositories'
+)
+parser.add_argument(
+    '--repo_filters',
+    required=True,
+    nargs='+',
+    help='Prefixes of the past assignments or exercises to add, e.g. hw1-2023 hw1-2024'
+)
+parser.add_argument(
+    '--paths',
+    default=['*'],
+    nargs='*',
+    help='Paths of the files to compare in each repository, "*" doesn\'t cross directories'
+)
+parser.add_argument(
+    '-d',
+    default=False,
+    action='store_true',
+    help='Paths are directories, every file below them is compared'
+)
+parser.add_argument(
+    '--base_repo_fullname',
+    default=None,
+    help='Repo with the files given to every student in format: "Owner/RepoName", their code is never matched'
+)
+parser.add_argument(
+    '-l',
+    default='python',
+    help='Source language of the submissions'
+)
+parser.add_argument(
+    '--corpus',
+    default=None,
+    help='Path of the corpus (default: in the cache directory, one per organization and language)'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories downloaded concurrently'
+)
+
+
+def get_corpus(path, org_name, language):
+    if path is None:
+        host = urllib.parse.urlparse(github_utils.API_URL).netloc.replace(':', '_')
+        path = os.path.join(github_utils.CACHE_DIR, 'corpus', f'{host}_{org_name.lower()}_{language}.sqlite')
+    corpus = minhash.SignatureIndex(path, settings={'language': language})
+    corpus.check_settings()
+    return corpus
+
+
+def load_base(repo_fullname, patterns, language, token, directory, directories=False):
+    if repo_fullname is None:
+        return winnowing.Submission('base')
+    repo = github_utils.get_repo(fullname=repo_fullname, token=token)
+    submission = submissions.download_submission(
+        repo=repo,
+        patterns=patterns,
+        directory=os.path.join(directory, 'base'),
+        token=token,
+        directories=directories
+    )
+    return load_fingerprints(submission, language, winnowing.Submission('base'))
+
+
+def load_fingerprints(submission, language, base):
+    # Fingerprints of a downloaded submission without the ones of the base files
+    local_submission = winnowing.load_submission(
+        name=submission.repo.full_name,
+        files=[(path, os.path.join(submission.directory, *path.split('/'))) for path in submission.paths],
+        language=language
+    )
+    for h in base.fingerprints.keys() & local_submission.fingerprints.keys():
+        del local_submission.fingerprints[h]
+    return local_submission
+
+
+def main(args):
+    print('\n\n' + 'Building corpus of past submissions'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items() if k != 'token'))
+    github_utils.verify_token(args.token)
+    language = winnowing.get_language(args.l)
+    corpus = get_corpus(args.corpus, args.org_name, args.l)
+    pushed_at = corpus.pushed_at()
+    num_added = 0
+    num_unchanged = 0
+    num_empty = 0
+    num_fail = 0
+    with tempfile.TemporaryDirectory() as directory:
+        base = load_base(args.base_repo_fullname, args.paths, language, args.token, directory, directories=args.d)
+        for repo_filter in args.repo_filters:
+            repositories = github_utils.get_students_repositories(
+                token=args.token,
+                org_name=args.org_name,
+                repo_filter=repo_filter
+            )
+            # Archived repositories don't change, they are only downloaded once
+            changed = [repo for repo in repositories if pushed_at.get(repo.full_name) != str(repo.pushed_at)]
+            num_unchanged += len(repositories) - len(changed)
+            print(f'{repo_filter}: {len(changed)} repositories to add ({len(repositories) - len(changed)} already in corpus)')
+            fetched, errors = submissions.fetch_submissions(
+                repositories=changed,
+                patterns=args.paths,
+                directory=os.path.join(directory, repo_filter),
+                token=args.token,
+                directories=args.d,
+                workers=args.workers
+            )
+            num_fail += len(errors)
+            for submission in fetched:
+                fingerprints = load_fingerprints(submission, language, base).fingerprints
+                if corpus.add(
+                    name=submission.repo.full_name,
+                    collection=repo_filter,
+                    ref=submission.ref,
+                    pushed_at=str(submission.repo.pushed_at),
+                    fingerprints=fingerprints
+                ):
+                    num_added += 1
+                else:
+                    num_empty += 1
+    print('\nSummary:')
+    for collection, count in sorted(corpus.count().items()):
+        print(f'\t{collection}: {count} submissions in corpus')
+    print(f'\tCorpus located at: {corpus.path}')
+    print(f'\tNumber of submissions added: {num_added}')
+    print(f'\tNumber of submissions already in corpus: {num_unchanged}')
+    print(f'\tNumber of submissions without code: {num_empty}')
+    print(f'\tNumber of failed: {num_fail}')
+    if num_fail > 0:
+        raise Exception(f'{Fore.RED}Couldn\'t add {num_fail} repositories, run again to retry them')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,181 @@
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+
+from colorama import Fore
+
+from classroom_tools import github_utils
+from classroom_tools.plagiarism import build_corpus, submissions, winnowing
+
+parser = argparse.ArgumentParser(
+    'Find past submissions (added with build_corpus) that are near duplicates of the current ones'
+)
+parser.add_argument(
+    '--token',
+    required=True,
+    help='GitHub personal access token with repo permissions'
+)
+parser.add_argument(
+    '--org_name',
+    required=True,
+    help='GitHub organization name'
+)
+parser.add_argument(
+    '--repo_filter',
+    required=True,
+    help='Prefix to filter repositories for as given assignment or exercise'
+)
+parser.add_argument(
+    '--paths',
+    default=['*'],
+    nargs='*',
+    help='Paths of the files to compare in each repository, "*" doesn\'t cross directories'
+)
+parser.add_argument(
+    '-d',
+    default=False,
+    action='store_true',
+    help='Paths are directories, every file below them is compared'
+)
+parser.add_argument(
+    '--base_repo_fullname',
+    default=None,
+    help='Repo with the files given to every student in format: "Owner/RepoName", their code is never matched'
+)
+parser.add_argument(
+    '-l',
+    default='python',
+    help='Source language of the submissions'
+)
+parser.add_argument(
+    '--corpus',
+    default=None,
+    help='Path of the corpus (default: in the cache directory, one per organization and language)'
+)
+parser.add_argument(
+    '--threshold',
+    type=float,
+    default=0.5,
+    help='Estimated fraction of fingerprints in common above which a past submission is reported'
+)
+parser.add_argument(
+    '--confirm',
+    default=False,
+    action='store_true',
+    help='Download the reported past submissions at the commit they were added from and compare them exactly'
+)
+parser.add_argument(
+    '--report_name',
+    default='corpus_report',
+    help='Name of the report written to moss_reports/'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories downloaded concurrently'
+)
+
+
+def confirm(local, name, ref, patterns, language, base, token, directory, directories=False):
+    # Exact winnowing comparison of a current submission with a past one, returns the percentages
+    # of their fingerprints in common
+    repo = github_utils.get_repo(fullname=name, token=token)
+    submission = submissions.download_submission(
+        repo=repo,
+        patterns=patterns,
+        directory=os.path.join(directory, 'confirm', name),
+        token=token,
+        ref=ref,
+        directories=directories
+    )
+    past = build_corpus.load_fingerprints(submission, language, base)
+    matches = winnowing.compare([local, past], max_submissions=2, num_matches=1)
+    if len(matches) == 0:
+        return 0.0, 0.0
+    return matches[0].percent_first, matches[0].percent_second
+
+
+def format_report(results, confirmed):
+    lines = [
+        '| Submission | Past submission | Assignment | Estimated % | Confirmed % |',
+        '| --- | --- | --- | ---: | ---: |'
+    ]
+    for name, past_name, collection, estimate in results:
+        exact = confirmed.get((name, past_name))
+        lines.append(
+            f'| {name} | {past_name} | {collection} | {100 * estimate:.0f} | '
+            f'{f"{exact[0]:.0f} / {exact[1]:.0f}" if exact else ""} |'
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def main(args):
+    print('\n\n' + 'Checking submissions against past ones'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items() if k != 'token'))
+    github_utils.verify_token(args.token)
+    language = winnowing.get_language(args.l)
+    corpus = build_corpus.get_corpus(args.corpus, args.org_name, args.l)
+    repositories = github_utils.get_students_repositories(
+        token=args.token,
+        org_name=args.org_name,
+        repo_filter=args.repo_filter
+    )
+    results = []
+    confirmed = {}
+    with tempfile.TemporaryDirectory() as directory:
+        base = build_corpus.load_base(args.base_repo_fullname, args.paths, language, args.token, directory,
+                                      directories=args.d)
+        print('Fetching student files:')
+        fetched, errors = submissions.fetch_submissions(
+            repositories=repositories,
+            patterns=args.paths,
+            directory=os.path.join(directory, 'current'),
+            token=args.token,
+            directories=args.d,
+            workers=args.workers
+        )
+        print('Candidates:')
+        for submission in fetched:
+            local = build_corpus.load_fingerprints(submission, language, base)
+            candidates = corpus.query(local.fingerprints, threshold=args.threshold, exclude={submission.repo.full_name})
+            for past_name, collection, ref, estimate in candidates:
+                print(f'{Fore.YELLOW}\t{submission.repo.name} - {past_name} ({collection}): {100 * estimate:.0f}%')
+                results.append((submission.repo.name, past_name, collection, estimate))
+                if args.confirm:
+                    try:
+                        confirmed[submission.repo.name, past_name] = confirm(
+                            local=local,
+                            name=past_name,
+                            ref=ref,
+                            patterns=args.paths,
+                            language=language,
+                            base=base,
+                            token=args.token,
+                            directory=directory,
+                            directories=args.d
+                        )
+                        percent = confirmed[submission.repo.name, past_name][0]
+                        print(f'\t\tConfirmed: {percent:.0f}% of {submission.repo.name}')
+                    except Exception as e:
+                        print(f'{Fore.RED}\t\tCouldn\'t confirm: {e}')
+    results.sort(key=lambda result: result[3], reverse=True)
+    time_str = datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S')
+    report_path = f'moss_reports/{args.report_name}_{time_str}.md'
+    if not os.path.exists('moss_reports'): os.makedirs('moss_reports')
+    with open(report_path, 'w', encoding='UTF-8') as f:
+        f.write(format_report(results, confirmed))
+    print('\nSummary:')
+    print(f'\tNumber of past submissions in corpus: {sum(corpus.count().values())}')
+    print(f'\tNumber of submissions checked: {len(fetched)}')
+    print(f'\tNumber of near duplicates: {len(results)}')
+    print(f'\tReport located at: {report_path}')
+    if len(errors) > 0:
+        raise Exception(f'{Fore.RED}Couldn\'t download {len(errors)} student repositories')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+
+from classroom_tools.plagiarism import winnowing
+
+
+class FingerprintStore:
+    # Fingerprints of every submission of a scan with the number of fingerprints shared by each pair of
+    # submissions, so that a scan only processes the submissions that changed since the previous one.
+    # Fingerprints found in more than max_submissions submissions are ignored like with Moss' -m option
+    def __init__(self, path, max_submissions=10):
+        self.path = path
+        self.max_submissions = max_submissions
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            head, tail = os.path.split(self.path)
+            if not os.path.exists(head): os.makedirs(head, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS submissions (repo TEXT PRIMARY KEY, pushed_at TEXT)'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS files (repo TEXT, path TEXT, sha TEXT, PRIMARY KEY (repo, path))'
+            )
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS occurrences (hash INTEGER, repo TEXT, path TEXT, line INTEGER)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS occurrences_hash ON occurrences (hash)')
+            connection.execute('CREATE INDEX IF NOT EXISTS occurrences_repo ON occurrences (repo)')
+            # Number of submissions each fingerprint is found in
+            connection.execute('CREATE TABLE IF NOT EXISTS hashes (hash INTEGER PRIMARY KEY, num_repos INTEGER)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS pairs (first TEXT, second TEXT, shared INTEGER, PRIMARY KEY (first, second))'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS pairs_second ON pairs (second)')
+            connection.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value INTEGER)')
+            row = connection.execute('SELECT value FROM settings WHERE key = ?', ('max_submissions',)).fetchone()
+            if row is None or row[0] != self.max_submissions:
+                # Pairs only count the fingerprints found in at most max_submissions submissions
+                with connection:
+                    connection.execute('DELETE FROM pairs')
+                    for repo_name, in connection.execute('SELECT repo FROM submissions').fetchall():
+                        self._compare(connection, repo_name)
+                    connection.execute(
+                        'INSERT OR REPLACE INTO settings VALUES (?, ?)', ('max_submissions', self.max_submissions)
+                    )
+            self._connection = connection
+        return self._connection
+
+    def pushed_at(self, repo_name):
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT pushed_at FROM submissions WHERE repo = ?', (repo_name,)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def repo_names(self):
+        with self._lock:
+            return [row[0] for row in self._connect().execute('SELECT repo FROM submissions')]
+
+    def files(self, repo_name):
+        with self._lock:
+            return dict(self._connect().execute('SELECT path, sha FROM files WHERE repo = ?', (repo_name,)))
+
+    def set_pushed_at(self, repo_name, pushed_at):
+        # For submissions downloaded again whose files turned out to be the same
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('UPDATE submissions SET pushed_at = ? WHERE repo = ?', (pushed_at, repo_name))
+
+    def update(self, updates, removed=()):
+        # updates: (repo name, pushed_at, {path: blob sha}, winnowing.Submission without the base fingerprints)
+        # tuples, removed: names of repositories that are gone. Pairs are compared once all fingerprints are in
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                dirty = set()
+                for repo_name in removed:
+                    dirty |= self._replace_fingerprints(connection, repo_name, {})
+                    connection.execute('DELETE FROM files WHERE repo = ?', (repo_name,))
+                    connection.execute('DELETE FROM submissions WHERE repo = ?', (repo_name,))
+                for repo_name, pushed_at, files, submission in updates:
+                    dirty |= self._replace_fingerprints(connection, repo_name, submission.fingerprints)
+                    connection.execute('DELETE FROM files WHERE repo = ?', (repo_name,))
+                    connection.executemany(
+                        'INSERT INTO files VALUES (?, ?, ?)',
+                        [(repo_name, path, sha) for path, sha in files.items()]
+                    )
+                    connection.execute('INSERT OR REPLACE INTO submissions VALUES (?, ?)', (repo_name, pushed_at))
+                for repo_name in dirty:
+                    self._compare(connection, repo_name)
+
+    def _replace_fingerprints(self, connection, repo_name, fingerprints):
+        # Returns the submissions whose pairs have to be compared again
+        old = {row[0] for row in connection.execute('SELECT DISTINCT hash FROM occurrences WHERE repo = ?', (repo_name,))}
+        new = set(fingerprints)
+        # Pairs of other submissions only change when a fingerprint they share starts or stops being ignored
+        # for being found in too many submissions
+        dirty = {repo_name}
+        for h in old ^ new:
+            row = connection.execute('SELECT num_repos FROM hashes WHERE hash = ?', (h,)).fetchone()
+            before = row[0] if row is not None else 0
+            after = before + (1 if h in new else -1)
+            if after == 0:
+                connection.execute('DELETE FROM hashes WHERE hash = ?', (h,))
+            else:
+                connection.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?)', (h, after))
+            if (before <= self.max_submissions) != (after <= self.max_submissions):
+                dirty.update(
+                    row[0] for row in connection.execute('SELECT DISTINCT repo FROM occurrences WHERE hash = ?', (h,))
+                )
+        connection.execute('DELETE FROM occurrences WHERE repo = ?', (repo_name,))
+        connection.executemany(
+            'INSERT INTO occurrences VALUES (?, ?, ?, ?)',
+            [(h, repo_name, path, line) for h, locations in fingerprints.items() for path, line in locations]
+        )
+        return dirty
+
+    def _compare(self, connection, repo_name):
+        connection.execute('DELETE FROM pairs WHERE first = ? OR second = ?', (repo_name, repo_name))
+        rows = connection.execute(
+            'SELECT other.repo, COUNT(DISTINCT own.hash) FROM occurrences own '
+            'JOIN hashes ON hashes.hash = own.hash AND hashes.num_repos BETWEEN 2 AND ? '
+            'JOIN occurrences other ON other.hash = own.hash AND other.repo != own.repo '
+            'WHERE own.repo = ? GROUP BY other.repo',
+            (self.max_submissions, repo_name)
+        ).fetchall()
+        connection.executemany(
+            'INSERT INTO pairs VALUES (?, ?, ?)',
+            [(min(repo_name, other), max(repo_name, other), shared) for other, shared in rows]
+        )
+
+    def _load_submission(self, connection, repo_name):
+        # Only the fingerprints that count towards a pair, like after winnowing.compare
+        submission = winnowing.Submission(repo_name)
+        rows = connection.execute(
+            'SELECT occurrences.hash, path, line FROM occurrences '
+            'JOIN hashes ON hashes.hash = occurrences.hash AND hashes.num_repos <= ? WHERE repo = ?',
+            (self.max_submissions, repo_name)
+        )
+        for h, path, line in rows:
+            submission.fingerprints.setdefault(h, []).append((path, line))
+        return submission
+
+    def matches(self, num_matches=250):
+        with self._lock:
+            connection = self._connect()
+            pairs = connection.execute(
+                'SELECT first, second FROM pairs ORDER BY shared DESC, first, second LIMIT ?', (num_matches,)
+            ).fetchall()
+            loaded = {}
+            matches = []
+            for first, second in pairs:
+                for name in (first, second):
+                    if name not in loaded:
+                        loaded[name] = self._load_submission(connection, name)
+                first, second = loaded[first], loaded[second]
+                matches.append(
+                    winnowing.Match(first, second, [h for h in first.fingerprints if h in second.fingerprints])
+                )
+            return matches
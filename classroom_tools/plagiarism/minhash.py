@@ -0,0 +1,178 @@
+import array
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+
+from colorama import Fore
+
+NUM_PERMUTATIONS = 128
+# 32 bands of 4 rows: pairs with a Jaccard similarity of 0.5 become candidates 87% of the time, 0.3 only 23%
+NUM_BANDS = 32
+SEED = 1
+_PRIME = (1 << 61) - 1
+_MASK = 0xffffffff
+_DENSIFICATION_OFFSET = 0x9e3779b1
+
+
+def get_permutation(seed=SEED):
+    rng = random.Random(seed)
+    return rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)
+
+
+def signature(fingerprints, permutation, num_permutations=NUM_PERMUTATIONS):
+    # One permutation hashing: a single hash of each fingerprint picks one of num_permutations bins and each bin
+    # keeps its smallest value, so that a signature costs one hash per fingerprint rather than one per bin.
+    # Empty bins take the value of the next non-empty bin plus an offset for the distance (rotation
+    # densification), two signatures then agree on a bin with a probability close to the Jaccard similarity
+    # of their fingerprint sets. Values are truncated to 32 bits to keep the signatures compact
+    a, b = permutation
+    bins = [None] * num_permutations
+    for h in fingerprints:
+        x = (a * h + b) % _PRIME
+        i = x % num_permutations
+        value = (x // num_permutations) & _MASK
+        if bins[i] is None or value < bins[i]:
+            bins[i] = value
+    if all(value is None for value in bins):
+        return None
+    values = []
+    for i in range(num_permutations):
+        distance = 0
+        while bins[(i + distance) % num_permutations] is None:
+            distance += 1
+        values.append((bins[(i + distance) % num_permutations] + distance * _DENSIFICATION_OFFSET) & _MASK)
+    return array.array('I', values)
+
+
+def similarity(first, second):
+    return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+def bands(sig, num_bands):
+    # One bucket per band, submissions sharing a bucket in any band are candidates
+    rows = len(sig) // num_bands
+    for band in range(num_bands):
+        digest = hashlib.blake2b(sig[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest()
+        yield band, int.from_bytes(digest, 'little', signed=True)
+
+
+class SignatureIndex:
+    # Signatures of past submissions with their LSH buckets. The settings the signatures were computed with
+    # are stored with them, queries with other settings would never match
+    def __init__(self, path, settings=None):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+        self.settings = dict(settings or {})
+        self.settings.setdefault('num_permutations', NUM_PERMUTATIONS)
+        self.settings.setdefault('num_bands', NUM_BANDS)
+        self.settings.setdefault('seed', SEED)
+
+    def signature(self, fingerprints):
+        return signature(fingerprints, get_permutation(self.settings['seed']), self.settings['num_permutations'])
+
+    def _connect(self):
+        if self._connection is None:
+            head, tail = os.path.split(self.path)
+            if head and not os.path.exists(head): os.makedirs(head, exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS submissions ('
+                'id INTEGER PRIMARY KEY, name TEXT UNIQUE, collection TEXT, ref TEXT, pushed_at TEXT, '
+                'num_fingerprints INTEGER, signature BLOB)'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (band INTEGER, bucket INTEGER, id INTEGER)')
+            connection.execute('CREATE INDEX IF NOT EXISTS buckets_band_bucket ON buckets (band, bucket)')
+            connection.execute('CREATE INDEX IF NOT EXISTS buckets_id ON buckets (id)')
+            stored = dict(connection.execute('SELECT key, value FROM settings'))
+            if len(stored) == 0:
+                with connection:
+                    connection.executemany(
+                        'INSERT INTO settings VALUES (?, ?)',
+                        [(key, json.dumps(value)) for key, value in self.settings.items()]
+                    )
+            else:
+                stored = {key: json.loads(value) for key, value in stored.items()}
+                different = {
+                    key: value for key, value in self.settings.items() if key in stored and stored[key] != value
+                }
+                if different:
+                    raise Exception(
+                        f'{Fore.RED}Corpus {self.path} was built with other settings: '
+                        + ', '.join(f'{key}={stored[key]} (not {value})' for key, value in different.items())
+                    )
+                self.settings = stored
+            self._connection = connection
+        return self._connection
+
+    def check_settings(self):
+        with self._lock:
+            self._connect()
+
+    def pushed_at(self):
+        with self._lock:
+            return dict(self._connect().execute('SELECT name, pushed_at FROM submissions'))
+
+    def add(self, name, collection, ref, pushed_at, fingerprints):
+        # Replaces the previous signature of the submission, returns False when it has no fingerprints
+        sig = self.signature(fingerprints)
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                row = connection.execute('SELECT id FROM submissions WHERE name = ?', (name,)).fetchone()
+                if row is not None:
+                    connection.execute('DELETE FROM buckets WHERE id = ?', row)
+                    connection.execute('DELETE FROM submissions WHERE id = ?', row)
+                # Submissions without fingerprints are kept without a signature, so that they aren't downloaded
+                # again until pushed to
+                cursor = connection.execute(
+                    'INSERT INTO submissions (name, collection, ref, pushed_at, num_fingerprints, signature) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (name, collection, ref, pushed_at, len(fingerprints), sig.tobytes() if sig is not None else None)
+                )
+                if sig is None:
+                    return False
+                connection.executemany(
+                    'INSERT INTO buckets VALUES (?, ?, ?)',
+                    [(band, bucket, cursor.lastrowid) for band, bucket in bands(sig, self.settings['num_bands'])]
+                )
+        return True
+
+    def query(self, fingerprints, threshold=0.5, exclude=()):
+        # Returns (name, collection, ref, estimated similarity) of the indexed submissions sharing a bucket
+        # with the fingerprints and whose signatures agree on at least threshold of the permutations
+        sig = self.signature(fingerprints)
+        if sig is None:
+            return []
+        with self._lock:
+            connection = self._connect()
+            candidates = set()
+            for band, bucket in bands(sig, self.settings['num_bands']):
+                candidates.update(
+                    row[0] for row in
+                    connection.execute('SELECT id FROM buckets WHERE band = ? AND bucket = ?', (band, bucket))
+                )
+            results = []
+            for candidate in candidates:
+                name, collection, ref, data = connection.execute(
+                    'SELECT name, collection, ref, signature FROM submissions WHERE id = ?', (candidate,)
+                ).fetchone()
+                if name in exclude:
+                    continue
+                other = array.array('I')
+                other.frombytes(data)
+                estimate = similarity(sig, other)
+                if estimate >= threshold:
+                    results.append((name, collection, ref, estimate))
+        return sorted(results, key=lambda result: result[3], reverse=True)
+
+    def count(self):
+        with self._lock:
+            return dict(self._connect().execute(
+                'SELECT collection, COUNT(*) FROM submissions WHERE signature IS NOT NULL GROUP BY collection'
+            ))
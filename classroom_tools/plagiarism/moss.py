@@ -1,14 +1,21 @@
 import argparse
+import concurrent.futures
 import datetime
-import glob
+import hashlib
+import json
 import os
+import re
+import tempfile
+import urllib.parse
 from typing import Iterable
 
 import git
 import github
 import mosspy
+from colorama import Fore
 
-from classroom_tools import github_utils
+from classroom_tools import blob_cache, github_utils
+from classroom_tools.plagiarism import fingerprint_store, moss_report, report_registry, submissions, winnowing
 
 parser = argparse.ArgumentParser()
 parser.add_argument(
@@ -44,6 +51,50 @@ parser.add_argument(
     help='Paths to files (or directories with option -d) located in student repositories.'
          'Files will be subjected to Moss.'
 )
+parser.add_argument(
+    '--ref',
+    default=None,
+    help='Branch, tag or commit of the student repositories to compare (default: their default branch)'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of student repositories downloaded concurrently'
+)
+parser.add_argument(
+    '--offline',
+    default=False,
+    action='store_true',
+    help='Compare submissions locally with winnowed fingerprints instead of sending them to Moss '
+         '(python, c, cc and java)'
+)
+parser.add_argument(
+    '--prefilter',
+    default=None,
+    type=float,
+    help='Only send to Moss the submissions that share at least this percentage of their fingerprints '
+         'with another submission when compared locally'
+)
+parser.add_argument(
+    '--per_path',
+    default=False,
+    action='store_true',
+    help='Send one Moss query per path of --paths (e.g. one per exercise) instead of a single query, '
+         'student files are downloaded once for all of them'
+)
+parser.add_argument(
+    '--queries',
+    type=int,
+    default=4,
+    help='Number of Moss queries sent concurrently with --per_path'
+)
+parser.add_argument(
+    '--force',
+    default=False,
+    action='store_true',
+    help='Send the submissions to Moss even when a report of the exact same files and options was made recently'
+)
 parser.add_argument(
     '-l',
     default='python',
@@ -139,46 +190,115 @@ parser.add_argument(
 
 def add_base_files(moss: mosspy.Moss, base_files: Iterable, repo: github.Repository.Repository):
     print(f'Adding base files from repo: {repo.full_name}')
+    base_file_paths = []
     for path in base_files:
         print(f'\t{path}')
-        content_file = repo.get_contents(path=path)
+        content_file = github_utils.get_file(repo=repo, path=path)
         head, tail = os.path.split(path)
         file_path = f'{repo.name}_{tail}'
         with open(file_path, 'wb') as f:
             f.write(content_file.decoded_content)
         moss.addBaseFile(file_path=file_path, display_name=file_path)
+        base_file_paths.append(file_path)
+    return base_file_paths
+
+
+def fetch_student_files(paths: Iterable, repositories: Iterable, directory: str, token='', ref=None, directories=False,
+                        workers=github_utils.DEFAULT_WORKERS):
+    print('Fetching student files:')
+    paths = list(paths)
+    fetched, errors = submissions.fetch_submissions(
+        repositories=repositories,
+        patterns=paths,
+        directory=directory,
+        token=token,
+        ref=ref,
+        directories=directories,
+        workers=workers
+    )
+    if len(errors) > 0:
+        raise Exception(f'{Fore.RED}Couldn\'t download {len(errors)} student repositories')
+    return fetched
+
+
+def get_fingerprint_store(org_name, settings, max_submissions):
+    # One store per organization and scan settings, submissions are only compared with the same settings
+    host = urllib.parse.urlparse(github_utils.API_URL).netloc.replace(':', '_')
+    scan = hashlib.sha1(json.dumps([org_name.lower(), *settings]).encode('utf-8')).hexdigest()[:16]
+    return fingerprint_store.FingerprintStore(
+        path=os.path.join(github_utils.CACHE_DIR, 'fingerprints', f'{host}_{scan}.sqlite'),
+        max_submissions=max_submissions
+    )
+
+
+def update_fingerprints(store, repositories: Iterable, base, language, paths: Iterable, directory: str, token='',
+                        ref=None, directories=False, workers=github_utils.DEFAULT_WORKERS):
+    # Only repositories whose files changed since the previous scan, according to the blob SHAs of their tree,
+    # are downloaded, fingerprinted and compared again. The pushed_at of the listed repositories can be older
+    # than the last push, it isn't used to find them. Returns the downloaded submissions
+    repositories = list(repositories)
+    names = {repo.name for repo in repositories}
+    known = set(store.repo_names())
+    removed = [name for name in known if name not in names]
+    changed = []
+    for repo, files, error in github_utils.map_repositories(
+            lambda repo: submissions.list_submission_files(repo, paths, ref=ref, directories=directories),
+            repositories,
+            workers=workers
+    ):
+        # Repositories whose tree couldn't be listed are downloaded
+        if error is not None or files is None or repo.name not in known or files != store.files(repo.name):
+            changed.append(repo)
+    print(f'Repositories changed since the last scan: {len(changed)}/{len(repositories)}')
+    fetched = fetch_student_files(
+        paths=paths,
+        repositories=changed,
+        directory=directory,
+        token=token,
+        ref=ref,
+        directories=directories,
+        workers=workers
+    )
+    updates = []
+    for submission in fetched:
+        files = {}
+        for path in submission.paths:
+            with open(os.path.join(submission.directory, *path.split('/')), 'rb') as f:
+                files[path] = blob_cache.git_blob_sha(f.read())
+        # Submissions without files are stored too, so that they aren't downloaded again until their files change
+        if store.pushed_at(submission.repo.name) is not None and files == store.files(submission.repo.name):
+            store.set_pushed_at(submission.repo.name, str(submission.repo.pushed_at))
+            continue
+        local_submission = winnowing.load_submission(
+            name=submission.repo.name,
+            files=[(path, os.path.join(submission.directory, *path.split('/'))) for path in submission.paths],
+            language=language
+        )
+        for h in base.fingerprints.keys() & local_submission.fingerprints.keys():
+            del local_submission.fingerprints[h]
+        updates.append((submission.repo.name, str(submission.repo.pushed_at), files, local_submission))
+    store.update(updates, removed=removed)
+    print(f'Submissions fingerprinted and compared again: {len(updates)}')
+    return fetched
 
 
-def add_paths(moss: mosspy.Moss, paths: Iterable, repositories: Iterable):
+def add_paths(moss: mosspy.Moss, fetched: Iterable, directories=False, patterns=None):
+    # With patterns, only the files of the submissions matching them are added
     print('Adding student files:')
-    for path in paths:
-        if '*' in path:
-            for repo in repositories:
-                print(f'\t{repo.name}')
-                content_files = github_utils.get_files_from_repo(repo=repo, path='')
-                for content_file in content_files:
-                    with open(content_file.path, 'wb') as f:
-                        f.write(content_file.decoded_content)
-                for file_path in glob.glob(path):
-                    head, tail = os.path.split(file_path)
-                    new_file_path = f'{head}{repo.name}_{tail}'
-                    os.rename(file_path, new_file_path)
-                    moss.addFile(file_path=new_file_path, display_name=f'{repo.name}_{tail}')
-                    print(f'\t\t{tail}')
-        else:
-            for path in paths:
-                for repo in repositories:
-                    print(f'\t{repo.name}')
-                    content_file = repo.get_contents(path=path)
-                    head, tail = os.path.split(path)
-                    file_path = f'{repo.name}_{tail}'
-                    with open(file_path, 'wb') as f:
-                        f.write(content_file.decoded_content)
-                    moss.addFile(file_path=file_path, display_name=file_path)
-                    print(f'\t\t{tail}')
-
-
-def save_report(moss, report_name, report_url):
+    for submission in fetched:
+        print(f'\t{submission.repo.name}')
+        for path in submission.paths:
+            if patterns is not None and not submissions.matches(path, patterns, directories):
+                continue
+            head, tail = os.path.split(path)
+            display_name = f'{submission.repo.name}/{path}' if directories else f'{submission.repo.name}_{tail}'
+            file_path = os.path.join(submission.directory, *path.split('/'))
+            if os.path.getsize(file_path) > 0:
+                moss.addFile(file_path=file_path, display_name=display_name)
+                print(f'\t\t{tail}')
+
+
+def save_report(moss, report_name, report_url, students=(), workers=github_utils.DEFAULT_WORKERS):
     time_str = datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S')
     report_path = f'moss_reports/{report_name}_{time_str}.html'
     head, tail = os.path.split(report_path)
@@ -187,39 +307,223 @@ def save_report(moss, report_name, report_url):
     root, ext = os.path.splitext(report_path)
     new_report_path = root + '.md'
     os.rename(report_path, new_report_path)
+    # The match pages, which Moss deletes after a while, are kept as a dataset next to the report. Without
+    # the dataset, the copy of the report and its url are still kept
+    try:
+        pairs = moss_report.harvest(report_url=report_url, workers=workers, students=students)
+    except Exception as e:
+        print(f'{Fore.YELLOW}Couldn\'t download the matches of {report_url}: {e}')
+        return [new_report_path]
+    moss_report.print_errors(pairs)
+    dataset_paths = moss_report.save_dataset(pairs=pairs, report_url=report_url, output=root)
+    return [new_report_path] + dataset_paths
+
+
+def print_cached_report(report):
+    sent_at = datetime.datetime.fromtimestamp(report['sent_at']).strftime('%Y-%m-%d %H:%M:%S')
+    print(f'{Fore.GREEN}Submissions unchanged since the report sent at {sent_at}, not sending them again')
+    print(f'Report url: {report["url"]}')
+    print('Report copy located at:\n' + ''.join(f'\t{report_path}\n' for report_path in report['report_paths']))
+    datasets = [path for path in report['report_paths'] if path.endswith('.sqlite') and os.path.exists(path)]
+    if len(datasets) > 0:
+        print('Pairs:')
+        moss_report.print_pairs(moss_report.query(datasets[0]))
+
+
+def commit_report(report_paths, report_name):
     git_repo = git.repo.Repo()
-    git_repo.index.add([new_report_path])
+    git_repo.index.add(report_paths)
     git_repo.index.commit(f'Moss report: {report_name}')
     fetch_info = git_repo.remote('origin').pull()
     git_repo.remote('origin').push()
-    print(f'Report copy located at: {new_report_path}')
+    print('Report copy located at:\n' + ''.join(f'\t{report_path}\n' for report_path in report_paths))
 
 
-def main(args):
-    print('\n\n' + 'Submitting files to Moss'.center(80, '='))
-    args = parser.parse_args(args)
-    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
-    github_utils.verify_token(args.token)
+def new_moss(args):
     moss = mosspy.Moss(args.user_id, language=args.l)
     moss.setIgnoreLimit(args.m)
     moss.setCommentString(args.c)
     moss.setNumberOfMatchingFiles(args.n)
     moss.setExperimentalServer(opt=int(args.x))
     moss.setDirectoryMode(mode=int(args.d))
+    return moss
+
+
+def get_query_name(report_name, path):
+    if path is None:
+        return report_name
+    return f'{report_name}_{re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")}'
+
+
+def write_index(queries, report_name, num_pairs):
+    # One page for all the queries: a link to each report and their pairs ranked together
+    time_str = datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S')
+    index_path = f'moss_reports/{report_name}_{time_str}_index.md'
+    lines = [f'# Moss reports: {report_name}', '', '| Path | Report | Copy |', '| --- | --- | --- |']
+    pairs = []
+    for path, report_url, report_paths in queries:
+        lines.append(f'| {path} | {report_url} | {os.path.basename(report_paths[0])} |')
+        datasets = [report_path for report_path in report_paths if report_path.endswith('.sqlite')]
+        if len(datasets) > 0 and os.path.exists(datasets[0]):
+            pairs += [(path, row) for row, ranges in moss_report.query(datasets[0], top=num_pairs)]
+    pairs.sort(key=lambda pair: max(pair[1][3], pair[1][6]), reverse=True)
+    lines += ['', '| Path | First | % | Second | % | Lines |', '| --- | --- | ---: | --- | ---: | ---: |']
+    for path, (rank, first_student, first, first_percent, second_student, second, second_percent, lines_matched,
+               url) in pairs:
+        lines.append(f'| {path} | {first} | {first_percent} | {second} | {second_percent} | {lines_matched} |')
+    with open(index_path, 'w', encoding='UTF-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    return index_path
+
+
+def main(args):
+    print('\n\n' + 'Submitting files to Moss'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
+    github_utils.verify_token(args.token)
+    moss = new_moss(args)
     repositories = github_utils.get_students_repositories(
         token=args.token,
         org_name=args.org_name,
         repo_filter=args.repo_filter
     )
+    base_file_paths = []
     if args.base_files_repo_fullname != '':
         repo = github_utils.get_repo(fullname=args.base_files_repo_fullname, token=args.token)
-        add_base_files(moss=moss, base_files=args.paths, repo=repo)
+        base_file_paths = add_base_files(moss=moss, base_files=args.paths, repo=repo)
 
     print(f'Org: {args.org_name}')
-    add_paths(moss=moss, paths=args.paths, repositories=repositories)
-    report_url = moss.send()
-    print(f'Report url: {report_url}')
-    save_report(moss=moss, report_name=args.report_name, report_url=report_url)
+    with tempfile.TemporaryDirectory() as directory:
+        if args.offline or args.prefilter is not None:
+            print('Comparing locally:')
+            language = winnowing.get_language(args.l)
+            base = winnowing.load_submission(
+                name='base',
+                files=[(path, path) for path in base_file_paths],
+                language=language
+            )
+            store = get_fingerprint_store(
+                org_name=args.org_name,
+                settings=[args.repo_filter, args.paths, args.ref, args.d, args.l, sorted(base.fingerprints)],
+                max_submissions=args.m
+            )
+            fetched = update_fingerprints(
+                store=store,
+                repositories=repositories,
+                base=base,
+                language=language,
+                paths=args.paths,
+                directory=directory,
+                token=args.token,
+                ref=args.ref,
+                directories=args.d,
+                workers=args.workers
+            )
+            matches = store.matches(num_matches=args.n)
+            winnowing.print_matches(matches)
+            if args.offline:
+                report_path = winnowing.save_report(matches, args.report_name)
+                commit_report(report_paths=[report_path], report_name=args.report_name)
+                return
+            suspects = {
+                submission.name
+                for match in matches if match.percent >= args.prefilter
+                for submission in (match.first, match.second)
+            }
+            print(f'Submissions similar enough to be sent to Moss: {len(suspects)}/{len(repositories)}')
+            if len(suspects) == 0:
+                return
+            fetched = [submission for submission in fetched if submission.repo.name in suspects]
+            fetched_names = {submission.repo.name for submission in fetched}
+            fetched += fetch_student_files(
+                paths=args.paths,
+                repositories=[repo for repo in repositories if repo.name in suspects - fetched_names],
+                directory=directory,
+                token=args.token,
+                ref=args.ref,
+                directories=args.d,
+                workers=args.workers
+            )
+        else:
+            fetched = fetch_student_files(
+                paths=args.paths,
+                repositories=repositories,
+                directory=directory,
+                token=args.token,
+                ref=args.ref,
+                directories=args.d,
+                workers=args.workers
+            )
+        # One query per path shares the downloaded files, each one only gets the base file of its path
+        queries = []
+        for path in (args.paths if args.per_path else [None]):
+            if path is None:
+                query = moss
+                add_paths(moss=query, fetched=fetched, directories=args.d)
+            else:
+                print(f'Query for {path}:')
+                query = new_moss(args)
+                for base_path, file_path in zip(args.paths, base_file_paths):
+                    if base_path == path:
+                        query.addBaseFile(file_path=file_path, display_name=file_path)
+                add_paths(moss=query, fetched=fetched, directories=args.d, patterns=[path])
+            if len(query.files) == 0:
+                print(f'{Fore.YELLOW}No student files for {path or args.report_name}, not sending it')
+                continue
+            # The comment (-c) doesn't change the results, the other options do
+            digest = report_registry.get_digest(query, options={k: query.options[k] for k in 'lmndx'})
+            queries.append((path, query, digest))
+        registry = report_registry.ReportRegistry('moss_reports/registry.json')
+        to_send = []
+        reports = {}
+        for path, query, digest in queries:
+            report = registry.get(digest)
+            if report is not None and not args.force:
+                print(f'{path or args.report_name}:')
+                print_cached_report(report)
+                reports[path] = (report['url'], report['report_paths'])
+            else:
+                to_send.append((path, query, digest))
+
+        def send(path, query):
+            report_url = query.send()
+            print(f'Report url for {path or args.report_name}: {report_url}')
+            return report_url, save_report(
+                moss=query,
+                report_name=get_query_name(args.report_name, path),
+                report_url=report_url,
+                students=[repo.name for repo in repositories],
+                workers=args.workers
+            )
+
+        num_fail = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(args.queries, 1)) as executor:
+            futures = {executor.submit(send, path, query): (path, digest) for path, query, digest in to_send}
+            for future in concurrent.futures.as_completed(futures):
+                path, digest = futures[future]
+                try:
+                    reports[path] = future.result()
+                except Exception as e:
+                    print(f'{Fore.RED}Query for {path or args.report_name} failed: {e}')
+                    num_fail += 1
+                    continue
+                registry.put(digest, report_url=reports[path][0], report_paths=reports[path][1])
+    report_paths = [
+        report_path for path, query, digest in to_send if path in reports for report_path in reports[path][1]
+    ]
+    if len(to_send) == num_fail:
+        if num_fail > 0:
+            raise Exception(f'{Fore.RED}{num_fail} Moss queries failed')
+        return
+    if args.per_path:
+        report_paths.append(write_index(
+            queries=[(path, *reports[path]) for path in args.paths if path in reports],
+            report_name=args.report_name,
+            num_pairs=args.n
+        ))
+    commit_report(report_paths=report_paths + [registry.path], report_name=args.report_name)
+    if num_fail > 0:
+        raise Exception(f'{Fore.RED}{num_fail} Moss queries failed')
 
 
 if __name__ == '__main__':
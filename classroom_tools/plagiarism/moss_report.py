@@ -0,0 +1,246 @@
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import urllib.parse
+
+from colorama import Fore
+
+from classroom_tools import github_utils
+
+parser = argparse.ArgumentParser('Download a Moss report with all its match pages, or query a downloaded one')
+parser.add_argument(
+    '--url',
+    default=None,
+    help='Url of the Moss report to download'
+)
+parser.add_argument(
+    '--output',
+    default='moss_reports/report',
+    help='Path without extension of the .json, .csv and .sqlite files written for a downloaded report'
+)
+parser.add_argument(
+    '--dataset',
+    default=None,
+    help='Path of a .sqlite file written for a downloaded report to query instead'
+)
+parser.add_argument(
+    '--student',
+    default=None,
+    help='Only show the pairs of this student'
+)
+parser.add_argument(
+    '--top',
+    type=int,
+    default=50,
+    help='Number of pairs to show'
+)
+parser.add_argument(
+    '--repo_filter',
+    default='',
+    help='Prefix of the student repositories, to tell the repository apart from the file in the names of the report'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=8,
+    help='Number of match pages downloaded concurrently'
+)
+
+# Rows of the report's index: both files with their percentage, then the number of lines matched
+_INDEX_ROW = re.compile(
+    r'<TR><TD><A HREF="([^"]+)">(.+?) \((\d+)%\)</A>\s*<TD><A HREF="[^"]+">(.+?) \((\d+)%\)</A>\s*'
+    r'<TD ALIGN=right>(\d+)',
+    re.IGNORECASE
+)
+# Links of the top frame of a match page, one per side of each matched passage
+_RANGE = re.compile(r'<A HREF="[^"]*" NAME="(\d+)" TARGET="([01])">(\d+)-(\d+)</A>', re.IGNORECASE)
+
+
+def get(url):
+    res = github_utils.request('GET', url=url)
+    if not res.ok:
+        raise Exception(f'{Fore.RED}Couldn\'t download {url}: {res.status_code}')
+    return res.text
+
+
+def parse_index(html):
+    pairs = []
+    for rank, match in enumerate(_INDEX_ROW.finditer(html), start=1):
+        url, first, first_percent, second, second_percent, lines_matched = match.groups()
+        pairs.append(
+            {
+                'rank': rank,
+                'first': first,
+                'first_percent': int(first_percent),
+                'second': second,
+                'second_percent': int(second_percent),
+                'lines_matched': int(lines_matched),
+                'url': url,
+                'ranges': []
+            }
+        )
+    return pairs
+
+
+def parse_ranges(html):
+    # Returns [first start, first end, second start, second end] for every matched passage
+    passages = {}
+    for name, side, start, end in _RANGE.findall(html):
+        passages.setdefault(int(name), [None] * 4)[2 * int(side):2 * int(side) + 2] = [int(start), int(end)]
+    return [passage for _, passage in sorted(passages.items()) if None not in passage]
+
+
+def get_student(file_name, students=(), repo_filter=''):
+    # Submissions are sent as "<repo>_<file>" or "<repo>/<path>" by moss.add_paths, where the repository
+    # name, which can contain _, is the assignment prefix followed by a GitHub username, which can't
+    for student in sorted(students, key=len, reverse=True):
+        if file_name == student or file_name.startswith((f'{student}_', f'{student}/')):
+            return student
+    if repo_filter and file_name.startswith(repo_filter):
+        return repo_filter + re.split(r'[_/]', file_name[len(repo_filter):], maxsplit=1)[0]
+    if '/' in file_name:
+        return file_name.split('/', 1)[0]
+    # Without the repositories or their prefix, a name with a _ in the repository is cut too early
+    return file_name.split('_', 1)[0]
+
+
+def harvest(report_url, workers=8, students=(), repo_filter=''):
+    # The match pages are frames, the passages are listed in their top frame: matchN-top.html. A page that
+    # can't be downloaded leaves its pair without ranges and with the error, the other pairs are kept
+    pairs = parse_index(get(report_url))
+
+    def get_ranges(pair):
+        root, ext = os.path.splitext(urllib.parse.urljoin(report_url, pair['url']))
+        try:
+            return parse_ranges(get(f'{root}-top{ext}')), None
+        except Exception as e:
+            return [], str(e).replace(Fore.RED, '')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for pair, (ranges, error) in zip(pairs, executor.map(get_ranges, pairs)):
+            pair['ranges'] = ranges
+            pair['error'] = error
+            pair['first_student'] = get_student(pair['first'], students, repo_filter)
+            pair['second_student'] = get_student(pair['second'], students, repo_filter)
+    return pairs
+
+
+def save_dataset(pairs, report_url, output):
+    # Writes output.json, output.csv and output.sqlite, returns their paths
+    head, tail = os.path.split(output)
+    if head and not os.path.exists(head): os.makedirs(head)
+    with open(f'{output}.json', 'w', encoding='UTF-8') as f:
+        json.dump({'url': report_url, 'pairs': pairs}, f, indent=2)
+    columns = ['rank', 'first_student', 'first', 'first_percent', 'second_student', 'second', 'second_percent',
+               'lines_matched', 'url']
+    with open(f'{output}.csv', 'w', encoding='UTF-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns + ['ranges', 'error'])
+        for pair in pairs:
+            ranges = ';'.join(f'{a}-{b}:{c}-{d}' for a, b, c, d in pair['ranges'])
+            writer.writerow([pair[column] for column in columns] + [ranges, pair.get('error') or ''])
+    if os.path.exists(f'{output}.sqlite'):
+        os.remove(f'{output}.sqlite')
+    connection = sqlite3.connect(f'{output}.sqlite')
+    with connection:
+        connection.execute('CREATE TABLE report (url TEXT)')
+        connection.execute('INSERT INTO report VALUES (?)', (report_url,))
+        connection.execute(
+            'CREATE TABLE pairs (rank INTEGER PRIMARY KEY, first_student TEXT, first TEXT, first_percent INTEGER, '
+            'second_student TEXT, second TEXT, second_percent INTEGER, lines_matched INTEGER, url TEXT)'
+        )
+        connection.execute(
+            'CREATE TABLE ranges (rank INTEGER, first_start INTEGER, first_end INTEGER, '
+            'second_start INTEGER, second_end INTEGER)'
+        )
+        # Match pages that couldn't be downloaded, their pairs have no ranges
+        connection.execute('CREATE TABLE errors (rank INTEGER PRIMARY KEY, error TEXT)')
+        connection.executemany(
+            'INSERT INTO errors VALUES (?, ?)',
+            [(pair['rank'], pair['error']) for pair in pairs if pair.get('error') is not None]
+        )
+        # Index by student: one row per student and pair, whichever side the student is on
+        connection.execute('CREATE TABLE students (student TEXT, rank INTEGER)')
+        connection.executemany(
+            f'INSERT INTO pairs VALUES ({", ".join("?" * len(columns))})',
+            [[pair[column] for column in columns] for pair in pairs]
+        )
+        connection.executemany(
+            'INSERT INTO ranges VALUES (?, ?, ?, ?, ?)',
+            [(pair['rank'], *passage) for pair in pairs for passage in pair['ranges']]
+        )
+        connection.executemany(
+            'INSERT INTO students VALUES (?, ?)',
+            [(pair[side], pair['rank']) for pair in pairs for side in ('first_student', 'second_student')]
+        )
+        connection.execute('CREATE INDEX students_student ON students (student)')
+        connection.execute('CREATE INDEX ranges_rank ON ranges (rank)')
+    connection.close()
+    return [f'{output}.json', f'{output}.csv', f'{output}.sqlite']
+
+
+def query(dataset, student=None, top=50):
+    connection = sqlite3.connect(dataset)
+    try:
+        if student is None:
+            rows = connection.execute('SELECT * FROM pairs ORDER BY rank LIMIT ?', (top,)).fetchall()
+        else:
+            rows = connection.execute(
+                'SELECT DISTINCT pairs.* FROM students JOIN pairs ON pairs.rank = students.rank '
+                'WHERE students.student = ? ORDER BY pairs.rank LIMIT ?',
+                (student, top)
+            ).fetchall()
+        results = []
+        for row in rows:
+            ranges = connection.execute(
+                'SELECT first_start, first_end, second_start, second_end FROM ranges WHERE rank = ?', (row[0],)
+            ).fetchall()
+            results.append((row, ranges))
+        return results
+    finally:
+        connection.close()
+
+
+def print_pairs(results):
+    for (rank, first_student, first, first_percent, second_student, second, second_percent, lines_matched, url), \
+            ranges in results:
+        color = Fore.RED if max(first_percent, second_percent) >= 50 else Fore.YELLOW
+        print(f'{color}\t{rank}. {first} ({first_percent}%) - {second} ({second_percent}%): {lines_matched} lines')
+        for first_start, first_end, second_start, second_end in ranges:
+            print(f'\t\t{first_start}-{first_end} / {second_start}-{second_end}')
+
+
+def print_errors(pairs):
+    errors = [pair for pair in pairs if pair.get('error') is not None]
+    if len(errors) > 0:
+        print(f'{Fore.YELLOW}Match pages not downloaded, their pairs have no passages: {len(errors)}')
+        for pair in errors:
+            print(f'{Fore.YELLOW}\t{pair["rank"]}. {pair["first"]} - {pair["second"]}: {pair["error"]}')
+
+
+def main(args):
+    print('\n\n' + 'Moss report'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
+    if args.url is None and args.dataset is None:
+        raise Exception(f'{Fore.RED}Either --url or --dataset is required')
+    dataset = args.dataset
+    if args.url is not None:
+        pairs = harvest(report_url=args.url, workers=args.workers, repo_filter=args.repo_filter)
+        paths = save_dataset(pairs=pairs, report_url=args.url, output=args.output)
+        print(f'Number of pairs: {len(pairs)}')
+        print(f'Number of matched passages: {sum(len(pair["ranges"]) for pair in pairs)}')
+        print_errors(pairs)
+        print('Dataset located at:\n' + ''.join(f'\t{path}\n' for path in paths))
+        dataset = dataset or paths[-1]
+    print('Pairs:')
+    print_pairs(query(dataset, student=args.student, top=args.top))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
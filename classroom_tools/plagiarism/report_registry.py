@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+import time
+
+from classroom_tools import blob_cache
+
+# Moss deletes reports after about two weeks, older entries are ignored
+TTL = 14 * 24 * 3600
+
+
+def get_digest(moss, options):
+    # Digest of what a Moss query depends on: the content of every file with the name it is sent under,
+    # and the options that change the results
+    entries = []
+    for kind, files in (('base', moss.base_files), ('file', moss.files)):
+        for file_path, display_name in files:
+            with open(file_path, 'rb') as f:
+                entries.append([kind, display_name, blob_cache.git_blob_sha(f.read())])
+    return hashlib.sha256(json.dumps([sorted(entries), options], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ReportRegistry:
+    # Reports by digest of the submission set, kept in moss_reports/ so that it is committed with the reports
+    def __init__(self, path, ttl=TTL):
+        self.path = path
+        self.ttl = ttl
+        self.reports = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='UTF-8') as f:
+                    self.reports = json.load(f)
+            except ValueError:
+                pass
+
+    def get(self, digest):
+        report = self.reports.get(digest)
+        if report is None or time.time() - report['sent_at'] > self.ttl:
+            return None
+        return report
+
+    def put(self, digest, report_url, report_paths):
+        now = time.time()
+        self.reports = {
+            key: report for key, report in self.reports.items() if now - report['sent_at'] <= self.ttl
+        }
+        self.reports[digest] = {'url': report_url, 'report_paths': report_paths, 'sent_at': now}
+        head, tail = os.path.split(self.path)
+        if head and not os.path.exists(head): os.makedirs(head)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='UTF-8') as f:
+            json.dump(self.reports, f, indent=2)
+        os.replace(tmp_path, self.path)
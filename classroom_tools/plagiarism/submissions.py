@@ -0,0 +1,102 @@
+import fnmatch
+import os
+import posixpath
+import shutil
+import tarfile
+
+from colorama import Fore
+
+from classroom_tools import github_utils
+
+
+class Submission:
+    def __init__(self, repo, ref, directory, paths):
+        self.repo = repo
+        # Commit the archive was taken from, as abbreviated in the archive's top level directory
+        self.ref = ref
+        self.directory = directory
+        self.paths = paths
+
+
+def matches(path, patterns, directories=False):
+    # Same rules as glob from the repository root: * doesn't cross directories, and with directories=True
+    # a pattern matching a directory selects every file below it
+    parts = path.split('/')
+    for pattern in patterns:
+        pattern_parts = pattern.strip('/').split('/')
+        if len(pattern_parts) > len(parts) or (len(pattern_parts) < len(parts) and not directories):
+            continue
+        if all(fnmatch.fnmatchcase(part, pattern_part) for part, pattern_part in zip(parts, pattern_parts)):
+            return True
+    return False
+
+
+def download_submission(repo, patterns, directory, token='', ref=None, directories=False):
+    # A single request for the whole repository, the tarball is extracted while it downloads and only
+    # the files matching the patterns are written
+    url = f'{repo.url}/tarball/{ref}' if ref else f'{repo.url}/tarball'
+    res = github_utils.request('GET', url=url, token=token, stream=True)
+    if not res.ok:
+        raise Exception(f'{Fore.RED}Couldn\'t download archive of repo {repo.full_name}: {res.status_code} {res.text}')
+    commit = None
+    paths = []
+    with res, tarfile.open(fileobj=res.raw, mode='r|*') as archive:
+        for member in archive:
+            # Entries are under a single directory named {owner}-{repo}-{short sha}
+            root, _, path = member.name.partition('/')
+            if commit is None and '-' in root:
+                commit = root.rsplit('-', 1)[-1]
+            path = posixpath.normpath(path) if path else ''
+            if not member.isfile() or path.startswith('..') or posixpath.isabs(path):
+                continue
+            if not matches(path, patterns, directories=directories):
+                continue
+            file_path = os.path.join(directory, *path.split('/'))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with archive.extractfile(member) as src, open(file_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            paths.append(path)
+    return Submission(repo=repo, ref=commit or ref, directory=directory, paths=sorted(paths))
+
+
+def list_submission_files(repo, patterns, ref=None, directories=False):
+    # Blob SHAs of the files download_submission would write, from the repository's tree, or None when the
+    # API truncates the tree
+    tree = github_utils.get_tree(repo, ref=ref)
+    if tree is None:
+        return None
+    return {
+        file.path: file.sha for file in tree
+        # Symbolic links aren't extracted from the archive
+        if file.mode != '120000' and matches(file.path, patterns, directories=directories)
+    }
+
+
+def fetch_submissions(repositories, patterns, directory, token='', ref=None, directories=False,
+                      workers=github_utils.DEFAULT_WORKERS):
+    # Each student gets its own directory named after the repository, returns the submissions and the failures
+    submissions = []
+    errors = []
+    results = github_utils.map_repositories(
+        fn=lambda repo: download_submission(
+            repo=repo,
+            patterns=patterns,
+            directory=os.path.join(directory, repo.name),
+            token=token,
+            ref=ref,
+            directories=directories
+        ),
+        repositories=repositories,
+        workers=workers
+    )
+    for repo, submission, error in results:
+        if error is not None:
+            print(f'{Fore.RED}\tFAILED {repo.name}\n{Fore.RED}\t{error}')
+            errors.append((repo, error))
+        elif len(submission.paths) == 0:
+            print(f'{Fore.YELLOW}\t{repo.name} ({submission.ref}): no files matching {", ".join(patterns)}')
+            submissions.append(submission)
+        else:
+            print(f'{Fore.GREEN}\t{repo.name} ({submission.ref}): {len(submission.paths)} files')
+            submissions.append(submission)
+    return submissions, errors
@@ -0,0 +1,340 @@
+import argparse
+import collections
+import datetime
+import itertools
+import os
+import re
+import sys
+import zlib
+
+from colorama import Fore
+
+from classroom_tools.plagiarism import submissions
+
+parser = argparse.ArgumentParser(
+    'Compare submissions locally with winnowed fingerprints (Moss\' algorithm), without network access'
+)
+parser.add_argument(
+    '--submissions',
+    required=True,
+    nargs='+',
+    help='Directories, one per submission'
+)
+parser.add_argument(
+    '--paths',
+    default=None,
+    nargs='*',
+    help='Paths of the files to compare in each submission, "*" doesn\'t cross directories and a directory '
+         'selects every file below it (default: every file with an extension of the language)'
+)
+parser.add_argument(
+    '--base_files',
+    default=[],
+    nargs='*',
+    help='Files whose code is expected in every submission, it is never reported'
+)
+parser.add_argument(
+    '-l',
+    default='python',
+    help='Source language of the submissions'
+)
+parser.add_argument(
+    '-m',
+    default=10,
+    type=int,
+    help='Passages found in more than this number of submissions are ignored, like Moss\' -m option'
+)
+parser.add_argument(
+    '-n',
+    default=250,
+    type=int,
+    help='Number of matching pairs to report'
+)
+parser.add_argument(
+    '-k',
+    default=None,
+    type=int,
+    help='Number of tokens in a fingerprinted passage (default: language specific)'
+)
+parser.add_argument(
+    '-w',
+    default=None,
+    type=int,
+    help='Number of consecutive passages from which one fingerprint is kept (default: language specific)'
+)
+parser.add_argument(
+    '--report_name',
+    default='report',
+    help='Name of the report written to moss_reports/'
+)
+
+_C_KEYWORDS = {
+    'auto', 'break', 'case', 'char', 'const', 'continue', 'default', 'do', 'double', 'else', 'enum', 'extern',
+    'float', 'for', 'goto', 'if', 'inline', 'int', 'long', 'register', 'return', 'short', 'signed', 'sizeof',
+    'static', 'struct', 'switch', 'typedef', 'union', 'unsigned', 'void', 'volatile', 'while',
+}
+_CC_KEYWORDS = _C_KEYWORDS | {
+    'bool', 'catch', 'class', 'delete', 'false', 'friend', 'namespace', 'new', 'nullptr', 'operator', 'private',
+    'protected', 'public', 'template', 'this', 'throw', 'true', 'try', 'typename', 'using', 'virtual',
+}
+_JAVA_KEYWORDS = {
+    'abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch', 'char', 'class', 'continue', 'default',
+    'do', 'double', 'else', 'enum', 'extends', 'false', 'final', 'finally', 'float', 'for', 'if', 'implements',
+    'import', 'instanceof', 'int', 'interface', 'long', 'new', 'null', 'package', 'private', 'protected', 'public',
+    'return', 'short', 'static', 'super', 'switch', 'synchronized', 'this', 'throw', 'throws', 'true', 'try',
+    'void', 'volatile', 'while',
+}
+_PYTHON_KEYWORDS = {
+    'False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await', 'break', 'class', 'continue', 'def', 'del',
+    'elif', 'else', 'except', 'finally', 'for', 'from', 'global', 'if', 'import', 'in', 'is', 'lambda',
+    'nonlocal', 'not', 'or', 'pass', 'raise', 'return', 'try', 'while', 'with', 'yield',
+}
+_C_COMMENT = r'//[^\n]*|/\*.*?\*/'
+_C_STRING = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+_PYTHON_STRING = r'[rbuRBUfF]{0,2}(?:"""(?:\\.|.)*?"""|\'\'\'(?:\\.|.)*?\'\'\'|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')'
+
+
+class Language:
+    def __init__(self, extensions, keywords, comment, string, k, window):
+        self.extensions = extensions
+        self.keywords = keywords
+        self.k = k
+        self.window = window
+        self.pattern = re.compile(
+            rf'(?P<comment>{comment})|(?P<string>{string})|(?P<number>\d[\w.]*)|(?P<name>[A-Za-z_$][\w$]*)'
+            r'|(?P<op>\S)',
+            re.DOTALL
+        )
+
+
+# Names are the ones used by Moss' -l option
+LANGUAGES = {
+    'python': Language(('.py',), _PYTHON_KEYWORDS, r'\#[^\n]*', _PYTHON_STRING, k=12, window=6),
+    'c': Language(('.c', '.h'), _C_KEYWORDS, _C_COMMENT, _C_STRING, k=15, window=6),
+    'cc': Language(('.cc', '.cpp', '.cxx', '.hpp', '.h'), _CC_KEYWORDS, _C_COMMENT, _C_STRING, k=15, window=6),
+    'java': Language(('.java',), _JAVA_KEYWORDS, _C_COMMENT, _C_STRING, k=15, window=6),
+}
+# Rolling hash of the token values of a passage
+_BASE = 1000003
+_MODULUS = (1 << 61) - 1
+
+
+def get_language(name):
+    if name not in LANGUAGES:
+        raise Exception(f'{Fore.RED}Language not supported locally: {name}\nChoose from: {", ".join(LANGUAGES)}')
+    return LANGUAGES[name]
+
+
+def tokenize(text, language):
+    # Comments and layout are dropped, identifiers, strings and numbers are replaced by their kind so that
+    # renaming variables or changing constants doesn't hide copied code. Returns (token value, line) pairs
+    tokens = []
+    line = 1
+    position = 0
+    for match in language.pattern.finditer(text):
+        line += text.count('\n', position, match.start())
+        position = match.start()
+        kind = match.lastgroup
+        if kind == 'comment':
+            continue
+        if kind == 'name':
+            token = match.group() if match.group() in language.keywords else 'N'
+        elif kind == 'op':
+            token = match.group()
+        else:
+            token = kind[0].upper()
+        tokens.append((zlib.crc32(token.encode('utf-8')), line))
+    return tokens
+
+
+def winnow(tokens, k, window):
+    # Hashes every passage of k tokens and keeps the smallest of each window of consecutive hashes,
+    # two submissions sharing a passage of at least k + window - 1 tokens are guaranteed a common fingerprint.
+    # Returns (hash, line) pairs
+    hashes = []
+    top = pow(_BASE, k - 1, _MODULUS)
+    h = 0
+    for i, (value, line) in enumerate(tokens):
+        if i >= k:
+            h = (h - tokens[i - k][0] * top) % _MODULUS
+        h = (h * _BASE + value) % _MODULUS
+        if i >= k - 1:
+            hashes.append((h, tokens[i - k + 1][1]))
+    if len(hashes) <= window:
+        return [min(hashes, key=lambda item: item[0])] if hashes else []
+    fingerprints = []
+    selected = -1
+    for start in range(len(hashes) - window + 1):
+        # Rightmost minimum, so a window that shares its minimum with the previous one selects nothing new
+        smallest = start
+        for i in range(start + 1, start + window):
+            if hashes[i][0] <= hashes[smallest][0]:
+                smallest = i
+        if smallest != selected:
+            fingerprints.append(hashes[smallest])
+            selected = smallest
+    return fingerprints
+
+
+class Submission:
+    def __init__(self, name):
+        self.name = name
+        # Fingerprint hash: [(path, line), ...]
+        self.fingerprints = {}
+
+    def add_file(self, path, text, language, k=None, window=None):
+        tokens = tokenize(text, language)
+        for h, line in winnow(tokens, k or language.k, window or language.window):
+            self.fingerprints.setdefault(h, []).append((path, line))
+
+
+class Match:
+    def __init__(self, first, second, shared):
+        self.first = first
+        self.second = second
+        self.shared = shared
+        self.percent_first = 100 * len(shared) / max(len(first.fingerprints), 1)
+        self.percent_second = 100 * len(shared) / max(len(second.fingerprints), 1)
+
+    @property
+    def percent(self):
+        return max(self.percent_first, self.percent_second)
+
+    def lines(self, submission):
+        return _format_lines(location for h in self.shared for location in submission.fingerprints[h])
+
+
+def _format_lines(locations):
+    # Groups lines by file and merges consecutive ones: "main.py: 3-10, 14"
+    by_path = collections.defaultdict(set)
+    for path, line in locations:
+        by_path[path].add(line)
+    parts = []
+    for path, lines in sorted(by_path.items()):
+        ranges = []
+        for _, group in itertools.groupby(enumerate(sorted(lines)), key=lambda item: item[1] - item[0]):
+            group = [line for _, line in group]
+            ranges.append(f'{group[0]}-{group[-1]}' if len(group) > 1 else f'{group[0]}')
+        parts.append(f'{path}: {", ".join(ranges)}')
+    return '; '.join(parts)
+
+
+def read_files(directory, patterns, language):
+    # Relative paths use / on every platform so that they can be matched against the patterns
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs.sort()
+        for name in sorted(names):
+            file_path = os.path.join(root, name)
+            path = os.path.relpath(file_path, directory).replace(os.sep, '/')
+            if patterns is None:
+                selected = name.endswith(language.extensions)
+            else:
+                selected = submissions.matches(path, patterns, directories=True)
+            if selected:
+                files.append((path, file_path))
+    return files
+
+
+def load_submission(name, files, language, k=None, window=None):
+    # files: (path shown in the report, path on disk) pairs
+    submission = Submission(name)
+    for path, file_path in files:
+        with open(file_path, encoding='UTF-8', errors='replace') as f:
+            submission.add_file(path, f.read(), language, k=k, window=window)
+    return submission
+
+
+def compare(all_submissions, base=None, max_submissions=10, num_matches=250):
+    # Fingerprints of the base files, and like Moss' -m the ones found in more than max_submissions submissions,
+    # are removed from the submissions. The pairs sharing the most of the remaining ones are found with an
+    # inverted index from fingerprint to submissions
+    base_fingerprints = set(base.fingerprints) if base is not None else set()
+    index = collections.defaultdict(list)
+    for i, submission in enumerate(all_submissions):
+        for h in submission.fingerprints:
+            if h not in base_fingerprints:
+                index[h].append(i)
+    num_shared = collections.Counter()
+    for h, owners in index.items():
+        if len(owners) > max_submissions:
+            base_fingerprints.add(h)
+        elif len(owners) > 1:
+            num_shared.update(itertools.combinations(owners, 2))
+    for submission in all_submissions:
+        for h in base_fingerprints.intersection(submission.fingerprints):
+            del submission.fingerprints[h]
+    matches = []
+    for (i, j), _ in num_shared.most_common(num_matches):
+        first, second = all_submissions[i], all_submissions[j]
+        matches.append(Match(first, second, [h for h in first.fingerprints if h in second.fingerprints]))
+    return matches
+
+
+def format_report(matches):
+    lines = [
+        '| Rank | Submission | % | Submission | % | Fingerprints | Lines | Lines |',
+        '| ---: | --- | ---: | --- | ---: | ---: | --- | --- |'
+    ]
+    for rank, match in enumerate(matches, start=1):
+        lines.append(
+            f'| {rank} | {match.first.name} | {match.percent_first:.0f} | {match.second.name} | '
+            f'{match.percent_second:.0f} | {len(match.shared)} | {match.lines(match.first)} | '
+            f'{match.lines(match.second)} |'
+        )
+    return '\n'.join(lines) + '\n'
+
+
+def print_matches(matches, limit=20):
+    for match in matches[:limit]:
+        color = Fore.RED if match.percent >= 50 else Fore.YELLOW
+        print(
+            f'{color}\t{match.first.name} ({match.percent_first:.0f}%) - {match.second.name} '
+            f'({match.percent_second:.0f}%): {len(match.shared)} fingerprints'
+        )
+    if len(matches) > limit:
+        print(f'\t... {len(matches) - limit} more in the report')
+
+
+def save_report(matches, report_name):
+    time_str = datetime.datetime.now().strftime('%Y-%m-%d_%H%M%S')
+    report_path = f'moss_reports/{report_name}_{time_str}_local.md'
+    if not os.path.exists('moss_reports'): os.makedirs('moss_reports')
+    with open(report_path, 'w', encoding='UTF-8') as f:
+        f.write(format_report(matches))
+    return report_path
+
+
+def main(args):
+    print('\n\n' + 'Comparing submissions locally'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
+    language = get_language(args.l)
+    all_submissions = [
+        load_submission(
+            name=os.path.basename(os.path.normpath(directory)),
+            files=read_files(directory, args.paths, language),
+            language=language,
+            k=args.k,
+            window=args.w
+        )
+        for directory in args.submissions
+    ]
+    base = load_submission(
+        name='base',
+        files=[(path, path) for path in args.base_files],
+        language=language,
+        k=args.k,
+        window=args.w
+    )
+    matches = compare(all_submissions, base=base, max_submissions=args.m, num_matches=args.n)
+    print_matches(matches)
+    report_path = save_report(matches, args.report_name)
+    print('\nSummary:')
+    print(f'\tNumber of submissions: {len(all_submissions)}')
+    print(f'\tNumber of matching pairs: {len(matches)}')
+    print(f'\tReport located at: {report_path}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,91 @@
+import threading
+import time
+
+MUTATING_METHODS = {'POST', 'PATCH', 'PUT', 'DELETE'}
+
+
+class Budget:
+    def __init__(self, remaining, limit, reset):
+        self.remaining = remaining
+        self.limit = limit
+        self.reset = reset
+
+
+def get_resource(url):
+    if '/graphql' in url:
+        return 'graphql'
+    elif '/search/' in url:
+        return 'search'
+    return 'core'
+
+
+def is_mutating(method, resource='core'):
+    # GraphQL queries are sent with POST but only mutations count as writes
+    return method.upper() in MUTATING_METHODS and resource != 'graphql'
+
+
+class RateLimitScheduler:
+    # Paces requests using GitHub's X-RateLimit-* and Retry-After headers.
+    # Mutating requests are spaced out to stay under the secondary (content creation) limits,
+    # the spacing grows each time GitHub pushes back and shrinks again while writes succeed.
+    def __init__(self, reserve=10, mutation_interval=1.0, max_mutation_interval=60.0, max_retries=5):
+        self.reserve = reserve
+        self.min_mutation_interval = mutation_interval
+        self.max_mutation_interval = max_mutation_interval
+        self.mutation_interval = mutation_interval
+        self.max_retries = max_retries
+        self.budgets = {}
+        self.paused_until = 0.0
+        self.next_mutation = 0.0
+        self.num_retries = 0
+        self._lock = threading.Lock()
+
+    def delay(self, method, resource='core'):
+        with self._lock:
+            now = time.time()
+            wait = max(self.paused_until - now, 0.0)
+            budget = self.budgets.get(resource)
+            if budget is not None:
+                if budget.reset <= now:
+                    budget.remaining = budget.limit
+                if budget.remaining <= self.reserve:
+                    wait = max(wait, budget.reset - now + 1)
+                else:
+                    budget.remaining -= 1
+            if is_mutating(method, resource):
+                start = max(now + wait, self.next_mutation)
+                self.next_mutation = start + self.mutation_interval
+                wait = start - now
+            return wait
+
+    def update(self, method, res):
+        headers = res.headers
+        now = time.time()
+        with self._lock:
+            if 'X-RateLimit-Remaining' in headers:
+                resource = headers.get('X-RateLimit-Resource', 'core')
+                self.budgets[resource] = Budget(
+                    remaining=int(headers['X-RateLimit-Remaining']),
+                    limit=int(headers.get('X-RateLimit-Limit', 0)),
+                    reset=int(headers.get('X-RateLimit-Reset', now))
+                )
+            if res.status_code in (403, 429):
+                if 'Retry-After' in headers:
+                    retry_after = float(headers['Retry-After'])
+                elif headers.get('X-RateLimit-Remaining') == '0':
+                    retry_after = float(headers.get('X-RateLimit-Reset', now)) - now + 1
+                elif 'rate limit' in res.text.lower():
+                    retry_after = 60.0
+                else:
+                    return None
+                if headers.get('X-RateLimit-Remaining') != '0':
+                    self.mutation_interval = min(self.mutation_interval * 2, self.max_mutation_interval)
+                self.paused_until = max(self.paused_until, now + retry_after)
+                self.num_retries += 1
+                return max(retry_after, 0.0)
+            if is_mutating(method, get_resource(res.url)) and res.ok:
+                self.mutation_interval = max(self.mutation_interval * 0.9, self.min_mutation_interval)
+            return None
+
+    def projected_duration(self, num_mutations):
+        return num_mutations * self.mutation_interval
@@ -0,0 +1,113 @@
+import datetime
+import json
+import os
+import time
+
+# Repositories updated during this window before the last refresh are listed again, which covers clock skew
+REFRESH_OVERLAP = 3600
+# Incremental refreshes can't see deleted repositories, so the index is rebuilt periodically
+FULL_REFRESH_INTERVAL = 7 * 24 * 3600
+
+
+def _timestamp(iso_date):
+    date = datetime.datetime.strptime(iso_date, '%Y-%m-%dT%H:%M:%SZ')
+    return date.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def _pages(get, url, params, first_page=None):
+    res = first_page if first_page is not None else get(url, params)
+    while True:
+        res.raise_for_status()
+        data = res.json()
+        for raw_data in data['items'] if isinstance(data, dict) else data:
+            yield raw_data
+        if 'next' not in res.links:
+            break
+        res = get(res.links['next']['url'], None)
+
+
+class RepoIndex:
+    # Local copy of an organization's repositories (raw API data keyed by repository id)
+    def __init__(self, path):
+        self.path = path
+        self.repos = {}
+        self.refreshed_at = 0.0
+        self.listed_at = 0.0
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='UTF-8') as f:
+                    data = json.load(f)
+                self.repos = data['repos']
+                self.refreshed_at = data['refreshed_at']
+                self.listed_at = data['listed_at']
+            except (ValueError, KeyError):
+                pass
+
+    def save(self):
+        head, tail = os.path.split(self.path)
+        if not os.path.exists(head): os.makedirs(head)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='UTF-8') as f:
+            json.dump(
+                {
+                    'repos': self.repos,
+                    'refreshed_at': self.refreshed_at,
+                    'listed_at': self.listed_at
+                },
+                f
+            )
+        os.replace(tmp_path, self.path)
+
+    def _add(self, raw_data):
+        self.repos[str(raw_data['id'])] = raw_data
+
+    def list_all(self, get, org_name):
+        now = time.time()
+        self.repos = {}
+        for raw_data in _pages(get, f'/orgs/{org_name}/repos', {'per_page': 100}):
+            self._add(raw_data)
+        self.refreshed_at = now
+        self.listed_at = now
+
+    def refresh(self, get, org_name):
+        # A push doesn't always change updated_at and a change of settings doesn't change pushed_at, the
+        # repositories are listed by both until they get older than the last refresh
+        now = time.time()
+        since = self.refreshed_at - REFRESH_OVERLAP
+        for sort in ('pushed', 'updated'):
+            params = {'sort': sort, 'direction': 'desc', 'per_page': 100}
+            for raw_data in _pages(get, f'/orgs/{org_name}/repos', params):
+                # Repositories never pushed to have no pushed_at
+                if _timestamp(raw_data[f'{sort}_at'] or raw_data['updated_at']) < since:
+                    break
+                self._add(raw_data)
+        self.refreshed_at = now
+
+    def is_complete(self):
+        return time.time() - self.listed_at < FULL_REFRESH_INTERVAL
+
+    def update(self, get, org_name, repo_filter):
+        # Search can't seed the index: it matches whole words of the names rather than any substring, and it
+        # would postpone the full listing that drops deleted repositories
+        if not self.is_complete():
+            self.list_all(get, org_name)
+            return
+        self.refresh(get, org_name)
+
+    def remove(self, full_names):
+        full_names = set(full_names)
+        self.repos = {
+            id_: raw_data for id_, raw_data in self.repos.items() if raw_data['full_name'] not in full_names
+        }
+
+    def matching(self, repo_filter):
+        return sorted(
+            filter(
+                lambda raw_data: repo_filter in raw_data['name'],
+                self.repos.values()
+            ),
+            key=lambda raw_data: raw_data['name']
+        )
+
+    def names(self):
+        return sorted(raw_data['name'] for raw_data in self.repos.values())
@@ -1,4 +1,5 @@
 import argparse
+import asyncio
 
 from colorama import Fore
 
@@ -26,31 +27,83 @@ parser.add_argument(
     default='pull',
     help='Pull (read-only) or push (read, write)'
 )
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories processed concurrently'
+)
+parser.add_argument(
+    '--backend',
+    choices=github_utils.BACKENDS,
+    default='threads',
+    help='Send requests from a thread pool or from a single asyncio event loop (requires aiohttp)'
+)
+parser.add_argument(
+    '--concurrency',
+    type=int,
+    default=github_utils.DEFAULT_CONCURRENCY,
+    help='Maximum number of requests in flight with the async backend'
+)
+parser.add_argument(
+    '--resume',
+    default=False,
+    action='store_true',
+    help='Skip repositories completed by a previous run that was interrupted'
+)
+
 
+def get_collaborators_and_teams(repo, snapshot=None):
+    if snapshot is None:
+        return list(repo.get_collaborators(affiliation='all')), list(repo.get_teams())
+    return snapshot.collaborators, snapshot.teams
 
-def confirm_changes(repositories, new_permission):
+
+def confirm_repo_changes(repo, new_permission, snapshot=None):
     num_ok = 0
     num_fail = 0
-    for repo in repositories:
-        print(f'Repo: {repo.full_name}')
-        for col in repo.get_collaborators(affiliation='all'):
-            if not col.permissions.admin:
-                if col.permissions.pull and new_permission == 'pull':
-                    print(f'{Fore.GREEN}\tCollaborator: {col.login}\tPermission: pull')
-                    num_ok += 1
-                elif col.permissions.push and new_permission == 'push':
-                    print(f'{Fore.GREEN}\tCollaborator: {col.login}\tPermission: push')
-                    num_ok += 1
-                else:
-                    print(f'{Fore.RED}\tCollaborator: {col.login}\n{Fore.RED}Permissions: {col.permissions}')
-                    num_fail += 1
-        for team in repo.get_teams():
-            if team.permission == new_permission:
-                print(f'{Fore.GREEN}\tTeam: {team.name}\tPermission: {team.permission}')
+    print(f'Repo: {repo.full_name}')
+    collaborators, teams = get_collaborators_and_teams(repo=repo, snapshot=snapshot)
+    for col in collaborators:
+        if not col.permissions.admin:
+            if col.permissions.pull and new_permission == 'pull':
+                print(f'{Fore.GREEN}\tCollaborator: {col.login}\tPermission: pull')
+                num_ok += 1
+            elif col.permissions.push and new_permission == 'push':
+                print(f'{Fore.GREEN}\tCollaborator: {col.login}\tPermission: push')
                 num_ok += 1
             else:
-                print(f'{Fore.RED}\tTeam: {team.name}\t Permission: {team.permission}')
+                print(f'{Fore.RED}\tCollaborator: {col.login}\n{Fore.RED}Permissions: {col.permissions}')
                 num_fail += 1
+    for team in teams:
+        if team.permission == new_permission:
+            print(f'{Fore.GREEN}\tTeam: {team.name}\tPermission: {team.permission}')
+            num_ok += 1
+        else:
+            print(f'{Fore.RED}\tTeam: {team.name}\t Permission: {team.permission}')
+            num_fail += 1
+    return num_ok, num_fail
+
+
+def confirm_changes(repositories, new_permission, workers=github_utils.DEFAULT_WORKERS, token='', repo_filter=''):
+    num_ok = 0
+    num_fail = 0
+    snapshots = github_utils.get_repositories_snapshot(token=token, repositories=repositories, repo_filter=repo_filter)
+    for repo, counts, error in github_utils.map_repositories(
+            fn=lambda repo: confirm_repo_changes(
+                repo=repo,
+                new_permission=new_permission,
+                snapshot=snapshots.get(repo.full_name)
+            ),
+            repositories=repositories,
+            workers=workers
+    ):
+        if error is not None:
+            print(f'{Fore.RED}\tCouldn\'t read permissions of repo: {repo.full_name}\n{Fore.RED}{error}')
+            num_fail += 1
+        else:
+            num_ok += counts[0]
+            num_fail += counts[1]
     print('\nSummary:')
     print(f'\tTotal number of repositories: {len(repositories)}')
     print(f'\tTotal number of successful permission changes: {num_ok}')
@@ -59,13 +112,63 @@ def confirm_changes(repositories, new_permission):
         raise Exception(f'{Fore.RED}Couldn\'t apply permission changes')
 
 
-def apply_changes(repositories, new_permission):
-    for repo in repositories:
-        for col in repo.get_collaborators(affiliation='all'):
-            if not col.permissions.admin:
-                repo.add_to_collaborators(col, permission=new_permission)
-        for team in repo.get_teams():
-            team.set_repo_permission(repo=repo, permission=new_permission)
+def apply_repo_changes(repo, new_permission, snapshot=None):
+    collaborators, teams = get_collaborators_and_teams(repo=repo, snapshot=snapshot)
+    for col in collaborators:
+        if not col.permissions.admin:
+            repo.add_to_collaborators(col.login, permission=new_permission)
+    for team in teams:
+        team.set_repo_permission(repo=repo, permission=new_permission)
+
+
+async def apply_repo_changes_async(client, repo, new_permission, snapshot=None):
+    collaborators, teams = await asyncio.to_thread(get_collaborators_and_teams, repo=repo, snapshot=snapshot)
+    await asyncio.gather(
+        *(
+            client.add_to_collaborators(repo, col.login, permission=new_permission)
+            for col in collaborators if not col.permissions.admin
+        ),
+        *(client.set_team_repo_permission(team.url, repo, permission=new_permission) for team in teams)
+    )
+
+
+def apply_changes(repositories, new_permission, workers=github_utils.DEFAULT_WORKERS, token='', repo_filter='',
+                  backend='threads', concurrency=github_utils.DEFAULT_CONCURRENCY, journal=None):
+    operation = f'permission {new_permission}'
+    repositories = github_utils.skip_completed(repositories, journal, operation)
+    snapshots = github_utils.get_repositories_snapshot(token=token, repositories=repositories, repo_filter=repo_filter)
+    if backend == 'async':
+        from classroom_tools import github_async
+        results = github_async.map_repositories(
+            fn=lambda client, repo: apply_repo_changes_async(
+                client=client,
+                repo=repo,
+                new_permission=new_permission,
+                snapshot=snapshots.get(repo.full_name)
+            ),
+            repositories=repositories,
+            token=token,
+            concurrency=concurrency,
+            writes_per_repo=2,
+            journal=journal,
+            operation=operation
+        )
+    else:
+        results = github_utils.map_repositories(
+            fn=lambda repo: apply_repo_changes(
+                repo=repo,
+                new_permission=new_permission,
+                snapshot=snapshots.get(repo.full_name)
+            ),
+            repositories=repositories,
+            workers=workers,
+            writes_per_repo=2,
+            journal=journal,
+            operation=operation
+        )
+    for repo, _, error in results:
+        if error is not None:
+            print(f'{Fore.RED}Couldn\'t change permissions of repo: {repo.full_name}\n{Fore.RED}{error}')
 
 
 def main(args):
@@ -78,8 +181,30 @@ def main(args):
         org_name=args.org_name,
         repo_filter=args.repo_filter
     )
-    apply_changes(repositories=repositories, new_permission=args.new_permission_level)
-    confirm_changes(repositories=repositories, new_permission=args.new_permission_level)
+    journal = github_utils.get_journal(
+        name='access_permissions',
+        org_name=args.org_name,
+        repo_filter=args.repo_filter,
+        resume=args.resume
+    )
+    apply_changes(
+        repositories=repositories,
+        new_permission=args.new_permission_level,
+        workers=args.workers,
+        token=args.token,
+        repo_filter=args.repo_filter,
+        backend=args.backend,
+        concurrency=args.concurrency,
+        journal=journal
+    )
+    confirm_changes(
+        repositories=repositories,
+        new_permission=args.new_permission_level,
+        workers=args.workers,
+        token=args.token,
+        repo_filter=args.repo_filter
+    )
+    journal.remove()
 
 
 if __name__ == '__main__':
@@ -34,6 +34,22 @@ parser.add_argument(
     required=True,
     help='Protect branch'
 )
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories processed concurrently'
+)
+
+
+def change_protection(repo, branch_name, protect, snapshot=None):
+    branch = (snapshot or repo).get_branch(branch_name)
+    if protect:
+        branch.edit_protection(
+            user_push_restrictions=['']
+        )
+    elif branch.protected:
+        branch.remove_protection()
 
 
 def main(args):
@@ -46,23 +62,29 @@ def main(args):
         org_name=args.org_name,
         repo_filter=args.repo_filter
     )
+    snapshots = github_utils.get_repositories_snapshot(
+        token=args.token,
+        repositories=repositories,
+        repo_filter=args.repo_filter
+    )
     num_fail = 0
-    for repo in repositories:
-        try:
-            branch = repo.get_branch(args.branch)
-            if args.protect:
-                branch.edit_protection(
-                    user_push_restrictions=['']
-                )
-            elif branch.protected:
-                branch.remove_protection()
-            else:
-                pass
+    for repo, _, error in github_utils.map_repositories(
+            fn=lambda repo: change_protection(
+                repo=repo,
+                branch_name=args.branch,
+                protect=args.protect,
+                snapshot=snapshots.get(repo.full_name)
+            ),
+            repositories=repositories,
+            workers=args.workers,
+            writes_per_repo=1
+    ):
+        if error is None:
             print(f'{Fore.GREEN}Repo: {repo.full_name}')
-        except Exception as e:
+        else:
             print(f'{Fore.RED}Repo: {repo.full_name}')
             pprint.pprint(vars(repo))
-            print(f'{Fore.RED}{e}')
+            print(f'{Fore.RED}{error}')
             num_fail += 1
     print('\nSummary:')
     print(f'\tTotal number of repositories: {len(repositories)}')
@@ -1,6 +1,5 @@
 import argparse
 
-import requests
 from colorama import Fore
 
 from classroom_tools import github_utils
@@ -27,14 +26,19 @@ parser.add_argument(
     required=True,
     help='Name of protected branch'
 )
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories processed concurrently'
+)
 
 
 def set_default_branch(token, repo_full_name, branch_name):
-    res = requests.patch(
-        url=f'https://api.github.com/repos/{repo_full_name}',
-        headers={
-            'Authorization': f'token {token}'
-        },
+    res = github_utils.request(
+        'PATCH',
+        url=f'/repos/{repo_full_name}',
+        token=token,
         json={
             'default_branch': branch_name
         }
@@ -54,12 +58,15 @@ def main(args):
         repo_filter=args.repo_filter
     )
     num_fail = 0
-    for repo in repositories:
+    for repo, _, error in github_utils.map_repositories(
+            fn=lambda repo: set_default_branch(token=args.token, repo_full_name=repo.full_name, branch_name=args.branch),
+            repositories=repositories,
+            workers=args.workers,
+            writes_per_repo=1
+    ):
         print(f'Repo: {repo.full_name}')
-        try:
-            set_default_branch(token=args.token, repo_full_name=repo.full_name, branch_name=args.branch)
-        except Exception as e:
-            print(e)
+        if error is not None:
+            print(error)
             num_fail += 1
     print('\nSummary:')
     print(f'\tTotal number of repositories: {len(repositories)}')
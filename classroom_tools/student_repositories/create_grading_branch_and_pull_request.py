@@ -44,17 +44,23 @@ parser.add_argument(
 )
 
 
-def get_first_commit(repo, branch_name='master'):
-    commit = repo.get_branch(branch_name).commit
+def get_branch(repo, branch_name, snapshot=None):
+    if snapshot is not None and branch_name in snapshot.branches:
+        return snapshot.branches[branch_name]
+    return repo.get_branch(branch_name)
+
+
+def get_first_commit(repo, branch_name='master', snapshot=None):
+    commit = get_branch(repo=repo, branch_name=branch_name, snapshot=snapshot).commit
     while len(commit.parents) > 0:
         commit = commit.parents[0]
     return commit
 
 
-def create_or_update_ref(repo, base):
-    commit = get_first_commit(repo)
+def create_or_update_ref(repo, base, snapshot=None):
+    commit = get_first_commit(repo=repo, snapshot=snapshot)
     try:
-        branch = repo.get_branch(base)
+        branch = get_branch(repo=repo, branch_name=base, snapshot=snapshot)
         if branch.protected:
             branch.remove_protection()
         ref = repo.get_git_ref(f'heads/{base}')
@@ -63,8 +69,8 @@ def create_or_update_ref(repo, base):
         repo.create_git_ref(f'refs/heads/{base}', sha=commit.sha)
 
 
-def add_push_restrictions(repo, base):
-    branch = repo.get_branch(base)
+def add_push_restrictions(repo, base, snapshot=None):
+    branch = get_branch(repo=repo, branch_name=base, snapshot=snapshot)
     branch.edit_protection(
         user_push_restrictions=['']
     )
@@ -80,17 +86,28 @@ def main(args):
         org_name=args.org_name,
         repo_filter=args.repo_filter
     )
+    snapshots = github_utils.get_repositories_snapshot(
+        token=args.token,
+        repositories=repositories,
+        repo_filter=args.repo_filter
+    )
     num_fail = 0
     for repo in repositories:
+        snapshot = snapshots.get(repo.full_name)
         try:
-            create_or_update_ref(repo=repo, base=args.base)
-            add_push_restrictions(repo=repo, base=args.base)
+            create_or_update_ref(repo=repo, base=args.base, snapshot=snapshot)
+            add_push_restrictions(repo=repo, base=args.base, snapshot=snapshot)
             print(f'{Fore.GREEN}Repo: {repo.full_name}')
         except Exception as e:
             print(f'{Fore.RED}Repo: {repo.full_name}')
             pprint.pprint(vars(repo))
             print(f'{Fore.RED}{e}')
             num_fail += 1
+        if snapshot is not None and len(snapshot.get_pulls(base=args.base, head=args.head)) > 0:
+            print(f'\t{Fore.YELLOW}Pull request already exists')
+            for pull in snapshot.get_pulls(base=args.base, head=args.head):
+                print(f'\t{pull}')
+            continue
         try:
             repo.create_pull(
                 title=args.pull_request_title,
@@ -27,6 +27,18 @@ parser.add_argument(
     required=True,
     help='Name of protected branch'
 )
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories processed concurrently'
+)
+parser.add_argument(
+    '--resume',
+    default=False,
+    action='store_true',
+    help='Skip repositories completed by a previous run that was interrupted'
+)
 
 
 def create_or_update_ref(repo, branch_name):
@@ -48,6 +60,11 @@ def add_push_restrictions(repo, branch_name):
     )
 
 
+def protect_branch_from_master(repo, branch_name):
+    create_or_update_ref(repo=repo, branch_name=branch_name)
+    add_push_restrictions(repo=repo, branch_name=branch_name)
+
+
 def main(args):
     print('\n\n' + 'Creating protected branches'.center(80, '='))
     args = parser.parse_args(args)
@@ -58,22 +75,35 @@ def main(args):
         org_name=args.org_name,
         repo_filter=args.repo_filter
     )
+    journal = github_utils.get_journal(
+        name='create_protected_branch_from_master',
+        org_name=args.org_name,
+        repo_filter=args.repo_filter,
+        resume=args.resume
+    )
     num_fail = 0
-    for repo in repositories:
-        try:
-            create_or_update_ref(repo=repo, branch_name=args.branch)
-            add_push_restrictions(repo=repo, branch_name=args.branch)
+    for repo, _, error in github_utils.map_repositories(
+            fn=lambda repo: protect_branch_from_master(repo=repo, branch_name=args.branch),
+            repositories=repositories,
+            workers=args.workers,
+            reads_per_repo=4,
+            writes_per_repo=2,
+            journal=journal,
+            operation=f'protect {args.branch}'
+    ):
+        if error is None:
             print(f'{Fore.GREEN}Repo: {repo.full_name}')
-        except Exception as e:
+        else:
             print(f'{Fore.RED}Repo: {repo.full_name}')
             pprint.pprint(vars(repo))
-            print(f'{Fore.RED}{e}')
+            print(f'{Fore.RED}{error}')
             num_fail += 1
     print('\nSummary:')
     print(f'\tTotal number of repositories: {len(repositories)}')
     print(f'\tTotal number failed: {num_fail}')
     if num_fail > 0:
-        raise Exception(f'{Fore.RED}Couldn\'t create protected branches')
+        raise Exception(f'{Fore.RED}Couldn\'t create protected branches, rerun with --resume to retry the failed ones')
+    journal.remove()
 
 
 if __name__ == '__main__':
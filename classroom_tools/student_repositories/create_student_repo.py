@@ -2,7 +2,6 @@ import argparse
 import distutils.util
 
 import github
-import requests
 from colorama import Fore, Style
 
 from classroom_tools import github_utils
@@ -54,10 +53,11 @@ parser.add_argument(
 
 
 def create_repo_from_template(token, template_repo_fullname, org_name, repo_name, description='', private=False):
-    res = requests.post(
-        url=f'https://api.github.com/repos/{template_repo_fullname}/generate',
+    res = github_utils.request(
+        'POST',
+        url=f'/repos/{template_repo_fullname}/generate',
+        token=token,
         headers={
-            'Authorization': f'token {token}',
             'Accept': 'application/vnd.github.baptiste-preview+json'
         },
         json={
@@ -70,7 +70,7 @@ def create_repo_from_template(token, template_repo_fullname, org_name, repo_name
     if res.ok:
         print(f'{Fore.GREEN}Created repo: {repo_name}')
     else:
-        g = github.Github(login_or_token=token)
+        g = github_utils.get_client(token)
         try:
             g.get_repo(full_name_or_id=f'{org_name}/{repo_name}')
             print(f'{Fore.YELLOW}Repo already exists: {repo_name}')
@@ -93,7 +93,7 @@ def main(args):
             description='Student repository',
             private=args.private
         )
-        g = github.Github(login_or_token=args.token)
+        g = github_utils.get_client(args.token)
         repo = g.get_repo(full_name_or_id=f'{args.org_name}/{args.repo_name}')
         for col in args.admin_collaborators:
             repo.add_to_collaborators(col, permission='admin')
@@ -1,5 +1,7 @@
 import argparse
 
+from colorama import Fore
+
 from classroom_tools import github_utils
 
 parser = argparse.ArgumentParser()
@@ -20,8 +22,20 @@ parser.add_argument(
 )
 parser.add_argument(
     '--path',
-    default='',
-    help='A path to a file delete from students repositories'
+    nargs='*',
+    default=[],
+    help='Paths to files to delete from students repositories (all deleted in a single commit)'
+)
+parser.add_argument(
+    '--branch',
+    default='master',
+    help='Branch of student repos to receive changes'
+)
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories processed concurrently'
 )
 
 
@@ -36,12 +50,24 @@ def main(args):
         repo_filter=args.repo_filter
     )
     num_repos = 0
-    for repo in repositories:
-        if args.repo_filter in repo.name:
-            github_utils.delete_file(repo, args.path)
-        num_repos += 1
+    num_fail = 0
+    for repo, _, error in github_utils.map_repositories(
+            fn=lambda repo: github_utils.delete_files(repo, args.path, branch=args.branch),
+            repositories=repositories,
+            workers=args.workers,
+            reads_per_repo=2,
+            writes_per_repo=3
+    ):
+        if error is not None:
+            print(f'{Fore.RED}Repo: {repo.full_name}\n{Fore.RED}{error}')
+            num_fail += 1
+        else:
+            num_repos += 1
     print('\nSummary:')
     print(f'\tTotal number of repositories updated: {num_repos}')
+    print(f'\tTotal number failed: {num_fail}')
+    if num_fail > 0:
+        raise Exception(f'{Fore.RED}Couldn\'t delete file from all repositories')
 
 
 if __name__ == '__main__':
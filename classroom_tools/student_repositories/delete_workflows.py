@@ -1,5 +1,7 @@
 import argparse
 
+from colorama import Fore
+
 from classroom_tools import github_utils
 
 parser = argparse.ArgumentParser('Delete all workflows from each selected student repositories (to prevent cheating)')
@@ -23,6 +25,20 @@ parser.add_argument(
     default='master',
     help='Branch of student repos to receive changes'
 )
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories processed concurrently'
+)
+
+
+def delete_workflows(repo, branch):
+    print(f'Deleting workflows from repo: {repo.full_name}')
+    deleted = github_utils.delete_all_workflows(repo, branch=branch)
+    for path in sorted(deleted):
+        print(f'\tRemoved: {path}')
+
 
 def main(args):
     print('\n\n' + 'Deleting workflows'.center(80, '='))
@@ -34,13 +50,22 @@ def main(args):
         org_name=args.org_name,
         repo_filter=args.repo_filter
     )
-    for repo in repositories:
-        print(f'Deleting workflows from repo: {repo.full_name}')
-        deleted = github_utils.delete_all_workflows(repo, branch=args.branch)
-        for path in deleted:
-            print(f'\tRemoved: {path}')
+    num_fail = 0
+    for repo, _, error in github_utils.map_repositories(
+            fn=lambda repo: delete_workflows(repo=repo, branch=args.branch),
+            repositories=repositories,
+            workers=args.workers,
+            reads_per_repo=3,
+            writes_per_repo=3
+    ):
+        if error is not None:
+            print(f'{Fore.RED}Repo: {repo.full_name}\n{Fore.RED}{error}')
+            num_fail += 1
     print('\nSummary:')
-    print(f'\tTotal number of repositories updated: {len(repositories)}')
+    print(f'\tTotal number of repositories updated: {len(repositories) - num_fail}')
+    print(f'\tTotal number failed: {num_fail}')
+    if num_fail > 0:
+        raise Exception(f'{Fore.RED}Couldn\'t delete all workflows')
 
 
 if __name__ == '__main__':
@@ -1,4 +1,5 @@
 import argparse
+import hashlib
 import os
 
 import git
@@ -56,13 +57,25 @@ parser.add_argument(
     default='master',
     help='Branch of student repos to receive changes'
 )
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories processed concurrently'
+)
+parser.add_argument(
+    '--resume',
+    default=False,
+    action='store_true',
+    help='Skip repositories completed by a previous run that was interrupted'
+)
 
 
 def _get_paths_to_update(files_to_update, template_repo):
     if files_to_update is None:
         try:
             index_file = 'settings/files_to_update.txt'
-            file = template_repo.get_contents(index_file)
+            file = github_utils.get_file(repo=template_repo, path=index_file)
             return set(file.decoded_content.decode('utf-8').splitlines())
         except Exception as e:
             print(e)
@@ -102,20 +115,45 @@ def update_as_student_repo(files_to_update, template_repo_fullname, git_repo_pat
     )
     print(f'\nUpdating files in repo with files from:\t{template_repo.full_name}')
     git_repo = git.repo.Repo(path=git_repo_path)
+    num_synced = 0
     for file in template_files:
-        print(f'\tSyncing: {file.path}')
         fullpath = os.path.abspath(os.path.join(git_repo_path + file.path))
+        if os.path.exists(fullpath):
+            with open(fullpath, 'rb') as f:
+                if github_utils.git_blob_sha(f.read()) == file.sha:
+                    continue
+        print(f'\tSyncing: {file.path}')
         head, tail = os.path.split(fullpath)
         if not os.path.exists(head): os.makedirs(head)
         with open(fullpath, 'wb') as f:
             f.write(file.decoded_content)
         git_repo.index.add([fullpath])
+        num_synced += 1
+    if num_synced == 0:
+        print('\tAlready up to date')
+        return
     git_repo.index.commit('Auto sync with template repo')
     fetch_info = git_repo.remote('origin').pull()
     git_repo.remote('origin').push()
 
 
-def update_with_github_api(files_to_update, template_repo_fullname, token, org_name, repo_filter, branch):
+def update_repo(repo, template_files, branch):
+    print(f'{Fore.GREEN}\t{repo.full_name}')
+    commit = github_utils.apply_changeset(
+        repo=repo,
+        changes={file.path: file.decoded_content for file in template_files},
+        branch=branch,
+        message='Auto sync with template repo',
+        modes={file.path: file.mode for file in template_files if hasattr(file, 'mode')}
+    )
+    if commit is None:
+        print('\t\tAlready up to date')
+    else:
+        print(f'\t\tCommit: {commit.sha}')
+
+
+def update_with_github_api(files_to_update, template_repo_fullname, token, org_name, repo_filter, branch,
+                           workers=github_utils.DEFAULT_WORKERS, resume=False):
     github_utils.verify_token(token)
     template_repo = github_utils.get_repo(fullname=template_repo_fullname, token=token)
     template_files = get_relevant_template_files(
@@ -128,13 +166,37 @@ def update_with_github_api(files_to_update, template_repo_fullname, token, org_n
         repo_filter=repo_filter
     )
 
+    journal = github_utils.get_journal(
+        name='sync_with_template_repository',
+        org_name=org_name,
+        repo_filter=repo_filter,
+        resume=resume
+    )
+    # Finished repositories are only skipped while the template files stay the same
+    template_version = hashlib.sha1(
+        ''.join(sorted(f'{file.path} {file.sha}\n' for file in template_files)).encode('utf-8')
+    ).hexdigest()
+
     print('Syncing repositories:')
-    for repo in repositories:
-        print(f'{Fore.GREEN}\t{repo.full_name}')
-        for file in template_files:
-            github_utils.copy_file_to_repo(file=file, repo=repo, branch=branch)
+    num_fail = 0
+    for repo, _, error in github_utils.map_repositories(
+            fn=lambda repo: update_repo(repo=repo, template_files=template_files, branch=branch),
+            repositories=repositories,
+            workers=workers,
+            reads_per_repo=2,
+            writes_per_repo=3,
+            journal=journal,
+            operation=f'sync {branch} {template_version}'
+    ):
+        if error is not None:
+            print(f'{Fore.RED}\tFailed to sync: {repo.full_name}\n{Fore.RED}\t{error}')
+            num_fail += 1
     print('\nSummary:')
-    print(f'\tTotal number of repositories updated: {len(repositories)}')
+    print(f'\tTotal number of repositories updated: {len(repositories) - num_fail}')
+    print(f'\tTotal number failed: {num_fail}')
+    if num_fail > 0:
+        raise Exception(f'{Fore.RED}Couldn\'t sync all repositories, rerun with --resume to retry the failed ones')
+    journal.remove()
 
 
 def main(args):
@@ -154,7 +216,9 @@ def main(args):
             token=args.token,
             org_name=args.org_name,
             repo_filter=args.repo_filter,
-            branch=args.branch
+            branch=args.branch,
+            workers=args.workers,
+            resume=args.resume
         )
 
 
@@ -25,6 +25,31 @@ parser.add_argument(
     default='Manual trigger',
     help='Event name'
 )
+parser.add_argument(
+    '--workers',
+    type=int,
+    default=github_utils.DEFAULT_WORKERS,
+    help='Number of repositories processed concurrently'
+)
+parser.add_argument(
+    '--backend',
+    choices=github_utils.BACKENDS,
+    default='threads',
+    help='Send requests from a thread pool or from a single asyncio event loop (requires aiohttp)'
+)
+parser.add_argument(
+    '--concurrency',
+    type=int,
+    default=github_utils.DEFAULT_CONCURRENCY,
+    help='Maximum number of requests in flight with the async backend'
+)
+
+
+def trigger(repo, event_type):
+    # create_repository_dispatch returns False instead of raising
+    if not repo.create_repository_dispatch(event_type=event_type):
+        raise Exception(f'{Fore.RED}Couldn\'t send repository_dispatch to {repo.full_name}')
+    return True
 
 
 def main(args):
@@ -40,14 +65,31 @@ def main(args):
         repo_filter=args.repo_filter
     )
     print('Triggering workflows in repos:')
-    for repo in repositories:
-        success = repo.create_repository_dispatch(event_type=args.event_type)
+    if args.backend == 'async':
+        from classroom_tools import github_async
+        results = github_async.map_repositories(
+            fn=lambda client, repo: client.create_repository_dispatch(repo, event_type=args.event_type),
+            repositories=repositories,
+            token=args.token,
+            concurrency=args.concurrency,
+            writes_per_repo=1
+        )
+    else:
+        results = github_utils.map_repositories(
+            fn=lambda repo: trigger(repo, event_type=args.event_type),
+            repositories=repositories,
+            workers=args.workers,
+            writes_per_repo=1
+        )
+    for repo, success, error in results:
         if success:
             num_success += 1
             print(f'{Fore.GREEN}\t{repo.name}')
         else:
             num_fail += 1
             print(f'{Fore.RED}\tFAILED {repo.name}')
+            if error is not None:
+                print(f'{Fore.RED}\t{error}')
 
     print('\nSummary:')
     print(f'\tNumber of successful repository_dispatch events: {num_success}')
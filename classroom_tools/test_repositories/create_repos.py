@@ -1,7 +1,6 @@
 import argparse
 
 import github
-import requests
 from colorama import Fore, Style
 
 from classroom_tools import github_utils
@@ -52,10 +51,11 @@ def student_usernames(n=10):
 
 
 def create_repo_from_template(token, template_repo_fullname, org_name, repo_name, description='', private=False):
-    res = requests.post(
-        url=f'https://api.github.com/repos/{template_repo_fullname}/generate',
+    res = github_utils.request(
+        'POST',
+        url=f'/repos/{template_repo_fullname}/generate',
+        token=token,
         headers={
-            'Authorization': f'token {token}',
             'Accept': 'application/vnd.github.baptiste-preview+json'
         },
         json={
@@ -68,7 +68,7 @@ def create_repo_from_template(token, template_repo_fullname, org_name, repo_name
     if res.ok:
         print(f'{Fore.GREEN}Created repo: {repo_name}')
     else:
-        g = github.Github(login_or_token=token)
+        g = github_utils.get_client(token)
         try:
             g.get_repo(full_name_or_id=f'{org_name}/{repo_name}')
             print(f'{Fore.YELLOW}Repo already exists: {repo_name}')
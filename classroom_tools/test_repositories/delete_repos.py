@@ -24,9 +24,14 @@ parser.add_argument(
 
 def delete_repos(token, org_name, repo_filter):
     repos = github_utils.get_students_repositories(token=token, org_name=org_name, repo_filter=repo_filter)
-    for repo in repos:
-        print(f'{Fore.GREEN}Deleting: {repo.full_name}')
-        repo.delete()
+    deleted = []
+    try:
+        for repo in repos:
+            print(f'{Fore.GREEN}Deleting: {repo.full_name}')
+            repo.delete()
+            deleted.append(repo.full_name)
+    finally:
+        github_utils.forget_repositories(org_name, deleted)
 
 
 def main(args):
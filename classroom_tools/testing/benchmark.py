@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from colorama import Fore
+
+from classroom_tools.testing import fake_github
+
+parser = argparse.ArgumentParser('Run entry points against a fake GitHub API with synthetic classrooms of several sizes')
+parser.add_argument(
+    '--sizes',
+    type=int,
+    nargs='*',
+    default=[10, 100, 1000, 5000],
+    help='Numbers of student repositories'
+)
+parser.add_argument(
+    '--entry_points',
+    nargs='*',
+    default=None,
+    help='Entry points to run (default: all)'
+)
+parser.add_argument(
+    '--latency',
+    type=float,
+    default=0.0,
+    help='Seconds added to every response of the fake API'
+)
+parser.add_argument(
+    '--write_interval',
+    type=float,
+    default=0.0,
+    help='Seconds between writes (the real API needs 1, which would make write pacing dominate the results)'
+)
+parser.add_argument(
+    '--timeout',
+    type=float,
+    default=1800,
+    help='Seconds before a run is considered failed'
+)
+parser.add_argument(
+    '--output',
+    default=None,
+    help='Path of a JSON file to write the results to'
+)
+parser.add_argument(
+    '--baseline',
+    default=None,
+    help='Path of a JSON file with previous results to compare against'
+)
+parser.add_argument(
+    '--tolerance',
+    type=float,
+    default=0.25,
+    help='Fraction by which a result may exceed the baseline before it counts as a regression'
+)
+parser.add_argument(
+    '--log_dir',
+    default=None,
+    help='Directory to write the output of each run to'
+)
+
+ORG_NAME = 'classroom'
+ASSIGNMENT = 'hw1'
+REPO_FILTER = f'{ASSIGNMENT}-student'
+TOKEN = 'fake-token'
+# Seconds of wall time a run may gain over the baseline regardless of the tolerance, to absorb noise on small runs
+WALL_TIME_SLACK = 1.0
+
+ENTRY_POINTS = {
+    'sync_with_template_repository': [
+        'classroom_tools.student_repositories.sync_with_template_repository',
+        '--template_repo_fullname', f'{ORG_NAME}/template-{ASSIGNMENT}'
+    ],
+    'delete_workflows': ['classroom_tools.student_repositories.delete_workflows'],
+    'delete_file': ['classroom_tools.student_repositories.delete_file', '--path', 'README.md'],
+    'trigger_workflows': ['classroom_tools.student_repositories.trigger_workflows'],
+    'change_default_branch': ['classroom_tools.student_repositories.change_default_branch', '--branch', 'master'],
+    'change_branch_protection': [
+        'classroom_tools.student_repositories.change_branch_protection',
+        '--branch', 'master',
+        '--protect', 'true'
+    ],
+    'create_protected_branch_from_master': [
+        'classroom_tools.student_repositories.create_protected_branch_from_master',
+        '--branch', 'final'
+    ],
+    'access_permissions': ['classroom_tools.student_repositories.access_permissions'],
+    'create_grading_branch_and_pull_request': [
+        'classroom_tools.student_repositories.create_grading_branch_and_pull_request',
+        '--head', 'master',
+        '--base', 'grading'
+    ],
+    'collect_grades': ['classroom_tools.grading.collect_grades'],
+}
+# The plagiarism commands aren't benchmarked: moss sends the submissions to the Moss server, which isn't faked,
+# and commits its reports to the current git repository
+
+
+def run_entry_point(name, num_repos, latency=0.0, write_interval=0.0, timeout=1800, log_dir=None):
+    # Each run gets a fresh classroom and an empty cache, the entry point runs in a child process
+    # so that its peak memory can be measured on its own
+    fake = fake_github.create_classroom(
+        org_name=ORG_NAME,
+        repo_filter=ASSIGNMENT,
+        num_repos=num_repos,
+        latency=latency,
+        rate_limit=10 ** 9
+    )
+    server = fake_github.FakeGitHubServer(fake).start()
+    module, *entry_args = ENTRY_POINTS[name]
+    package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(
+            os.environ,
+            GITHUB_API_URL=server.url,
+            GITHUB_GRAPHQL_URL=f'{server.url}/graphql',
+            CLASSROOM_TOOLS_CACHE=cache_dir,
+            CLASSROOM_TOOLS_WRITE_INTERVAL=str(write_interval),
+            PYTHONPATH=os.pathsep.join(filter(None, [package_dir, os.environ.get('PYTHONPATH')]))
+        )
+        env.pop('CLASSROOM_TOOLS_METRICS', None)
+        args = [
+            sys.executable, '-m', module,
+            '--token', TOKEN,
+            '--org_name', ORG_NAME,
+            '--repo_filter', REPO_FILTER,
+            *entry_args
+        ]
+        if log_dir is not None:
+            if not os.path.exists(log_dir): os.makedirs(log_dir)
+            output = open(os.path.join(log_dir, f'{name}_{num_repos}.log'), 'w')
+        else:
+            output = subprocess.DEVNULL
+        try:
+            start = time.perf_counter()
+            # Files written by the entry point, e.g. the grades table, go to the temporary directory
+            process = subprocess.Popen(args, env=env, cwd=cache_dir, stdout=output, stderr=subprocess.STDOUT)
+            returncode, peak_memory = _wait(process, timeout)
+            wall_time = time.perf_counter() - start
+        finally:
+            if output is not subprocess.DEVNULL:
+                output.close()
+            server.stop()
+    return {
+        'entry_point': name,
+        'num_repos': num_repos,
+        'wall_time': wall_time,
+        'num_requests': fake.num_requests,
+        'peak_memory': peak_memory,
+        'returncode': returncode
+    }
+
+
+def _wait(process, timeout):
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    try:
+        if not hasattr(os, 'wait4'):
+            return process.wait(), None
+        # wait4 reports the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        # Linux reports kilobytes, macOS bytes
+        return process.returncode, usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    finally:
+        timer.cancel()
+
+
+def find_regressions(results, baseline, tolerance):
+    previous = {(result['entry_point'], result['num_repos']): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result['entry_point'], result['num_repos']))
+        if old is None:
+            continue
+        name = f'{result["entry_point"]} ({result["num_repos"]} repos)'
+        if result['returncode'] != 0 and old['returncode'] == 0:
+            regressions.append(f'{name}: failed with exit code {result["returncode"]}')
+        if result['num_requests'] > old['num_requests'] * (1 + tolerance):
+            regressions.append(f'{name}: {result["num_requests"]} requests (was {old["num_requests"]})')
+        if result['wall_time'] > old['wall_time'] * (1 + tolerance) + WALL_TIME_SLACK:
+            regressions.append(f'{name}: {result["wall_time"]:.1f}s (was {old["wall_time"]:.1f}s)')
+        if result['peak_memory'] and old['peak_memory'] and result['peak_memory'] > old['peak_memory'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: {result["peak_memory"] / 2 ** 20:.0f} MB peak memory (was {old["peak_memory"] / 2 ** 20:.0f} MB)'
+            )
+    return regressions
+
+
+def print_results(results):
+    width = max([len('Entry point')] + [len(result['entry_point']) for result in results])
+    print(f'\n\t{"Entry point":<{width}}  {"Repos":>6}  {"Wall s":>8}  {"Requests":>8}  {"Req/repo":>8}  {"Peak MB":>8}')
+    for result in results:
+        color = Fore.GREEN if result['returncode'] == 0 else Fore.RED
+        peak_memory = f'{result["peak_memory"] / 2 ** 20:.0f}' if result['peak_memory'] else '?'
+        print(
+            f'{color}\t{result["entry_point"]:<{width}}  {result["num_repos"]:>6}  {result["wall_time"]:>8.1f}  '
+            f'{result["num_requests"]:>8}  {result["num_requests"] / max(result["num_repos"], 1):>8.1f}  '
+            f'{peak_memory:>8}'
+        )
+
+
+def main(args):
+    print('\n\n' + 'Benchmarking entry points'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
+    entry_points = args.entry_points or list(ENTRY_POINTS)
+    for name in entry_points:
+        if name not in ENTRY_POINTS:
+            raise Exception(f'{Fore.RED}Unknown entry point: {name}\nChoose from: {", ".join(ENTRY_POINTS)}')
+    results = []
+    for num_repos in args.sizes:
+        for name in entry_points:
+            print(f'Running: {name} with {num_repos} repos')
+            result = run_entry_point(
+                name=name,
+                num_repos=num_repos,
+                latency=args.latency,
+                write_interval=args.write_interval,
+                timeout=args.timeout,
+                log_dir=args.log_dir
+            )
+            results.append(result)
+    print('\nSummary:')
+    print_results(results)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='UTF-8') as f:
+            json.dump(results, f, indent=2)
+    num_fail = sum(1 for result in results if result['returncode'] != 0)
+    print(f'\n\tTotal number failed: {num_fail}')
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline, encoding='UTF-8') as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'{Fore.RED}\tRegression: {regression}')
+    if num_fail > 0 or len(regressions) > 0:
+        raise Exception(f'{Fore.RED}Benchmark failed')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
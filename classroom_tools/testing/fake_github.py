@@ -0,0 +1,975 @@
+import argparse
+import base64
+import datetime
+import hashlib
+import http.server
+import io
+import json
+import re
+import tarfile
+import threading
+import time
+import urllib.parse
+
+parser = argparse.ArgumentParser('Serve a local stand-in for the GitHub REST and GraphQL APIs')
+parser.add_argument(
+    '--port',
+    type=int,
+    default=8770,
+    help='Port to listen on'
+)
+parser.add_argument(
+    '--org_name',
+    default='classroom',
+    help='Name of the synthetic organization'
+)
+parser.add_argument(
+    '--repo_filter',
+    default='hw1',
+    help='Prefix of the synthetic student repositories'
+)
+parser.add_argument(
+    '--num_repos',
+    type=int,
+    default=10,
+    help='Number of synthetic student repositories'
+)
+parser.add_argument(
+    '--latency',
+    type=float,
+    default=0.0,
+    help='Seconds added to every response'
+)
+parser.add_argument(
+    '--rate_limit',
+    type=int,
+    default=5000,
+    help='Requests per hour before the server answers with rate limit errors'
+)
+
+PER_PAGE = 30
+MAX_PER_PAGE = 100
+RATE_LIMIT_WINDOW = 3600
+# GraphQL permissions as named by the REST API
+PERMISSIONS = {'admin': 'ADMIN', 'maintain': 'MAINTAIN', 'push': 'WRITE', 'triage': 'TRIAGE', 'pull': 'READ'}
+PERMISSION_LEVELS = ['pull', 'triage', 'push', 'maintain', 'admin']
+
+TEMPLATE_FILES = {
+    'README.md': b'# Assignment\n',
+    'src/main.py': b'def main():\n    pass\n',
+    'tests/test_main.py': b'import unittest\n\n\nclass TestMain(unittest.TestCase):\n    def test_main(self):\n        pass\n',
+    'tests/test_output.py': b'import unittest\n',
+    '.github/workflows/classroom.yml': b'name: GitHub Classroom Workflow\non: [push]\n',
+    'settings/files_to_update.txt':
+        b'README.md\ntests/test_main.py\ntests/test_output.py\n.github/workflows/classroom.yml\n',
+}
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _sha1(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def git_blob_sha(content):
+    return _sha1(b'blob %d\0' % len(content) + content)
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Repo:
+    def __init__(self, id_, org, name, private=False, is_template=False):
+        self.id = id_
+        self.org = org
+        self.name = name
+        self.private = private
+        self.is_template = is_template
+        self.default_branch = 'master'
+        self.branches = {}
+        self.protections = {}
+        self.collaborators = {}
+        self.teams = {}
+        self.pulls = []
+        self.workflow_runs = []
+        # Like GitHub, pushes only change pushed_at and changes to the repository's settings only updated_at
+        self.updated_at = _now()
+        self.pushed_at = self.updated_at
+
+    @property
+    def full_name(self):
+        return f'{self.org}/{self.name}'
+
+
+class FakeGitHub:
+    # In-memory organizations and repositories, git objects are content addressed and shared between repositories
+    def __init__(self, latency=0.0, rate_limit=5000):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset = int(time.time()) + RATE_LIMIT_WINDOW
+        self.orgs = {}
+        self.repos = {}
+        self.teams = {}
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.workflows = {}
+        self.num_requests = 0
+        # Seconds before a dispatched workflow run completes, None leaves them queued
+        self.workflow_duration = None
+        self.lock = threading.RLock()
+        self.base_url = ''
+
+    # Git objects
+
+    def put_blob(self, content):
+        sha = git_blob_sha(content)
+        self.blobs[sha] = content
+        return sha
+
+    def put_tree(self, entries):
+        sha = _sha1(json.dumps(sorted(entries.items())).encode('utf-8'))
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def put_commit(self, tree, parents, message):
+        sha = _sha1(json.dumps([tree, parents, message, len(self.commits)]).encode('utf-8'))
+        self.commits[sha] = {'tree': tree, 'parents': list(parents), 'message': message, 'date': _now()}
+        return sha
+
+    def is_ancestor(self, ancestor, sha):
+        pending = [sha]
+        while pending:
+            sha = pending.pop()
+            if sha == ancestor:
+                return True
+            pending.extend(self.commits[sha]['parents'])
+        return False
+
+    # Setup
+
+    def add_org(self, name):
+        self.orgs.setdefault(name, [])
+        return name
+
+    def add_repo(self, org, name, files, private=False, is_template=False):
+        self.add_org(org)
+        repo = Repo(len(self.repos) + 1, org, name, private=private, is_template=is_template)
+        entries = {path: ('100644', self.put_blob(content)) for path, content in files.items()}
+        repo.branches['master'] = self.put_commit(self.put_tree(entries), [], 'Initial commit')
+        repo.collaborators['admin'] = 'admin'
+        self.repos[repo.full_name] = repo
+        self.orgs[org].append(repo.full_name)
+        for path in files:
+            if path.startswith('.github/workflows/'):
+                self.workflows.setdefault(path, len(self.workflows) + 1)
+        return repo
+
+    def add_team(self, org, slug, repo_permissions):
+        self.teams[(org, slug)] = slug
+        for full_name, permission in repo_permissions.items():
+            self.repos[full_name].teams[slug] = permission
+
+    def add_workflow_runs(self, repo, num_runs):
+        for path, workflow_id in self.workflows.items():
+            for i in range(num_runs):
+                repo.workflow_runs.append(
+                    {
+                        'id': len(repo.workflow_runs) + 1,
+                        'workflow_id': workflow_id,
+                        'path': path,
+                        'status': 'completed',
+                        'conclusion': 'failure' if i % 2 else 'success',
+                        'event': 'push',
+                        'created_at': _now()
+                    }
+                )
+
+    # Requests
+
+    def count(self):
+        with self.lock:
+            self.num_requests += 1
+            now = time.time()
+            if now >= self.reset:
+                self.remaining = self.rate_limit
+                self.reset = int(now) + RATE_LIMIT_WINDOW
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def rate_limit_headers(self, resource='core'):
+        return {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(max(self.remaining, 0)),
+            'X-RateLimit-Reset': str(self.reset),
+            'X-RateLimit-Used': str(self.rate_limit - max(self.remaining, 0)),
+            'X-RateLimit-Resource': resource
+        }
+
+
+def create_classroom(org_name='classroom', repo_filter='hw1', num_repos=10, latency=0.0, rate_limit=5000,
+                     num_workflow_runs=2):
+    # A template repository plus num_repos student repositories created from it, with one team of teachers
+    fake = FakeGitHub(latency=latency, rate_limit=rate_limit)
+    fake.add_repo(org_name, f'template-{repo_filter}', TEMPLATE_FILES, is_template=True)
+    student_files = dict(TEMPLATE_FILES)
+    student_files['src/main.py'] = b'def main():\n    print("student solution")\n'
+    del student_files['settings/files_to_update.txt']
+    # The template changed since the student repositories were created from it: one test was updated and one
+    # was added, so that syncing them writes a commit
+    student_files['tests/test_main.py'] = b'import unittest\n'
+    del student_files['tests/test_output.py']
+    student_files['.github/workflows/autograding.yml'] = b'name: Autograding\non: [push]\n'
+    # As committed by the grading workflow with create_grades, read by collect_grades
+    student_files['logs/grades.json'] = json.dumps(
+        [
+            {'func_name': 'test_main', 'test_name': 'Main', 'points': 2, 'passing': True, 'status': 'ok'},
+            {'func_name': 'test_output', 'test_name': 'Output', 'points': 3, 'passing': False, 'status': 'FAIL'}
+        ]
+    ).encode('utf-8')
+    repo_permissions = {}
+    for i in range(num_repos):
+        repo = fake.add_repo(org_name, f'{repo_filter}-student{i}', student_files, private=True)
+        repo.collaborators[f'student{i}'] = 'push'
+        fake.add_workflow_runs(repo, num_workflow_runs)
+        repo_permissions[repo.full_name] = 'push'
+    fake.add_team(org_name, 'teachers', repo_permissions)
+    return fake
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body leave in a single write, otherwise delayed ACKs add ~40ms to every response
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else b''
+        return json.loads(data) if data else {}
+
+    def _send(self, status, body=None, headers=None, resource='core'):
+        data = body if isinstance(body, bytes) else (json.dumps(body).encode('utf-8') if body is not None else b'')
+        headers = dict(headers or {})
+        content_type = headers.pop('Content-Type', 'application/json; charset=utf-8')
+        if self.command == 'GET' and status == 200:
+            etag = f'"{_sha1(data)}"'
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                status, data = 304, b''
+                with self.fake.lock:
+                    # Conditional requests answered with 304 don't count against the rate limit
+                    self.fake.remaining += 1
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-OAuth-Scopes', 'repo, workflow, admin:org')
+        for name, value in self.fake.rate_limit_headers(resource).items():
+            self.send_header(name, value)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        url = urllib.parse.urlparse(self.path)
+        path = url.path
+        if path.startswith('/api/v3/'):
+            path = path[len('/api/v3'):]
+        query = dict(urllib.parse.parse_qsl(url.query))
+        body = self._read_body()
+        resource = 'graphql' if path == '/graphql' else 'core'
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        if not self.fake.count():
+            return self._send(403, {'message': 'API rate limit exceeded'}, resource=resource)
+        try:
+            with self.fake.lock:
+                status, result, headers = _route(self.fake, self.command, path, query, body)
+        except HttpError as e:
+            return self._send(e.status, {'message': e.message}, resource=resource)
+        except (KeyError, ValueError) as e:
+            return self._send(422, {'message': f'Validation Failed: {e}'}, resource=resource)
+        self._send(status, result, headers, resource=resource)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+# JSON representations
+
+def _repo_json(fake, repo):
+    url = f'{fake.base_url}/repos/{repo.full_name}'
+    return {
+        'id': repo.id,
+        'node_id': f'R_{repo.id}',
+        'name': repo.name,
+        'full_name': repo.full_name,
+        'owner': {'login': repo.org, 'type': 'Organization', 'url': f'{fake.base_url}/users/{repo.org}'},
+        'private': repo.private,
+        'is_template': repo.is_template,
+        'url': url,
+        'html_url': f'https://github.com/{repo.full_name}',
+        'default_branch': repo.default_branch,
+        'updated_at': repo.updated_at,
+        'pushed_at': repo.pushed_at,
+        'permissions': {'admin': True, 'maintain': True, 'push': True, 'triage': True, 'pull': True}
+    }
+
+
+def _commit_json(fake, repo, sha):
+    commit = fake.commits[sha]
+    url = f'{fake.base_url}/repos/{repo.full_name}'
+    return {
+        'sha': sha,
+        'url': f'{url}/git/commits/{sha}',
+        'message': commit['message'],
+        'tree': {'sha': commit['tree'], 'url': f'{url}/git/trees/{commit["tree"]}'},
+        'parents': [{'sha': parent, 'url': f'{url}/git/commits/{parent}'} for parent in commit['parents']],
+        'author': {'name': 'Fake', 'email': 'fake@example.com', 'date': commit['date']},
+        'committer': {'name': 'Fake', 'email': 'fake@example.com', 'date': commit['date']}
+    }
+
+
+def _repo_commit_json(fake, repo, sha):
+    commit = _commit_json(fake, repo, sha)
+    url = f'{fake.base_url}/repos/{repo.full_name}'
+    return {
+        'sha': sha,
+        'url': f'{url}/commits/{sha}',
+        'commit': commit,
+        'parents': [{'sha': parent['sha'], 'url': f'{url}/commits/{parent["sha"]}'} for parent in commit['parents']]
+    }
+
+
+def _ref_json(fake, repo, branch):
+    sha = repo.branches[branch]
+    url = f'{fake.base_url}/repos/{repo.full_name}'
+    return {
+        'ref': f'refs/heads/{branch}',
+        'url': f'{url}/git/refs/heads/{branch}',
+        'object': {'sha': sha, 'type': 'commit', 'url': f'{url}/git/commits/{sha}'}
+    }
+
+
+def _branch_json(fake, repo, branch):
+    sha = repo.branches[branch]
+    url = f'{fake.base_url}/repos/{repo.full_name}'
+    return {
+        'name': branch,
+        'commit': {'sha': sha, 'url': f'{url}/commits/{sha}'},
+        'protected': branch in repo.protections,
+        'protection_url': f'{url}/branches/{branch}/protection'
+    }
+
+
+def _protection_json(fake, repo, branch):
+    # Protection is stored as sent with PUT, the response nests each setting the way GitHub does
+    settings = repo.protections[branch]
+    url = f'{fake.base_url}/repos/{repo.full_name}/branches/{branch}/protection'
+    protection = {
+        'url': url,
+        'enforce_admins': {'url': f'{url}/enforce_admins', 'enabled': bool(settings.get('enforce_admins'))}
+    }
+    for name in ('allow_deletions', 'allow_force_pushes', 'required_linear_history', 'required_conversation_resolution'):
+        protection[name] = {'enabled': bool(settings.get(name))}
+    if settings.get('required_status_checks'):
+        protection['required_status_checks'] = dict(
+            settings['required_status_checks'],
+            url=f'{url}/required_status_checks'
+        )
+    if settings.get('required_pull_request_reviews'):
+        protection['required_pull_request_reviews'] = dict(
+            settings['required_pull_request_reviews'],
+            url=f'{url}/required_pull_request_reviews'
+        )
+    if settings.get('restrictions'):
+        protection['restrictions'] = {
+            'url': f'{url}/restrictions',
+            'users_url': f'{url}/restrictions/users',
+            'teams_url': f'{url}/restrictions/teams',
+            'users': [{'login': login} for login in settings['restrictions'].get('users', []) if login],
+            'teams': [{'slug': slug} for slug in settings['restrictions'].get('teams', []) if slug],
+            'apps': []
+        }
+    return protection
+
+
+def _pull_json(fake, repo, pull):
+    url = f'{fake.base_url}/repos/{repo.full_name}'
+    return {
+        'number': pull['number'],
+        'title': pull['title'],
+        'body': pull['body'],
+        'state': pull['state'],
+        'url': f'{url}/pulls/{pull["number"]}',
+        'base': {'ref': pull['base'], 'sha': repo.branches.get(pull['base'])},
+        'head': {'ref': pull['head'], 'sha': repo.branches.get(pull['head'])}
+    }
+
+
+def _team_json(fake, org, slug, permission=None):
+    team = {
+        'id': abs(hash((org, slug))) % 10 ** 8,
+        'name': slug.capitalize(),
+        'slug': slug,
+        'url': f'{fake.base_url}/orgs/{org}/teams/{slug}'
+    }
+    if permission is not None:
+        team['permission'] = permission
+    return team
+
+
+def _user_json(fake, login, permission):
+    level = PERMISSION_LEVELS.index(permission)
+    return {
+        'login': login,
+        'id': abs(hash(login)) % 10 ** 8,
+        'type': 'User',
+        'url': f'{fake.base_url}/users/{login}',
+        'permissions': {name: level >= i for i, name in enumerate(PERMISSION_LEVELS)}
+    }
+
+
+def _workflow_run_json(fake, repo, run):
+    url = f'{fake.base_url}/repos/{repo.full_name}'
+    run = {key: value for key, value in run.items() if key != 'dispatched_at'}
+    return dict(run, url=f'{url}/actions/runs/{run["id"]}', name=run['path'].rsplit('/', 1)[-1])
+
+
+def _paginate(fake, path, query, items):
+    per_page = min(int(query.get('per_page', PER_PAGE)), MAX_PER_PAGE)
+    page = int(query.get('page', 1))
+    headers = {}
+    if page * per_page < len(items):
+        next_query = dict(query, page=page + 1, per_page=per_page)
+        headers['Link'] = f'<{fake.base_url}{path}?{urllib.parse.urlencode(next_query)}>; rel="next"'
+    return items[(page - 1) * per_page:page * per_page], headers
+
+
+# Routing
+
+def _get_repo(fake, owner, name):
+    repo = fake.repos.get(f'{owner}/{name}')
+    if repo is None:
+        raise HttpError(404, 'Not Found')
+    return repo
+
+
+def _get_branch(repo, branch):
+    if branch not in repo.branches:
+        raise HttpError(404, 'Branch not found')
+    return branch
+
+
+def _route(fake, method, path, query, body):
+    if path == '/rate_limit':
+        core = {'limit': fake.rate_limit, 'remaining': fake.remaining, 'reset': fake.reset,
+                'used': fake.rate_limit - fake.remaining}
+        return 200, {'resources': {'core': core, 'search': core, 'graphql': core}, 'rate': core}, None
+    if path == '/user':
+        return 200, {'login': 'admin', 'id': 1, 'type': 'User', 'url': f'{fake.base_url}/users/admin'}, None
+    if path == '/graphql' and method == 'POST':
+        return 200, _graphql(fake, body.get('query', ''), body.get('variables') or {}), None
+    match = re.match(r'^/orgs/([^/]+)(.*)$', path)
+    if match:
+        return _route_org(fake, method, path, query, body, *match.groups())
+    match = re.match(r'^/repos/([^/]+)/([^/]+)(.*)$', path)
+    if match:
+        owner, name, rest = match.groups()
+        return _route_repo(fake, method, path, query, body, _get_repo(fake, owner, name), rest)
+    raise HttpError(404, 'Not Found')
+
+
+def _route_org(fake, method, path, query, body, org, rest):
+    if org not in fake.orgs:
+        raise HttpError(404, 'Not Found')
+    if rest == '':
+        return 200, {'login': org, 'id': 1, 'url': f'{fake.base_url}/orgs/{org}'}, None
+    if rest == '/repos' and method == 'GET':
+        repos = [fake.repos[name] for name in fake.orgs[org]]
+        if query.get('sort') in ('updated', 'pushed'):
+            repos.sort(
+                key=lambda repo: getattr(repo, f'{query["sort"]}_at'),
+                reverse=query.get('direction', 'desc') == 'desc'
+            )
+        items, headers = _paginate(fake, path, query, [_repo_json(fake, repo) for repo in repos])
+        return 200, items, headers
+    if rest == '/actions/secrets':
+        return 200, {'total_count': 0, 'secrets': []}, None
+    match = re.match(r'^/teams/([^/]+)/repos/([^/]+)/([^/]+)$', rest)
+    if match and method == 'PUT':
+        slug, owner, name = match.groups()
+        if (org, slug) not in fake.teams:
+            raise HttpError(404, 'Not Found')
+        _get_repo(fake, owner, name).teams[slug] = body.get('permission', 'push')
+        return 204, None, None
+    raise HttpError(404, 'Not Found')
+
+
+def _route_repo(fake, method, path, query, body, repo, rest):
+    base = f'{fake.base_url}/repos/{repo.full_name}'
+    if rest == '':
+        if method == 'PATCH':
+            if 'default_branch' in body:
+                repo.default_branch = _get_branch(repo, body['default_branch'])
+            repo.private = body.get('private', repo.private)
+            repo.is_template = body.get('is_template', repo.is_template)
+            repo.updated_at = _now()
+        elif method == 'DELETE':
+            del fake.repos[repo.full_name]
+            fake.orgs[repo.org].remove(repo.full_name)
+            return 204, None, None
+        return 200, _repo_json(fake, repo), None
+    if rest == '/generate' and method == 'POST':
+        if not repo.is_template:
+            raise HttpError(422, 'Repository is not a template')
+        full_name = f'{body["owner"]}/{body["name"]}'
+        if full_name in fake.repos:
+            raise HttpError(422, 'Name already exists on this account')
+        tree = fake.commits[repo.branches[repo.default_branch]]['tree']
+        files = {path: fake.blobs[sha] for path, (mode, sha) in fake.trees[tree].items()}
+        new_repo = fake.add_repo(body['owner'], body['name'], files, private=body.get('private', False))
+        return 201, _repo_json(fake, new_repo), None
+    if rest == '/dispatches' and method == 'POST':
+        for workflow_path, workflow_id in fake.workflows.items():
+            repo.workflow_runs.append(
+                {
+                    'id': len(repo.workflow_runs) + 1,
+                    'workflow_id': workflow_id,
+                    'path': workflow_path,
+                    'status': 'queued',
+                    'conclusion': None,
+                    'event': 'repository_dispatch',
+                    'created_at': _now(),
+                    'dispatched_at': time.time()
+                }
+            )
+        return 204, None, None
+    match = re.match(r'^/tarball(?:/(.+))?$', rest)
+    if match and method == 'GET':
+        return 200, _tarball(fake, repo, match.group(1) or repo.default_branch), {'Content-Type': 'application/x-gzip'}
+
+    # Git database
+    match = re.match(r'^/git/refs?/heads/(.+)$', rest)
+    if match:
+        branch = match.group(1)
+        if method == 'PATCH':
+            _get_branch(repo, branch)
+            if body['sha'] not in fake.commits:
+                raise HttpError(422, 'Object does not exist')
+            if not body.get('force') and not fake.is_ancestor(repo.branches[branch], body['sha']):
+                raise HttpError(422, 'Update is not a fast forward')
+            repo.branches[branch] = body['sha']
+            repo.pushed_at = _now()
+        elif method == 'DELETE':
+            _get_branch(repo, branch)
+            del repo.branches[branch]
+            repo.protections.pop(branch, None)
+            return 204, None, None
+        else:
+            _get_branch(repo, branch)
+        return 200, _ref_json(fake, repo, branch), None
+    if rest == '/git/refs' and method == 'POST':
+        branch = body['ref'][len('refs/heads/'):]
+        if branch in repo.branches:
+            raise HttpError(422, 'Reference already exists')
+        if body['sha'] not in fake.commits:
+            raise HttpError(422, 'Object does not exist')
+        repo.branches[branch] = body['sha']
+        repo.pushed_at = _now()
+        return 201, _ref_json(fake, repo, branch), None
+    if rest == '/git/commits' and method == 'POST':
+        sha = fake.put_commit(body['tree'], body.get('parents', []), body['message'])
+        return 201, _commit_json(fake, repo, sha), None
+    match = re.match(r'^/git/commits/([0-9a-f]{40})$', rest)
+    if match:
+        if match.group(1) not in fake.commits:
+            raise HttpError(404, 'Not Found')
+        return 200, _commit_json(fake, repo, match.group(1)), None
+    if rest == '/git/blobs' and method == 'POST':
+        if body.get('encoding') == 'base64':
+            sha = fake.put_blob(base64.b64decode(body['content']))
+        else:
+            sha = fake.put_blob(body['content'].encode('utf-8'))
+        return 201, {'sha': sha, 'url': f'{base}/git/blobs/{sha}'}, None
+    match = re.match(r'^/git/blobs/([0-9a-f]{40})$', rest)
+    if match:
+        content = fake.blobs.get(match.group(1))
+        if content is None:
+            raise HttpError(404, 'Not Found')
+        return 200, {
+            'sha': match.group(1),
+            'size': len(content),
+            'encoding': 'base64',
+            'content': base64.b64encode(content).decode('ascii'),
+            'url': f'{base}/git/blobs/{match.group(1)}'
+        }, None
+    if rest == '/git/trees' and method == 'POST':
+        entries = dict(fake.trees[body['base_tree']]) if body.get('base_tree') else {}
+        for element in body['tree']:
+            if 'content' in element:
+                entries[element['path']] = (element['mode'], fake.put_blob(element['content'].encode('utf-8')))
+            elif element.get('sha') is None:
+                if element['path'] not in entries:
+                    raise HttpError(422, 'GitRPC::BadObjectState')
+                del entries[element['path']]
+            else:
+                entries[element['path']] = (element['mode'], element['sha'])
+        sha = fake.put_tree(entries)
+        return 201, {'sha': sha, 'url': f'{base}/git/trees/{sha}', 'tree': [], 'truncated': False}, None
+    match = re.match(r'^/git/trees/(.+)$', rest)
+    if match:
+        # Trees are stored flat, so every request is answered as if it were recursive
+        tree_ish = match.group(1)
+        if tree_ish in repo.branches:
+            tree_ish = fake.commits[repo.branches[tree_ish]]['tree']
+        elif tree_ish in fake.commits:
+            tree_ish = fake.commits[tree_ish]['tree']
+        if tree_ish not in fake.trees:
+            raise HttpError(404, 'Not Found')
+        return 200, {
+            'sha': tree_ish,
+            'url': f'{base}/git/trees/{tree_ish}',
+            'truncated': False,
+            'tree': [
+                {'path': path, 'mode': mode, 'type': 'blob', 'sha': sha, 'size': len(fake.blobs[sha]),
+                 'url': f'{base}/git/blobs/{sha}'}
+                for path, (mode, sha) in sorted(fake.trees[tree_ish].items())
+            ]
+        }, None
+
+    # Commits, branches and protection
+    match = re.match(r'^/commits/([0-9a-f]{40})$', rest)
+    if match:
+        if match.group(1) not in fake.commits:
+            raise HttpError(404, 'Not Found')
+        return 200, _repo_commit_json(fake, repo, match.group(1)), None
+    if rest == '/branches':
+        items, headers = _paginate(fake, path, query, [_branch_json(fake, repo, name) for name in sorted(repo.branches)])
+        return 200, items, headers
+    match = re.match(r'^/branches/([^/]+)$', rest)
+    if match:
+        return 200, _branch_json(fake, repo, _get_branch(repo, match.group(1))), None
+    match = re.match(r'^/branches/([^/]+)/protection$', rest)
+    if match:
+        branch = _get_branch(repo, match.group(1))
+        if method == 'PUT':
+            repo.protections[branch] = body
+        elif method == 'DELETE':
+            if repo.protections.pop(branch, None) is None:
+                raise HttpError(404, 'Branch not protected')
+            return 204, None, None
+        elif branch not in repo.protections:
+            raise HttpError(404, 'Branch not protected')
+        return 200, _protection_json(fake, repo, branch), None
+
+    # Contents
+    match = re.match(r'^/contents/(.*)$', rest)
+    if match:
+        file_path = urllib.parse.unquote(match.group(1)).strip('/')
+        branch = _get_branch(repo, body.get('branch') or query.get('ref') or repo.default_branch)
+        entries = fake.trees[fake.commits[repo.branches[branch]]['tree']]
+        if method == 'GET':
+            return 200, _contents_json(fake, repo, entries, file_path, branch), None
+        entries = dict(entries)
+        if method == 'DELETE':
+            if file_path not in entries:
+                raise HttpError(404, 'Not Found')
+            if body.get('sha') != entries[file_path][1]:
+                raise HttpError(409, 'sha does not match')
+            del entries[file_path]
+        elif method == 'PUT':
+            if file_path in entries and body.get('sha') != entries[file_path][1]:
+                raise HttpError(409 if body.get('sha') else 422, 'sha does not match')
+            entries[file_path] = ('100644', fake.put_blob(base64.b64decode(body['content'])))
+        sha = fake.put_commit(fake.put_tree(entries), [repo.branches[branch]], body['message'])
+        repo.branches[branch] = sha
+        repo.pushed_at = _now()
+        content = None
+        if method == 'PUT':
+            content = {'path': file_path, 'name': file_path.rsplit('/', 1)[-1], 'sha': entries[file_path][1],
+                       'type': 'file', 'url': f'{base}/contents/{file_path}'}
+        return (201 if method == 'PUT' else 200), {'content': content, 'commit': _commit_json(fake, repo, sha)}, None
+
+    # Collaborators, teams and pull requests
+    if rest == '/collaborators':
+        users = [_user_json(fake, login, permission) for login, permission in sorted(repo.collaborators.items())]
+        items, headers = _paginate(fake, path, query, users)
+        return 200, items, headers
+    match = re.match(r'^/collaborators/([^/]+)$', rest)
+    if match:
+        login = urllib.parse.unquote(match.group(1))
+        if method == 'PUT':
+            status = 204 if login in repo.collaborators else 201
+            repo.collaborators[login] = body.get('permission', 'push')
+            return status, None, None
+        if method == 'DELETE':
+            repo.collaborators.pop(login, None)
+            return 204, None, None
+        if login not in repo.collaborators:
+            raise HttpError(404, 'Not Found')
+        return 204, None, None
+    if rest == '/teams':
+        teams = [_team_json(fake, repo.org, slug, permission) for slug, permission in sorted(repo.teams.items())]
+        return 200, teams, None
+    if rest == '/pulls':
+        if method == 'POST':
+            _get_branch(repo, body['base'])
+            _get_branch(repo, body['head'])
+            for pull in repo.pulls:
+                if pull['state'] == 'open' and pull['base'] == body['base'] and pull['head'] == body['head']:
+                    raise HttpError(422, f'A pull request already exists for {repo.org}:{body["head"]}.')
+            pull = {'number': len(repo.pulls) + 1, 'title': body.get('title', ''), 'body': body.get('body', ''),
+                    'state': 'open', 'base': body['base'], 'head': body['head']}
+            repo.pulls.append(pull)
+            return 201, _pull_json(fake, repo, pull), None
+        state = query.get('state', 'open')
+        pulls = [
+            _pull_json(fake, repo, pull) for pull in repo.pulls
+            if state in ('all', pull['state'])
+            and query.get('base', pull['base']) == pull['base']
+            and query.get('head', pull['head']).split(':')[-1] == pull['head']
+        ]
+        items, headers = _paginate(fake, path, query, pulls)
+        return 200, items, headers
+
+    # Actions
+    if rest == '/actions/runs':
+        runs = []
+        for run in reversed(repo.workflow_runs):
+            if 'dispatched_at' in run and run['status'] != 'completed' and fake.workflow_duration is not None \
+                    and time.time() - run['dispatched_at'] >= fake.workflow_duration:
+                run.update(status='completed', conclusion='success')
+            if query.get('event', run['event']) != run['event']:
+                continue
+            if query.get('created', '>=').startswith('>=') and run['created_at'] < query.get('created', '>=')[2:]:
+                continue
+            runs.append(_workflow_run_json(fake, repo, run))
+        items, headers = _paginate(fake, path, query, runs)
+        return 200, {'total_count': len(runs), 'workflow_runs': items}, headers
+    match = re.match(r'^/actions/runs/(\d+)$', rest)
+    if match:
+        runs = [run for run in repo.workflow_runs if run['id'] == int(match.group(1))]
+        if len(runs) == 0:
+            raise HttpError(404, 'Not Found')
+        if method == 'DELETE':
+            repo.workflow_runs.remove(runs[0])
+            return 204, None, None
+        return 200, _workflow_run_json(fake, repo, runs[0]), None
+    match = re.match(r'^/actions/workflows/([^/]+)$', rest)
+    if match:
+        for workflow_path, workflow_id in fake.workflows.items():
+            if match.group(1) in (str(workflow_id), workflow_path.rsplit('/', 1)[-1]):
+                return 200, {
+                    'id': workflow_id,
+                    'name': workflow_path.rsplit('/', 1)[-1],
+                    'path': workflow_path,
+                    'state': 'active',
+                    'url': f'{base}/actions/workflows/{workflow_id}'
+                }, None
+        raise HttpError(404, 'Not Found')
+    if rest == '/actions/secrets':
+        return 200, {'total_count': 0, 'secrets': []}, None
+    raise HttpError(404, 'Not Found')
+
+
+def _tarball(fake, repo, ref):
+    sha = repo.branches[ref] if ref in repo.branches else ref
+    if sha not in fake.commits:
+        # Abbreviated shas, as found in the name of the archive's top level directory
+        shas = [commit for commit in fake.commits if len(sha) >= 7 and commit.startswith(sha)]
+        if len(shas) != 1:
+            raise HttpError(404, 'Not Found')
+        sha = shas[0]
+    root = f'{repo.org}-{repo.name}-{sha[:7]}'
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for path, (mode, blob) in sorted(fake.trees[fake.commits[sha]['tree']].items()):
+            info = tarfile.TarInfo(f'{root}/{path}')
+            info.size = len(fake.blobs[blob])
+            archive.addfile(info, io.BytesIO(fake.blobs[blob]))
+    return buffer.getvalue()
+
+
+def _contents_json(fake, repo, entries, file_path, branch):
+    base = f'{fake.base_url}/repos/{repo.full_name}'
+    if file_path in entries:
+        content = fake.blobs[entries[file_path][1]]
+        return {
+            'type': 'file',
+            'encoding': 'base64',
+            'size': len(content),
+            'name': file_path.rsplit('/', 1)[-1],
+            'path': file_path,
+            'content': base64.b64encode(content).decode('ascii'),
+            'sha': entries[file_path][1],
+            'url': f'{base}/contents/{file_path}?ref={branch}'
+        }
+    prefix = f'{file_path}/' if file_path else ''
+    children = {}
+    for path, (mode, sha) in entries.items():
+        if path.startswith(prefix):
+            name = path[len(prefix):].split('/', 1)[0]
+            if '/' in path[len(prefix):]:
+                children[name] = {'type': 'dir', 'sha': _sha1(f'{prefix}{name}'.encode('utf-8'))}
+            else:
+                children[name] = {'type': 'file', 'sha': sha, 'size': len(fake.blobs[sha])}
+    if len(children) == 0:
+        raise HttpError(404, 'Not Found')
+    return [
+        dict(child, name=name, path=f'{prefix}{name}', url=f'{base}/contents/{prefix}{name}?ref={branch}')
+        for name, child in sorted(children.items())
+    ]
+
+
+# GraphQL, limited to the queries sent by classroom_tools
+
+def _connection(nodes, first):
+    return {'pageInfo': {'hasNextPage': len(nodes) > first, 'endCursor': str(first) if len(nodes) > first else None},
+            'nodes': nodes[:first]}
+
+
+def _graphql_repository(fake, repo):
+    refs = [
+        {
+            'name': name,
+            'target': {'oid': sha},
+            'branchProtectionRule': {'pattern': name} if name in repo.protections else None
+        }
+        for name, sha in sorted(repo.branches.items())
+    ]
+    collaborators = [
+        {'permission': PERMISSIONS[permission], 'node': {'login': login}}
+        for login, permission in sorted(repo.collaborators.items())
+    ]
+    pulls = [
+        {'number': pull['number'], 'title': pull['title'], 'baseRefName': pull['base'], 'headRefName': pull['head']}
+        for pull in repo.pulls if pull['state'] == 'open'
+    ]
+    collaborators_connection = _connection(collaborators, 100)
+    collaborators_connection['edges'] = collaborators_connection.pop('nodes')
+    return {
+        'name': repo.name,
+        'defaultBranchRef': {'name': repo.default_branch},
+        'refs': _connection(refs, 100),
+        'collaborators': collaborators_connection,
+        'pullRequests': _connection(pulls, 50)
+    }
+
+
+def _graphql_team_repositories(fake, org, slug, repo_filter, cursor):
+    edges = [
+        {'permission': PERMISSIONS[repo.teams[slug]], 'node': {'name': repo.name}}
+        for repo in (fake.repos[name] for name in fake.orgs[org])
+        if slug in repo.teams and (repo_filter or '') in repo.name
+    ]
+    start = int(cursor or 0)
+    page = edges[start:start + 100]
+    has_next_page = start + 100 < len(edges)
+    return {'pageInfo': {'hasNextPage': has_next_page, 'endCursor': str(start + 100) if has_next_page else None},
+            'edges': page}
+
+
+def _graphql(fake, query, variables):
+    data = {}
+    errors = []
+    aliases = re.findall(r'(\w+): repository\(owner: \$(\w+), name: \$(\w+)\)', query)
+    for alias, owner, name in aliases:
+        repo = fake.repos.get(f'{variables[owner]}/{variables[name]}')
+        if repo is None:
+            data[alias] = None
+            errors.append({'type': 'NOT_FOUND', 'path': [alias], 'message': 'Could not resolve to a Repository'})
+        else:
+            data[alias] = _graphql_repository(fake, repo)
+    if 'team(slug:' in query:
+        org = variables['org']
+        repositories = _graphql_team_repositories(
+            fake, org, variables['slug'], variables.get('filter'), variables.get('cursor')
+        )
+        data['organization'] = {'team': {'repositories': repositories}}
+    elif 'teams(' in query:
+        org = variables['org']
+        teams = [
+            {
+                'name': slug.capitalize(),
+                'slug': slug,
+                'repositories': _graphql_team_repositories(fake, org, slug, variables.get('filter'), None)
+            }
+            for (team_org, slug) in sorted(fake.teams) if team_org == org
+        ]
+        data['organization'] = {'teams': {'pageInfo': {'hasNextPage': False, 'endCursor': None}, 'nodes': teams}}
+    if len(data) == 0:
+        return {'errors': [{'message': 'Query not supported by the fake GitHub API'}]}
+    result = {'data': data}
+    if errors:
+        result['errors'] = errors
+    return result
+
+
+class FakeGitHubServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fake, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.fake = fake
+        fake.base_url = self.url
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+def main(args):
+    print('\n\n' + 'Fake GitHub API'.center(80, '='))
+    args = parser.parse_args(args)
+    print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
+    fake = create_classroom(
+        org_name=args.org_name,
+        repo_filter=args.repo_filter,
+        num_repos=args.num_repos,
+        latency=args.latency,
+        rate_limit=args.rate_limit
+    )
+    server = FakeGitHubServer(fake, port=args.port)
+    print(f'Serving {len(fake.repos)} repositories at: {server.url}')
+    print(f'\tGITHUB_API_URL={server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    main(sys.argv[1:])
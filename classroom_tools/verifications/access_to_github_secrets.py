@@ -2,8 +2,6 @@ import argparse
 import json
 import re
 
-import github
-import requests
 from colorama import Fore, Style
 
 from classroom_tools import github_utils
@@ -33,9 +31,10 @@ def find_secrets(string):
 
 def _get_available_org_secrets(token, repo):
     org_name = repo.full_name.split('/')[0]
-    res = requests.get(
-        url=f'https://api.github.com/orgs/{org_name}/actions/secrets',
-        headers={'Authorization': f'token {token}'}
+    res = github_utils.request(
+        'GET',
+        url=f'/orgs/{org_name}/actions/secrets',
+        token=token
     )
     if res.ok:
         available_secrets = set()
@@ -46,9 +45,10 @@ def _get_available_org_secrets(token, repo):
             elif secret['visibility'] == 'private' and repo.private:
                 available_secrets.add(secret['name'])
             elif secret['visibility'] == 'selected':
-                res = requests.get(
+                res = github_utils.request(
+                    'GET',
                     url=secret['selected_repositories_url'],
-                    headers={'Authorization': f'token {token}'}
+                    token=token
                 )
                 if res.ok:
                     repositories = json.JSONDecoder().decode(res.text)['repositories']
@@ -61,9 +61,10 @@ def _get_available_org_secrets(token, repo):
 
 
 def _get_available_repo_secrets(token, repo):
-    res = requests.get(
-        url=f'https://api.github.com/repos/{repo.full_name}/actions/secrets',
-        headers={'Authorization': f'token {token}'}
+    res = github_utils.request(
+        'GET',
+        url=f'/repos/{repo.full_name}/actions/secrets',
+        token=token
     )
     if res.ok:
         repo_secrets = json.JSONDecoder().decode(res.text)['secrets']
@@ -78,7 +79,7 @@ def _get_available_repo_secrets(token, repo):
 
 
 def get_available_secrets(token, repo_fullname):
-    g = github.Github(login_or_token=token)
+    g = github_utils.get_client(token)
     repo = g.get_repo(full_name_or_id=repo_fullname)
     org_secrets = _get_available_org_secrets(token=token, repo=repo)
     repo_secrets = _get_available_repo_secrets(token=token, repo=repo)
@@ -86,7 +87,7 @@ def get_available_secrets(token, repo_fullname):
 
 
 def get_required_secrets(token, repo_fullname):
-    g = github.Github(login_or_token=token)
+    g = github_utils.get_client(token)
     repo = g.get_repo(full_name_or_id=repo_fullname)
     workflow_files = github_utils.get_files_from_repo(repo=repo, path='.github/workflows')
     all_required_secrets = set()
@@ -1,6 +1,5 @@
 import argparse
 
-import github
 from colorama import Fore
 
 from classroom_tools import github_utils
@@ -23,11 +22,11 @@ def main(args):
     args = parser.parse_args(args)
     print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
     github_utils.verify_token(args.token)
-    g = github.Github(login_or_token=args.token)
+    g = github_utils.get_client(args.token)
     template_repo = g.get_repo(full_name_or_id=args.template_repo_fullname)
-    file = template_repo.get_contents('settings/files_to_update.txt')
-    paths_to_update = set(file.decoded_content.decode('utf-8').splitlines())
     template_files = list(github_utils.get_files_from_repo(repo=template_repo, path=''))
+    file = github_utils.get_file(repo=template_repo, path='settings/files_to_update.txt')
+    paths_to_update = set(file.decoded_content.decode('utf-8').splitlines())
     template_paths = set(
         map(
             lambda file: file.path,
@@ -1,7 +1,6 @@
 import argparse
 import json
 
-import requests
 from colorama import Fore
 
 from classroom_tools import github_utils
@@ -24,10 +23,11 @@ def main(args):
     args = parser.parse_args(args)
     print('Args:\n' + ''.join(f'\t{k}: {v}\n' for k, v in vars(args).items()))
     github_utils.verify_token(args.token)
-    res = requests.get(
-        url=f'https://api.github.com/repos/{args.repo_fullname}',
+    res = github_utils.request(
+        'GET',
+        url=f'/repos/{args.repo_fullname}',
+        token=args.token,
         headers={
-            'Authorization': f'token {args.token}',
             'Accept': 'application/vnd.github.baptiste-preview+json'
         }
     )
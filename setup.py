@@ -6,5 +6,11 @@ with open('requirements.txt') as f:
 setup(
     name='classroom_tools',
     packages=find_namespace_packages(),
-    install_requires=requirements
+    install_requires=requirements,
+    entry_points={
+        'console_scripts': ['classroom-tools=classroom_tools.cli:main']
+    },
+    extras_require={
+        'async': ['aiohttp']
+    }
 )
@@ -0,0 +1,19 @@
+import contextlib
+import io
+import unittest
+
+from classroom_tools import cli
+
+
+class RunCommandTest(unittest.TestCase):
+    def test_every_command_accepts_arguments(self):
+        # A command whose main doesn't take the arguments fails with a TypeError instead of printing its help
+        for name in cli.COMMANDS:
+            with self.subTest(command=name):
+                with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(SystemExit) as cm:
+                    cli.run_command(name, ['--help'])
+                self.assertEqual(cm.exception.code, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from classroom_tools.grading import test_results
+
+
+def parse(log):
+    return [(result['func_name'], result['status']) for result in test_results.parse_unittest(log.splitlines(True))]
+
+
+class ParseUnittestTest(unittest.TestCase):
+    def test_printed_ok_before_failure(self):
+        log = 'test_answer (test_hw.T.test_answer) ... ok\nFAIL\ntest_other (test_hw.T.test_other) ... ok\n'
+        self.assertEqual(parse(log), [('test_answer', 'FAIL'), ('test_other', 'ok')])
+
+    def test_printed_line_ending_in_ok(self):
+        log = "test_a (test_hw.T.test_a) ... it's ok\nstill fine\nERROR\n\n" + '=' * 70 + '\nERROR: test_a\n'
+        self.assertEqual(parse(log), [('test_a', 'ERROR')])
+
+    def test_status_after_output_without_new_line(self):
+        log = 'test_a (test_hw.T) ... xok\ntest_b (test_hw.T) ... doneFAIL\n'
+        self.assertEqual(parse(log), [('test_a', 'ok'), ('test_b', 'FAIL')])
+
+    def test_docstring_and_skip(self):
+        log = "test_a (test_hw.T.test_a)\nDocstring ... FAIL\ntest_b (test_hw.T.test_b) ... skipped 'no'\n"
+        self.assertEqual(parse(log), [('test_a', 'FAIL'), ('test_b', 'skipped')])
+
+    def test_no_status(self):
+        log = 'test_a (test_hw.T.test_a) ... working\n'
+        self.assertEqual(parse(log), [('test_a', 'ERROR')])
+
+
+if __name__ == '__main__':
+    unittest.main()